@@ -46,5 +46,6 @@ class AM2302(Accessory):
         time.sleep(0.2)
         t = self.sensor.temperature()
         h = self.sensor.humidity()
-        self.char_temp.set_value(t)
-        self.char_humidity.set_value(h)
+        with self.driver.batch():
+            self.char_temp.set_value(t)
+            self.char_humidity.set_value(h)
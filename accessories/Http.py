@@ -1,88 +1,52 @@
-"""This module provides HttpAccessory - an accessory that
-allows remote devices to provide HAP services by sending POST
-requests.
+"""This module provides HttpBridge - a bridge that allows remote devices to provide HAP
+services by sending POST requests.
+
+The server runs on the event loop of the driver. Connections are kept alive between
+requests and a request can update many accessories at once, either as a JSON array
+or as a stream of newline delimited JSON (NDJSON) objects, so gateways that push many
+readings do not pay for a new connection per reading.
 """
+import asyncio
 import json
-import threading
 import logging
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http import HTTPStatus
 
 from pyhap.accessory import Bridge
 from pyhap.const import CATEGORY_OTHER
 
 logger = logging.getLogger(__name__)
 
+KEEP_ALIVE_TIMEOUT = 60
+"""Seconds to wait for the next request, or the next part of a request, before the
+connection is closed."""
 
-class HttpBridgeHandler(BaseHTTPRequestHandler):
-    """Handles requests and passes value updates to an HttpAccessory.
+MAX_HEADER_SIZE = 8 * 1024
+MAX_BODY_SIZE = 4 * 1024 * 1024
+"""Maximum size of a JSON body or of a single NDJSON line."""
 
-    The POST request should contain json data with the format:
-    {   "aid": <aid>
-        "services": {
-            <service>: {
-                <characteristic>: value,
-            }
-        }
-    }
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
 
-    Example:
-    {   "aid": 2
-        "services": {
-            TemperatureSensor" : {
-                "CurrentTemperature": 20
-            }
-        }
-    }
-    """
 
-    def __init__(self, http_accessory, sock, client_addr, server):
-        """Create a handler that passes updates to the given HttpAccessory.
-        """
-        self.http_accessory = http_accessory
-        super().__init__(sock, client_addr, server)
+def _is_aid(value):
+    """Return whether the value is a possible AID, i.e. an int but not a bool."""
+    return isinstance(value, int) and not isinstance(value, bool)
 
-    def respond_ok(self):
-        """Reply with code 200 (OK) and close the connection.
-        """
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Content-Length", 0)
-        self.end_headers()
-        self.close_connection = 1
-
-    def respond_err(self):
-        """Reply with code 400 and close the connection.
-        """
-        self.send_response(400)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Content-Length", 0)
-        self.end_headers()
-        self.close_connection = 1
-
-    def do_POST(self):
-        """Read the payload as json and update the state of the accessory.
-        """
-        length = int(self.headers["Content-Length"])
-        try:
-            # The below decode is necessary only for python <3.6, because loads prior 3.6
-            # doesn't know bytes/bytearray.
-            content = self.rfile.read(length).decode('utf-8')
-            data = json.loads(content)
-        except Exception as e:
-            logger.error("Bad POST request; Error was: %s", str(e))
-            self.respond_err()
-        else:
-            self.http_accessory.update_state(data)
-            self.respond_ok()
+
+class HttpError(Exception):
+    """Raised for a request that is answered with an error and the connection closed."""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
 
 
 class HttpBridge(Bridge):
-    """An accessory that listens to HTTP requests containing characteristic updates.
+    """A bridge that listens to HTTP requests containing characteristic updates.
 
     Simple devices/implementations can just HTTP POST data as:
 
     {
-        <aid>: int,
+        "aid": <aid>,
         "services": {
             <service1>: {
                 <characteristic1>: value
@@ -92,7 +56,22 @@ class HttpBridge(Bridge):
         }
     }
 
-    Then this accessory takes care of communicating this update to any HAP clients.
+    Gateways can POST a JSON array of such objects, or stream them with the content
+    type ``application/x-ndjson``, one object per line, e.g. with
+    ``Transfer-Encoding: chunked``. The lines of a JSON array or of a received chunk
+    are applied together and clients are notified once, see `AccessoryDriver.batch`.
+
+    The response has one status per object, in the same order, as a JSON array or as
+    NDJSON respectively:
+
+    [{"aid": 2, "status": 200}, {"aid": 3, "status": 404, "error": "..."}]
+
+    The status is 200 if all values were set, 404 if there is no accessory with the
+    AID and 400 if the object or any of its values is not valid, in which case none of
+    the accessory's values are changed. Connections are kept alive, unless the client
+    asks otherwise or the request could not be read.
+
+    Then this accessory takes care of communicating the updates to any HAP clients.
 
     The way you configure a HttpBridge is by adding Accessory objects. You can specify
     the Accessory AIDs, which will be needed when making POST requests. In the
@@ -133,79 +112,277 @@ class HttpBridge(Bridge):
 
         @param address: The address-port on which to listen for requests.
         @type address: tuple(str, int)
-
-        @param accessories:
         """
         super().__init__(*args, **kwargs)
-
-        # For exclusive access to updates. Slight overkill...
-        self.update_lock = None
-        self.server_thread = None
-        self._set_server(address)
-
-    def _set_server(self, address):
-        """Set up a HTTPServer to listen on the given address.
-        """
-        self.server = HTTPServer(address, lambda *a: HttpBridgeHandler(self, *a))
-        self.server_thread = threading.Thread(target=self.server.serve_forever)
-        self.update_lock = threading.Lock()
+        self.address = address
+        self.server = None
+        self._connections = {}  # writer: future that is done when it is closed
 
     def __getstate__(self):
-        """Return the state of this instance, less the server and server thread.
+        """Return the state of this instance, less the server and its connections.
 
-        Also add the server address. All this is because we cannot pickle such
-        objects and to allow to recover the server using the address.
+        The server is started again from the address when the bridge runs.
         """
         state = super().__getstate__()
         state['server'] = None
-        state['server_thread'] = None
-        state['update_lock'] = None
-        state['address'] = self.server.server_address
+        state['_connections'] = {}
         return state
 
-    def __setstate__(self, state):
-        """Load the state  and set up the server with the address in the state.
-        """
-        self.__dict__.update(state)
-        self._set_server(state['address'])
-
     def update_state(self, data):
-        """Update the characteristics from the received data.
-
-        Expected to be called from HapHttpHandler. Updates are thread-safe.
+        """Update the characteristics of one accessory from the received data.
 
-        @param data: A dict of values that should be set, e.g.:
+        @param data: The values that should be set, e.g.:
             {
-                <aid>: int,
-                <service1 name> : {
-                    <characteristic1 name>: value
+                "aid": <aid>,
+                "services": {
+                    <service1 name> : {
+                        <characteristic1 name>: value
+                        ...
+                    }
                     ...
                 }
-                ...
             }
         @type data: dict
+
+        @return: The status of the update, e.g. {"aid": 2, "status": 200}.
+        @rtype: dict
         """
+        if not isinstance(data, dict) or not _is_aid(data.get('aid')) \
+                or not isinstance(data.get('services'), dict) \
+                or not all(isinstance(values, dict)
+                           for values in data['services'].values()):
+            return {'status': 400,
+                    'error': 'Expected an object with an integer "aid" and "services" '
+                             'that map service names to objects'}
         aid = data['aid']
-        logger.debug("Got update from accessory with aid: %d", aid)
-        accessory = self.accessories[aid]
-        service_data = data['services']
-        for service, char_data in service_data.items():
-            service_obj = accessory.get_service(service)
-            for char, value in char_data.items():
-                char_obj = service_obj.get_characteristic(char)
-                with self.update_lock:
-                    char_obj.set_value(value)
-
-    def stop(self):
-        """Stop the server.
+        accessory = self.accessories.get(aid)
+        if accessory is None:
+            return {'aid': aid, 'status': 404, 'error': 'Unknown accessory'}
+        try:
+            accessory.set_values(data['services'])
+        except (ValueError, TypeError, AttributeError) as e:
+            return {'aid': aid, 'status': 400, 'error': str(e)}
+        return {'aid': aid, 'status': 200}
+
+    def update_states(self, items):
+        """Update the characteristics of several accessories and notify clients once.
+
+        @param items: Objects in the format of `update_state`.
+        @type items: list
+
+        @return: The status of every update, in order.
+        @rtype: list
         """
-        super().stop()
+        with self.driver.batch():
+            return [self.update_state(data) for data in items]
+
+    async def async_start_server(self):
+        """Start listening for requests on the address of this bridge."""
+        host, port = self.address
+        self.server = await asyncio.start_server(self._handle_connection, host or None,
+                                                 port, limit=MAX_HEADER_SIZE)
+        logger.debug('HTTP bridge listening on %s',
+                     [sock.getsockname() for sock in self.server.sockets])
+
+    async def async_stop_server(self):
+        """Stop listening and close all open connections."""
+        if self.server is None:
+            return
+        self.server.close()
+        closed = list(self._connections.values())
+        for writer in self._connections:
+            writer.close()
+        if closed:
+            await asyncio.wait(closed)
+        await self.server.wait_closed()
+        self.server = None
+
+    async def run(self):
+        """Start the server and the contained accessories."""
+        logger.debug("Starting HTTP bridge server.")
+        await self.async_start_server()
+        await super().run()
+
+    async def stop(self):
+        """Stop the server and the contained accessories."""
         logger.debug("Stopping HTTP bridge server.")
-        self.server.shutdown()
-        self.server.server_close()
+        await self.async_stop_server()
+        await super().stop()
+
+    async def _handle_connection(self, reader, writer):
+        """Answer requests on a connection until it is closed or not kept alive."""
+        closed = self._connections[writer] = asyncio.get_event_loop().create_future()
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except HttpError as e:
+            logger.error("Bad request from %s: %s",
+                         writer.get_extra_info('peername'), e)
+            body = json.dumps({'error': str(e)}).encode('utf-8')
+            self._write_response(writer, e.status, body, 'application/json', False)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            del self._connections[writer]
+            closed.set_result(None)
+
+    async def _handle_request(self, reader, writer):
+        """Read a request, apply its updates and respond.
 
-    def run(self):
-        """Start the server - can listen for requests.
+        @return: Whether the connection is kept alive.
+        @rtype: bool
         """
-        logger.debug("Starting HTTP bridge server.")
-        self.server_thread.start()
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                          KEEP_ALIVE_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(400, 'Incomplete request')
+            return False  # Closed between requests.
+        except asyncio.LimitOverrunError:
+            raise HttpError(431)
+
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, _target, version = request_line.split(' ')
+        except ValueError:
+            raise HttpError(400, 'Malformed request line')
+        headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            keep_alive = connection != 'close'
+        else:
+            keep_alive = connection == 'keep-alive'
+        if method != 'POST':
+            raise HttpError(405)
+        if headers.get('expect', '').lower() == '100-continue' \
+                and version == 'HTTP/1.1':
+            # Clients like curl otherwise wait a while before sending the body.
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        if NDJSON_CONTENT_TYPE in headers.get('content-type', ''):
+            receiver = _NdjsonReceiver(self)
+            await self._read_body(reader, headers, receiver.feed)
+            statuses = receiver.close()
+            body = b''.join(json.dumps(status).encode('utf-8') + b'\n'
+                            for status in statuses)
+            content_type = NDJSON_CONTENT_TYPE
+        else:
+            chunks = []
+            await self._read_body(reader, headers, chunks.append, MAX_BODY_SIZE)
+            try:
+                data = json.loads(b''.join(chunks).decode('utf-8'))
+            except ValueError as e:
+                raise HttpError(400, 'Invalid JSON: {}'.format(e))
+            if isinstance(data, list):
+                statuses = self.update_states(data)
+            else:
+                statuses = [self.update_state(data)]
+            body = json.dumps(statuses).encode('utf-8')
+            content_type = 'application/json'
+
+        self._write_response(writer, 200, body, content_type, keep_alive)
+        await writer.drain()
+        return keep_alive
+
+    @staticmethod
+    async def _read_body(reader, headers, callback, max_size=None):
+        """Pass the body of a request to the callback, chunk by chunk.
+
+        Both a Content-Length and chunked Transfer-Encoding are supported.
+
+        @param max_size: The maximum total size of the body, or None.
+        @type max_size: int
+        """
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            total = 0
+            while True:
+                size_line = await asyncio.wait_for(reader.readuntil(b'\r\n'),
+                                                   KEEP_ALIVE_TIMEOUT)
+                try:
+                    size = int(size_line.split(b';', 1)[0], 16)
+                except ValueError:
+                    raise HttpError(400, 'Malformed chunk size')
+                if size == 0:
+                    break
+                total += size
+                if max_size is not None and total > max_size:
+                    raise HttpError(413)
+                chunk = await asyncio.wait_for(reader.readexactly(size + 2),
+                                               KEEP_ALIVE_TIMEOUT)
+                callback(chunk[:-2])
+            # Skip any trailers up to the final empty line.
+            while await asyncio.wait_for(reader.readuntil(b'\r\n'),
+                                         KEEP_ALIVE_TIMEOUT) != b'\r\n':
+                pass
+            return
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(400, 'Malformed Content-Length')
+        if max_size is not None and length > max_size:
+            raise HttpError(413)
+        while length > 0:
+            chunk = await asyncio.wait_for(reader.read(min(length, 64 * 1024)),
+                                           KEEP_ALIVE_TIMEOUT)
+            if not chunk:
+                raise asyncio.IncompleteReadError(chunk, length)
+            length -= len(chunk)
+            callback(chunk)
+
+    @staticmethod
+    def _write_response(writer, status, body, content_type, keep_alive):
+        """Write a response with the given status and body."""
+        writer.write('HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+                     'Connection: {}\r\n\r\n'
+                     .format(status, HTTPStatus(status).phrase, content_type,
+                             len(body), 'keep-alive' if keep_alive else 'close')
+                     .encode('latin-1') + body)
+
+
+class _NdjsonReceiver:
+    """Apply NDJSON lines as they arrive, one batch of updates per received chunk."""
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self.statuses = []
+        self._pending = bytearray()
+
+    def feed(self, chunk):
+        """Apply the complete lines received so far."""
+        self._pending += chunk
+        end = self._pending.rfind(b'\n')
+        if end == -1:
+            if len(self._pending) > MAX_BODY_SIZE:
+                raise HttpError(413)
+            return
+        lines = self._pending[:end].split(b'\n')
+        del self._pending[:end + 1]
+        self._apply(lines)
+
+    def close(self):
+        """Apply a last line without a newline and return all statuses."""
+        self._apply([self._pending])
+        self._pending = bytearray()
+        return self.statuses
+
+    def _apply(self, lines):
+        with self.bridge.driver.batch():
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line.decode('utf-8'))
+                except ValueError as e:
+                    self.statuses.append(
+                        {'status': 400, 'error': 'Invalid JSON: {}'.format(e)})
+                else:
+                    self.statuses.append(self.bridge.update_state(data))
@@ -0,0 +1,480 @@
+"""This module provides a shared memory channel for sensor readers that run as
+separate processes on the same host, and RingBufferBridge, which applies the readings
+to its accessories.
+
+The channel is a single-producer, single-consumer ring buffer in a memory mapped file,
+e.g. in ``/dev/shm``. A reader process writes fixed-size ``(aid, iid, value)`` records
+and the bridge drains them in batches, so handing over a reading costs a few
+microseconds and no sockets or JSON are involved:
+
+>>> # In the sensor reader process
+>>> ring = RingBuffer.open('/dev/shm/hap-sensors')
+>>> ring.write(2, 10, 21.5)
+
+Values are transferred as doubles, so only characteristics with a numeric or bool
+format can be updated through the channel. Use one file per reader process.
+
+While the bridge waits for records, it asks the reader to wake it up through a FIFO
+next to the file, ``/dev/shm/hap-sensors.wake`` above, so a reading is applied right
+away without polling. The reader writes to the FIFO only then, not for every record.
+Where FIFOs are not available, the bridge polls the buffer instead.
+
+The files are only accessible to their owner by default. To write readings from
+processes of other users, give them a group and pass e.g. ``mode=0o660``.
+"""
+import asyncio
+import contextlib
+import logging
+import math
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import zlib
+
+from pyhap import util
+from pyhap.accessory import Bridge
+from pyhap.characteristic import HAP_FORMAT_BOOL, HAP_FORMAT_FLOAT, HAP_FORMAT_NUMERICS
+from pyhap.const import CATEGORY_OTHER
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HAPRING2'
+DEFAULT_CAPACITY = 4096
+DEFAULT_MODE = 0o600
+DOORBELL_SUFFIX = '.wake'
+
+# Writes to the mapping are plain memory copies: Python gives no atomicity or ordering
+# guarantees for them, and struct writes little-endian fields byte by byte. The other
+# process can therefore see a record or counter half written, or, on weakly ordered
+# CPUs, a counter before the record it publishes. Every record and counter carries a
+# CRC-32, and records their position, so a reader detects these and retries later,
+# seqlock style. A torn record goes undetected only if its CRC-32 matches by chance.
+_FIELDS = struct.Struct('<QIId')  # position, aid, iid, value
+_CRC = struct.Struct('<I4x')
+RECORD = struct.Struct('<QIIdI4x')  # the fields and their CRC-32
+_COUNTER = struct.Struct('<QI')  # value and its CRC-32
+_UINT64 = struct.Struct('<Q')
+_COUNTER_RETRIES = 1000
+
+# The header is followed by the records. The head, i.e. the number of records ever
+# written, and the dropped counter are only written by the producer; the tail, i.e.
+# the number of records ever read, only by the consumer. They are on separate cache
+# lines. The dropped counter is only informational and has no CRC-32. The waiting
+# flag is a single byte written by the consumer: set while it waits for the doorbell.
+_HEADER = struct.Struct('<8sII')  # magic, capacity, record size
+_HEAD_OFFSET = 64
+_DROPPED_OFFSET = 80
+_TAIL_OFFSET = 128
+_WAITING_OFFSET = 144
+_HEADER_SIZE = 192
+
+
+def _create(path, capacity, mode):
+    """Create an initialised ring buffer file at the path, unless one exists.
+
+    The file is prepared under a temporary name and then linked to the path, so other
+    processes never open a file without a header.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                    prefix='.' + os.path.basename(path))
+    try:
+        os.chmod(tmp_path, mode)  # mkstemp creates the file with mode 0o600.
+        with os.fdopen(fd, 'r+b') as fileobj:
+            fileobj.truncate(_HEADER_SIZE + capacity * RECORD.size)
+            fileobj.write(_HEADER.pack(MAGIC, capacity, RECORD.size))
+            for offset in (_HEAD_OFFSET, _TAIL_OFFSET):
+                fileobj.seek(offset)
+                fileobj.write(_pack_counter(0))
+        with contextlib.suppress(FileExistsError):
+            os.link(tmp_path, path)
+    finally:
+        os.unlink(tmp_path)
+
+
+def _pack_counter(value):
+    return _COUNTER.pack(value, zlib.crc32(_UINT64.pack(value)))
+
+
+class RingBuffer:
+    """A single-producer, single-consumer ring buffer of ``(aid, iid, value)`` records
+    in a memory mapped file.
+    """
+
+    def __init__(self, fileobj, buf, path, mode=DEFAULT_MODE):
+        """Use `open` instead."""
+        self._file = fileobj
+        self._buf = buf
+        self._doorbell_path = path + DOORBELL_SUFFIX
+        self._mode = mode
+        self._doorbell_writer = None
+        self._doorbell_fds = None  # The consumer's read and write ends of the FIFO.
+        _magic, self.capacity, _record_size = _HEADER.unpack_from(buf)
+        # Each side writes its own counter, so it only needs to read it once. The
+        # producer re-reads the tail only when the buffer seems full, as it only grows.
+        self._head = None
+        self._tail = None
+        self._seen_tail = 0
+
+    @classmethod
+    def open(cls, path, capacity=DEFAULT_CAPACITY, mode=DEFAULT_MODE):
+        """Open the ring buffer at the path, creating it if it does not exist.
+
+        :param capacity: The number of records of a new buffer.
+        :type capacity: int
+
+        :param mode: The permissions of a new buffer and its doorbell FIFO.
+        :type mode: int
+
+        :raise ValueError: If the file is not a ring buffer.
+        """
+        if not os.path.exists(path):
+            _create(path, capacity, mode)
+        fileobj = open(path, 'r+b')
+        try:
+            buf = mmap.mmap(fileobj.fileno(), 0)
+        except Exception:
+            fileobj.close()
+            raise
+        magic, capacity, record_size = _HEADER.unpack_from(buf)
+        if magic != MAGIC or record_size != RECORD.size or \
+                len(buf) != _HEADER_SIZE + capacity * record_size:
+            buf.close()
+            fileobj.close()
+            raise ValueError('{} is not a ring buffer'.format(path))
+        return cls(fileobj, buf, path, mode)
+
+    def close(self):
+        """Unmap and close the file and the doorbell."""
+        if self._doorbell_fds is not None:
+            self.set_waiting(False)
+            for fd in self._doorbell_fds:
+                os.close(fd)
+            self._doorbell_fds = None
+        if self._doorbell_writer is not None:
+            os.close(self._doorbell_writer)
+            self._doorbell_writer = None
+        self._buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_counter(self, offset):
+        """Return the counter at the offset, retrying while it is being written.
+
+        :raise ValueError: If the counter stays invalid, e.g. because its writer was
+            killed in the middle of writing it.
+        """
+        for _ in range(_COUNTER_RETRIES):
+            value, crc = _COUNTER.unpack_from(self._buf, offset)
+            if zlib.crc32(_UINT64.pack(value)) == crc:
+                return value
+        raise ValueError('Corrupt ring buffer counter')
+
+    def _write_counter(self, offset, value):
+        self._buf[offset:offset + _COUNTER.size] = _pack_counter(value)
+
+    @property
+    def dropped(self):
+        """The number of records the producer dropped because the buffer was full."""
+        return _UINT64.unpack_from(self._buf, _DROPPED_OFFSET)[0]
+
+    def __len__(self):
+        """Return the number of records waiting to be read."""
+        return self._read_counter(_HEAD_OFFSET) - self._read_counter(_TAIL_OFFSET)
+
+    def write(self, aid, iid, value):
+        """Append a record. Only one process may write to a buffer.
+
+        :return: False if the buffer is full and the record was dropped.
+        :rtype: bool
+        """
+        buf = self._buf
+        head = self._head
+        if head is None:
+            head = self._read_counter(_HEAD_OFFSET)
+        if head - self._seen_tail >= self.capacity:
+            self._seen_tail = self._read_counter(_TAIL_OFFSET)
+        if head - self._seen_tail >= self.capacity:
+            dropped = _UINT64.unpack_from(buf, _DROPPED_OFFSET)[0]
+            _UINT64.pack_into(buf, _DROPPED_OFFSET, dropped + 1)
+            return False
+        fields = _FIELDS.pack(head, aid, iid, value)
+        offset = _HEADER_SIZE + (head % self.capacity) * RECORD.size
+        buf[offset:offset + RECORD.size] = fields + _CRC.pack(zlib.crc32(fields))
+        self._write_counter(_HEAD_OFFSET, head + 1)
+        self._head = head + 1
+        if buf[_WAITING_OFFSET]:
+            self._ring_doorbell()
+        return True
+
+    def _ring_doorbell(self):
+        """Wake up the waiting consumer, if it is still there."""
+        if self._doorbell_writer is None:
+            try:
+                self._doorbell_writer = os.open(self._doorbell_path,
+                                                os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:  # The consumer has closed the doorbell.
+                return
+        try:
+            os.write(self._doorbell_writer, b'\0')
+        except BlockingIOError:
+            pass  # Full of wakeups the consumer has not read yet.
+        except OSError:
+            os.close(self._doorbell_writer)
+            self._doorbell_writer = None
+
+    def doorbell(self):
+        """Open the doorbell FIFO of the consumer, creating it if needed.
+
+        The FIFO becomes readable when the producer writes a record while the waiting
+        flag is set, see `set_waiting`.
+
+        :return: The file descriptor to wait on, or None if FIFOs are not supported.
+        :rtype: int
+
+        :raise ValueError: If the doorbell path exists but is not a FIFO.
+        """
+        if self._doorbell_fds is None:
+            if not hasattr(os, 'mkfifo'):
+                return None
+            try:
+                os.mkfifo(self._doorbell_path)
+                os.chmod(self._doorbell_path, self._mode)
+            except FileExistsError:
+                pass
+            read_fd = os.open(self._doorbell_path, os.O_RDONLY | os.O_NONBLOCK)
+            if not stat.S_ISFIFO(os.fstat(read_fd).st_mode):
+                os.close(read_fd)
+                raise ValueError('{} is not a FIFO'.format(self._doorbell_path))
+            # Keep a writer open, the FIFO would otherwise report end of file whenever
+            # the producer closes it.
+            write_fd = os.open(self._doorbell_path, os.O_WRONLY | os.O_NONBLOCK)
+            self._doorbell_fds = (read_fd, write_fd)
+        return self._doorbell_fds[0]
+
+    def set_waiting(self, waiting):
+        """Ask the producer to ring the doorbell on its next record, or stop asking.
+
+        Check that the buffer is empty after setting the flag and before waiting, so
+        that a record written in between is not missed.
+        """
+        self._buf[_WAITING_OFFSET] = int(waiting)
+
+    def clear_doorbell(self):
+        """Read the pending wakeups from the doorbell."""
+        try:
+            while os.read(self._doorbell_fds[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def read(self, max_records=None):
+        """Remove and return the waiting records. Only one process may read a buffer.
+
+        Records that are not completely visible yet are left for the next call.
+
+        :param max_records: The maximum number of records to read, or None for all.
+        :type max_records: int
+
+        :return: ``(aid, iid, value)`` tuples, oldest first.
+        :rtype: list
+        """
+        tail = self._tail
+        if tail is None:
+            tail = self._tail = self._read_counter(_TAIL_OFFSET)
+        count = min(self._read_counter(_HEAD_OFFSET) - tail, self.capacity)
+        if max_records is not None:
+            count = min(count, max_records)
+        if count <= 0:
+            return []
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        # Copy the records once, then validate the copy.
+        data = self._buf[_HEADER_SIZE + start * RECORD.size:
+                         _HEADER_SIZE + (start + first) * RECORD.size]
+        if first < count:  # Wrapped around.
+            data += self._buf[_HEADER_SIZE:_HEADER_SIZE + (count - first) * RECORD.size]
+        view = memoryview(data)
+        records = []
+        for index, (position, aid, iid, value, crc) in enumerate(
+                RECORD.iter_unpack(data)):
+            offset = index * RECORD.size
+            if position != tail + index or \
+                    zlib.crc32(view[offset:offset + _FIELDS.size]) != crc:
+                break
+            records.append((aid, iid, value))
+        view.release()
+        if records:
+            self._tail = tail + len(records)
+            self._write_counter(_TAIL_OFFSET, self._tail)
+        return records
+
+
+def _to_float(value):
+    # NaN would pass the min/max checks and end up in events as invalid JSON.
+    if not math.isfinite(value):
+        raise ValueError('Not a finite number: {!r}'.format(value))
+    return value
+
+
+def get_value_converter(char):
+    """Return a function that converts a record value for the char, or None if the
+    char's format cannot be transferred as a double.
+    """
+    value_format = char.properties['Format']
+    if value_format == HAP_FORMAT_BOOL:
+        return bool
+    if value_format == HAP_FORMAT_FLOAT:
+        return _to_float
+    if value_format in HAP_FORMAT_NUMERICS:
+        return int
+    return None
+
+
+class RingBufferBridge(Bridge):
+    """A bridge that drains a `RingBuffer` into the characteristics of its accessories.
+
+    The records are drained in batches; if a characteristic is updated more than once
+    in a batch, only the last value is set and clients are notified once, see
+    `AccessoryDriver.batch`. When the buffer is empty, the bridge waits until the
+    producer rings the doorbell, see `RingBuffer.doorbell`, or for at most
+    ``poll_interval`` seconds. Without doorbell, it polls the buffer at that interval.
+
+    The bridge counts ``updates``, records for ``unknown`` characteristics and
+    ``invalid`` values in `stats`. Records dropped by the producer are counted in
+    `RingBuffer.dropped`.
+
+    >>> bridge = RingBufferBridge('/dev/shm/hap-sensors', driver, 'Sensors')
+    >>> bridge.add_accessory(temperature_acc)
+    """
+
+    category = CATEGORY_OTHER
+
+    def __init__(self, path, *args, capacity=DEFAULT_CAPACITY, mode=DEFAULT_MODE,
+                 poll_interval=0.05, batch_size=1024, **kwargs):
+        """Initialise and add the given services.
+
+        :param path: The path of the ring buffer file. It is created if needed.
+        :type path: str
+
+        :param mode: The permissions of a new ring buffer file and its doorbell.
+        :type mode: int
+
+        :param batch_size: The maximum number of records applied at once.
+        :type batch_size: int
+        """
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.capacity = capacity
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.ring = None
+        self._doorbell = None
+        self._wakeup = None
+        self.lookup = {}
+        self.stats = dict.fromkeys(('updates', 'unknown', 'invalid'), 0)
+
+    def __getstate__(self):
+        """Return the state of this instance, less the ring buffer and lookup table."""
+        state = super().__getstate__()
+        state['ring'] = None
+        state['lookup'] = {}
+        state['_doorbell'] = None
+        state['_wakeup'] = None
+        return state
+
+    def build_lookup(self):
+        """Map the ``(aid, iid)`` of every transferable characteristic to it and its
+        value converter.
+
+        Called when the bridge starts. Call it again if accessories, services or
+        characteristics are added afterwards.
+        """
+        lookup = {}
+        for acc in (self, *self.accessories.values()):
+            for service in acc.services:
+                for char in service.characteristics:
+                    converter = get_value_converter(char)
+                    iid = acc.iid_manager.get_iid(char)
+                    if converter is not None and iid is not None:
+                        lookup[(acc.aid, iid)] = (char, converter)
+        self.lookup = lookup
+
+    def drain(self):
+        """Apply up to ``batch_size`` waiting records.
+
+        :return: The number of records read.
+        :rtype: int
+        """
+        records = self.ring.read(self.batch_size)
+        if not records:
+            return 0
+        lookup = self.lookup
+        latest = {}
+        for aid, iid, value in records:
+            target = lookup.get((aid, iid))
+            if target is None:
+                self.stats['unknown'] += 1
+            else:
+                latest[target] = value
+        with self.driver.batch():
+            for (char, converter), value in latest.items():
+                try:
+                    char.set_value(converter(value))
+                except (ValueError, OverflowError):
+                    self.stats['invalid'] += 1
+                    continue
+                self.stats['updates'] += 1
+        return len(records)
+
+    def open_ring(self):
+        """Open the ring buffer and wait on its doorbell in the event loop."""
+        self.ring = RingBuffer.open(self.path, self.capacity, self.mode)
+        self._doorbell = self.ring.doorbell()
+        if self._doorbell is not None:
+            self._wakeup = asyncio.Event(loop=self.driver.loop)
+            self.driver.loop.add_reader(self._doorbell, self._wakeup.set)
+
+    async def wait_for_records(self):
+        """Wait until the doorbell rings or ``poll_interval`` expires."""
+        ring = self.ring
+        ring.set_waiting(True)
+        if not len(ring):
+            await util.event_wait(self._wakeup, self.poll_interval)
+        self._wakeup.clear()
+        if self.ring is ring:  # Not closed meanwhile.
+            ring.set_waiting(False)
+            ring.clear_doorbell()
+
+    async def run(self):
+        """Start the contained accessories and drain the ring buffer until stopped."""
+        self.build_lookup()
+        self.open_ring()
+        await super().run()
+        stop_event = self.driver.aio_stop_event
+        while self.ring is not None and not stop_event.is_set():
+            if self.drain() == self.batch_size:
+                await asyncio.sleep(0)  # More are waiting, let others run first.
+            elif self._doorbell is not None:
+                await self.wait_for_records()
+            elif await util.event_wait(stop_event, self.poll_interval):
+                break
+
+    async def stop(self):
+        """Stop the contained accessories and close the ring buffer."""
+        await super().stop()
+        if self._doorbell is not None:
+            self.driver.loop.remove_reader(self._doorbell)
+            self._wakeup.set()
+            self._doorbell = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -109,6 +109,17 @@ class SDS011(Accessory):
         return next(state for threshold, state in self.SORTED_PM_QUALITY_MAP
                     if threshold <= pm)
 
+    def update_readings(self):
+        """Query the sensor and notify clients about all readings at once."""
+        pm25, pm10 = self.sensor.query()
+        with self.driver.batch():
+            self.pm25_density.set_value(pm25)
+            self.pm25_quality.set_value(
+                self.get_quality_classification(pm25, is_pm25=True))
+            self.pm10_density.set_value(pm10)
+            self.pm10_quality.set_value(
+                self.get_quality_classification(pm10, is_pm25=False))
+
     def run(self):
         """Start updating the air quality readings.
 
@@ -118,24 +129,12 @@ class SDS011(Accessory):
             - Wake up and wait `self.calib_duration_s` seconds.
             - Get the sensor's readings and update.
         """
-        pm25, pm10 = self.sensor.query()
-        self.pm25_density.set_value(pm25)
-        self.pm25_quality.set_value(
-            self.get_quality_classification(pm25, is_pm25=True))
-        self.pm10_density.set_value(pm10)
-        self.pm10_quality.set_value(
-            self.get_quality_classification(pm10, is_pm25=False))
+        self.update_readings()
         self.sensor.sleep()
         while not self.driver.stop_event.wait(self.sleep_duration_s):
             logger.debug("Waking up sensor.")
             self.sensor.sleep(sleep=False)
             time.sleep(self.calib_duration_s)
-            pm25, pm10 = self.sensor.query()
-            self.pm25_density.set_value(pm25)
-            self.pm25_quality.set_value(
-                self.get_quality_classification(pm25, is_pm25=True))
-            self.pm10_density.set_value(pm10)
-            self.pm10_quality.set_value(
-                self.get_quality_classification(pm10, is_pm25=False))
+            self.update_readings()
             self.sensor.sleep()
             logger.debug("Read cycle done. Sleeping.")
@@ -0,0 +1,216 @@
+"""This module provides UdpBridge - a bridge that receives characteristic updates from
+remote devices as lines of text in UDP datagrams.
+
+Low-power sensor nodes can send a reading with a single datagram, without a TCP
+connection or JSON. Each line of a datagram sets one value and is either
+``<aid>.<iid>=<value>`` or ``<aid>/<service>/<characteristic>=<value>``, e.g.::
+
+    2.10=21.5
+    2/TemperatureSensor/CurrentTemperature=21.5
+    3/MotionSensor/MotionDetected=1
+
+Values are parsed according to the format of the characteristic: ``1``, ``0``,
+``true`` and ``false`` for booleans, numbers for numeric formats and the raw text for
+strings. The lines are resolved through a lookup table that is built when the bridge
+starts, see `UdpBridge.build_lookup`.
+"""
+import asyncio
+import logging
+import math
+
+from pyhap.accessory import Bridge
+from pyhap.characteristic import HAP_FORMAT_BOOL, HAP_FORMAT_FLOAT, HAP_FORMAT_NUMERICS
+from pyhap.const import CATEGORY_OTHER
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = 10000
+"""Maximum number of distinct characteristics with updates waiting to be applied."""
+
+_BOOLS = {b'1': True, b'true': True, b'0': False, b'false': False}
+
+
+def _parse_bool(text):
+    return _BOOLS[text.strip().lower()]
+
+
+def _parse_float(text):
+    value = float(text)
+    # NaN would pass the min/max checks and end up in events as invalid JSON.
+    if not math.isfinite(value):
+        raise ValueError('Not a finite number: {!r}'.format(text))
+    return value
+
+
+def _parse_int(text):
+    return int(text)
+
+
+def _parse_string(text):
+    return text.decode('utf-8')
+
+
+def get_value_parser(char):
+    """Return a function that converts the text of a line to a value for the char.
+
+    The function raises ``ValueError`` or ``KeyError`` if the text is not valid.
+    """
+    value_format = char.properties['Format']
+    if value_format == HAP_FORMAT_BOOL:
+        return _parse_bool
+    if value_format == HAP_FORMAT_FLOAT:
+        return _parse_float
+    if value_format in HAP_FORMAT_NUMERICS:
+        return _parse_int
+    return _parse_string
+
+
+class UdpBridge(Bridge):
+    """A bridge that applies the updates received as datagrams to its accessories.
+
+    The updates of the datagrams that arrive in the same iteration of the event loop
+    are applied together, so clients are notified once, see `AccessoryDriver.batch`.
+    If a characteristic is updated more than once, only the last valid value is applied.
+
+    The bridge counts what it receives in `stats`:
+
+    - ``datagrams`` - The datagrams received.
+    - ``updates`` - The values that were set.
+    - ``parse_errors`` - Lines that are not in the line protocol, or with a value
+      that is not valid for the characteristic.
+    - ``unknown`` - Lines for a characteristic that is not in the lookup table.
+    - ``dropped`` - Updates that were discarded, because `MAX_PENDING`
+      characteristics were already waiting.
+
+    >>> udp_bridge = UdpBridge(("", 51112), driver, "UDP Bridge")
+    >>> udp_bridge.add_accessory(temperature_acc)
+    """
+
+    category = CATEGORY_OTHER
+
+    def __init__(self, address, *args, **kwargs):
+        """Initialise and add the given services.
+
+        :param address: The address-port on which to listen for datagrams.
+        :type address: tuple(str, int)
+        """
+        super().__init__(*args, **kwargs)
+        self.address = address
+        self.transport = None
+        self.lookup = {}
+        self.stats = dict.fromkeys(
+            ('datagrams', 'updates', 'parse_errors', 'unknown', 'dropped'), 0)
+        self._pending = {}  # char: valid value
+        self._flush_scheduled = False
+
+    def __getstate__(self):
+        """Return the state of this instance, less the transport and lookup table."""
+        state = super().__getstate__()
+        state['transport'] = None
+        state['lookup'] = {}
+        state['_pending'] = {}
+        state['_flush_scheduled'] = False
+        return state
+
+    def build_lookup(self):
+        """Map both line keys of every characteristic to it and its value parser.
+
+        Called when the bridge starts. Call it again if accessories, services or
+        characteristics are added afterwards.
+        """
+        lookup = {}
+        for acc in (self, *self.accessories.values()):
+            for service in acc.services:
+                for char in service.characteristics:
+                    target = (char, get_value_parser(char))
+                    iid = acc.iid_manager.get_iid(char)
+                    if iid is not None:
+                        lookup['{}.{}'.format(acc.aid, iid).encode()] = target
+                    name_key = '{}/{}/{}'.format(acc.aid, service.display_name,
+                                                 char.display_name).encode('utf-8')
+                    # The first service with a name wins, like Accessory.get_service.
+                    lookup.setdefault(name_key, target)
+        self.lookup = lookup
+
+    def datagram_received(self, data):
+        """Parse and validate the lines of a datagram and schedule their updates.
+
+        Lines that are not valid are counted and dropped, so they never replace a
+        valid update of the same characteristic that is still pending.
+        """
+        self.stats['datagrams'] += 1
+        lookup = self.lookup
+        pending = self._pending
+        for line in data.splitlines():
+            key, sep, text = line.partition(b'=')
+            if not sep:
+                if line.strip():
+                    self.stats['parse_errors'] += 1
+                continue
+            target = lookup.get(key.strip())
+            if target is None:
+                self.stats['unknown'] += 1
+                continue
+            char, parser = target
+            try:
+                value = char.to_valid_value(parser(text.strip()))
+            except (ValueError, KeyError, TypeError, UnicodeDecodeError):
+                self.stats['parse_errors'] += 1
+                continue
+            if char not in pending and len(pending) >= MAX_PENDING:
+                self.stats['dropped'] += 1
+                continue
+            pending[char] = value
+
+        if pending and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.driver.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Apply the pending updates and notify clients once."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        with self.driver.batch():
+            for char, value in pending.items():
+                char.set_value(value)
+        self.stats['updates'] += len(pending)
+
+    async def async_start_server(self):
+        """Build the lookup table and start listening for datagrams."""
+        self.build_lookup()
+        host, port = self.address
+        self.transport, _ = await self.driver.loop.create_datagram_endpoint(
+            lambda: _UdpBridgeProtocol(self), local_addr=(host or '0.0.0.0', port))
+        logger.debug('UDP bridge listening on %s',
+                     self.transport.get_extra_info('sockname'))
+
+    def stop_server(self):
+        """Stop listening for datagrams."""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    async def run(self):
+        """Start the server and the contained accessories."""
+        logger.debug("Starting UDP bridge server.")
+        await self.async_start_server()
+        await super().run()
+
+    async def stop(self):
+        """Stop the server and the contained accessories."""
+        logger.debug("Stopping UDP bridge server.")
+        self.stop_server()
+        await super().stop()
+
+
+class _UdpBridgeProtocol(asyncio.DatagramProtocol):
+    """Pass received datagrams to a UdpBridge."""
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+
+    def datagram_received(self, data, addr):
+        self.bridge.datagram_received(data)
+
+    def error_received(self, exc):
+        logger.warning('UDP bridge error: %s', exc)
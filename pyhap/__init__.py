@@ -5,6 +5,8 @@ _RESOURCE_DIR = os.path.join(_ROOT, "resources")
 
 CHARACTERISTICS_FILE = os.path.join(_RESOURCE_DIR, "characteristics.json")
 SERVICES_FILE = os.path.join(_RESOURCE_DIR, "services.json")
+# Precompiled from the two files above by `scripts/gen_hap_types.py --registry`.
+TYPES_REGISTRY_FILE = os.path.join(_RESOURCE_DIR, "types.pickle")
 
 
 # Flag if QR Code dependencies are installed.
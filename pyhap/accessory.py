@@ -5,8 +5,9 @@ import struct
 
 from pyhap import util, SUPPORT_QR_CODE
 from pyhap.const import (
-    STANDALONE_AID, HAP_REPR_AID, HAP_REPR_IID, HAP_REPR_SERVICES,
-    HAP_REPR_VALUE, CATEGORY_OTHER, CATEGORY_BRIDGE)
+    STANDALONE_AID, HAP_REPR_AID, HAP_REPR_CHARS, HAP_REPR_DESC, HAP_REPR_IID,
+    HAP_REPR_SERVICES, HAP_REPR_TYPE, HAP_REPR_VALUE, CATEGORY_OTHER,
+    CATEGORY_BRIDGE, MAX_ACCESSORIES_PER_BRIDGE)
 from pyhap.iid_manager import IIDManager
 
 if SUPPORT_QR_CODE:
@@ -48,8 +49,8 @@ class Accessory:
         self.display_name = display_name
         self.driver = driver
         self.reachable = True
-        self.services = []
         self.iid_manager = IIDManager()
+        self.services = []
 
         self.add_info_service()
         self._set_services()
@@ -60,6 +61,28 @@ class Accessory:
         return "<accessory display_name='{}' services={}>" \
             .format(self.display_name, services)
 
+    @property
+    def services(self):
+        """The services of this Accessory.
+
+        Assign a new list rather than changing it in place, so that the name and type
+        indexes stay consistent. Use `add_service` to add services.
+        """
+        return self._services
+
+    @services.setter
+    def services(self, services):
+        self._services = []
+        self._services_by_name = {}
+        self._services_by_type = {}
+        for s in services:
+            self._append_service(s)
+
+    def _append_service(self, service):
+        self._services.append(service)
+        self._services_by_name.setdefault(service.display_name, service)
+        self._services_by_type.setdefault(service.type_id, service)
+
     def __getstate__(self):
         state = self.__dict__.copy()
         state['driver'] = None
@@ -146,7 +169,7 @@ class Accessory:
         :type: Service
         """
         for s in servs:
-            self.services.append(s)
+            self._append_service(s)
             self.iid_manager.assign(s)
             s.broker = self
             for c in s.characteristics:
@@ -166,7 +189,103 @@ class Accessory:
             Accessory.
         :rtype: Service
         """
-        return next((s for s in self.services if s.display_name == name), None)
+        return self._services_by_name.get(name)
+
+    def get_service_by_type(self, type_id):
+        """Return a Service with the given type.
+
+        A single Service is returned even if more than one Service with the same type
+        are present.
+
+        :param type_id: The UUID of the service type.
+        :type type_id: uuid.UUID
+
+        :return: A Service with the given type or None if no such service exists in this
+            Accessory.
+        :rtype: Service
+        """
+        return self._services_by_type.get(type_id)
+
+    @property
+    def id_key(self):
+        """Return a key that identifies this accessory across restarts.
+
+        This is the serial number, unless it is the default one, else the display name.
+
+        :rtype: str
+        """
+        serv_info = self.get_service('AccessoryInformation')
+        if serv_info is not None:
+            serial_number = serv_info.get_characteristic('SerialNumber').value
+            if serial_number and serial_number != 'default':
+                return 'serial:' + serial_number
+        return 'name:' + self.display_name
+
+    def get_id_keys(self):
+        """Return a key for every service and characteristic of this accessory.
+
+        Services are identified by their type and their index among the services of
+        that type, characteristics by that and their own type, e.g.
+        ``0000003E-0000-1000-8000-0026BB765291.0/00000023-0000-1000-8000-0026BB765291``.
+
+        :return: ``(key, obj)`` pairs.
+        :rtype: list
+        """
+        keyed_objs = []
+        service_count = {}
+        for s in self.services:
+            index = service_count.get(s.type_id, 0)
+            service_count[s.type_id] = index + 1
+            service_key = '{}.{}'.format(str(s.type_id).upper(), index)
+            keyed_objs.append((service_key, s))
+            keyed_objs.extend(
+                ('{}/{}'.format(service_key, str(c.type_id).upper()), c)
+                for c in s.characteristics)
+        return keyed_objs
+
+    def allocate_ids(self, allocations):
+        """Make the IIDs of this accessory stable across restarts.
+
+        IIDs are normally assigned in the order in which services and characteristics
+        are added. This restores the IIDs from the persisted allocation map instead,
+        and records the IIDs of new services and characteristics in it.
+
+        :param allocations: The persisted allocation map, see `State.id_allocations`.
+            It is updated in place.
+        :type allocations: dict
+        """
+        iids = allocations.setdefault('iids', {}).setdefault(str(self.aid), {})
+        self.iid_manager.restore(self.get_id_keys(), iids)
+
+    def set_values(self, values):
+        """Set the values of several characteristics and notify clients once.
+
+        All values are validated before any is set, so either all or none of them
+        change. Subscribed clients get the changes in a single event, see
+        `AccessoryDriver.batch`.
+
+        :param values: The values to set, by service and characteristic name, e.g.
+            ``{'TemperatureSensor': {'CurrentTemperature': 21.5},
+            'HumiditySensor': {'CurrentRelativeHumidity': 40}}``.
+        :type values: dict
+
+        :raise ValueError: If a service or characteristic does not exist or a value is
+            not valid for its characteristic.
+        """
+        updates = []
+        for service_name, char_values in values.items():
+            service = self.get_service(service_name)
+            if service is None:
+                raise ValueError('Service {} not found'.format(service_name))
+            for char_name, value in char_values.items():
+                char = service.get_characteristic(char_name)
+                updates.append((char, char.to_valid_value(value)))
+
+        with self.driver.batch():
+            for char, value in updates:
+                char.value = value
+                if char.broker:
+                    char.notify()
 
     def xhm_uri(self):
         """Generates the X-HM:// uri (Setup Code URI)
@@ -224,6 +343,28 @@ class Accessory:
             HAP_REPR_SERVICES: [s.to_HAP() for s in self.services],
         }
 
+    def to_config(self):
+        """A representation of the structure of this Accessory, without values.
+
+        Contains the AIDs, IIDs, types, names and properties that HAP clients cache
+        from the ``/accessories`` response, see `AccessoryDriver.get_config_hash`.
+
+        :rtype: dict
+        """
+        return {
+            HAP_REPR_AID: self.aid,
+            HAP_REPR_SERVICES: [{
+                HAP_REPR_IID: self.iid_manager.get_iid(service),
+                HAP_REPR_TYPE: str(service.type_id).upper(),
+                HAP_REPR_CHARS: [{
+                    HAP_REPR_IID: self.iid_manager.get_iid(char),
+                    HAP_REPR_TYPE: str(char.type_id).upper(),
+                    HAP_REPR_DESC: char.display_name,
+                    'properties': char.properties,
+                } for char in service.characteristics],
+            } for service in self.services],
+        }
+
     def setup_message(self):
         """Print setup message to console.
 
@@ -288,7 +429,7 @@ class Accessory:
 
     # Driver
 
-    def publish(self, value, sender):
+    def publish(self, value, sender, sender_client_addr=None):
         """Append AID and IID of the sender and forward it to the driver.
 
         Characteristics call this method to send updates.
@@ -298,13 +439,17 @@ class Accessory:
 
         :param sender: The Service or Characteristic from which the call originated.
         :type: Service or Characteristic
+
+        :param sender_client_addr: The client that caused the update, which will not
+            be notified.
+        :type sender_client_addr: tuple <str, int>
         """
         acc_data = {
             HAP_REPR_AID: self.aid,
             HAP_REPR_IID: self.iid_manager.get_iid(sender),
             HAP_REPR_VALUE: value,
         }
-        self.driver.publish(acc_data)
+        self.driver.publish(acc_data, sender_client_addr)
 
 
 class Bridge(Accessory):
@@ -318,6 +463,7 @@ class Bridge(Accessory):
     def __init__(self, driver, display_name):
         super().__init__(driver, display_name, aid=STANDALONE_AID)
         self.accessories = {}  # aid: acc
+        self._auto_aid_accessories = set()  # accessories with an assigned AID
 
     def add_accessory(self, acc):
         """Add the given ``Accessory`` to this ``Bridge``.
@@ -330,6 +476,10 @@ class Bridge(Accessory):
 
         .. note:: A ``Bridge`` cannot be added to another ``Bridge``.
 
+        .. note:: Controllers reject bridges with more than
+            ``MAX_ACCESSORIES_PER_BRIDGE`` accessories, including the bridge. Use
+            `DriverHost.add_bridges` to split large sets across several bridges.
+
         :param acc: The ``Accessory`` to be bridged.
         :type acc: Accessory
 
@@ -342,12 +492,66 @@ class Bridge(Accessory):
 
         if acc.aid is None:
             # For some reason AID=7 gets unsupported. See issue #61
-            acc.aid = next(aid for aid in itertools.count(2)
-                           if aid != 7 and aid not in self.accessories)
+            acc.aid = self._next_free_aid(self.accessories)
+            self._auto_aid_accessories.add(acc)
         elif acc.aid == self.aid or acc.aid in self.accessories:
             raise ValueError("Duplicate AID found when attempting to add accessory")
 
         self.accessories[acc.aid] = acc
+        if len(self.accessories) == MAX_ACCESSORIES_PER_BRIDGE:
+            logger.warning('Bridge %s has more than %d accessories, controllers will '
+                           'reject it', self.display_name, MAX_ACCESSORIES_PER_BRIDGE)
+
+    @staticmethod
+    def _next_free_aid(used):
+        # For some reason AID=7 gets unsupported. See issue #61
+        return next(aid for aid in itertools.count(2) if aid != 7 and aid not in used)
+
+    def allocate_ids(self, allocations):
+        """Make the AIDs and IIDs of this bridge and its accessories stable.
+
+        Bridged accessories that were given an AID by `add_accessory` get back the AID
+        persisted for their `Accessory.id_key`. Explicitly set AIDs are left as they
+        are. AIDs of accessories that were removed are not reused. The keys of the
+        accessories that are bridged now are recorded under ``bridged``, see
+        `DriverHost.add_bridges`.
+
+        .. seealso:: Accessory.allocate_ids
+        """
+        aids = allocations.setdefault('aids', {})
+        keys = {}  # acc: key
+        seen = {}  # key: number of accessories with that key
+        for acc in self.accessories.values():
+            if acc in self._auto_aid_accessories:
+                key = acc.id_key
+                count = seen.get(key, 0)
+                seen[key] = count + 1
+                keys[acc] = key if count == 0 else '{}#{}'.format(key, count)
+
+        assigned = {}  # acc: aid
+        taken = {aid for aid, acc in self.accessories.items() if acc not in keys}
+        for acc, key in keys.items():
+            aid = aids.get(key)
+            if aid is not None and aid not in taken:
+                assigned[acc] = aid
+                taken.add(aid)
+        reserved = taken | set(aids.values())
+        for acc, key in keys.items():
+            if acc not in assigned:
+                aid = acc.aid
+                if aid in reserved:
+                    aid = self._next_free_aid(reserved)
+                aids[key] = assigned[acc] = aid
+                reserved.add(aid)
+
+        for acc, aid in assigned.items():
+            acc.aid = aid
+        self.accessories = {acc.aid: acc for acc in self.accessories.values()}
+        allocations['bridged'] = sorted(keys.values())
+
+        super().allocate_ids(allocations)
+        for acc in self.accessories.values():
+            acc.allocate_ids(allocations)
 
     def to_HAP(self):
         """Returns a HAP representation of itself and all contained accessories.
@@ -356,6 +560,13 @@ class Bridge(Accessory):
         """
         return [acc.to_HAP() for acc in (super(), *self.accessories.values())]
 
+    def to_config(self):
+        """Returns the structure of itself and all contained accessories.
+
+        .. seealso:: Accessory.to_config
+        """
+        return [acc.to_config() for acc in (super(), *self.accessories.values())]
+
     def get_characteristic(self, aid, iid):
         """.. seealso:: Accessory.to_HAP"""
         if self.aid == aid:
@@ -22,22 +22,28 @@ or went to sleep before telling us. This concludes the publishing process from t
 AccessoryDriver.
 """
 import asyncio
+import contextlib
+import copy
+from collections import OrderedDict
+from collections.abc import Mapping
 from concurrent.futures import ThreadPoolExecutor
 import os
 import logging
 import socket
 import hashlib
+import io
 import base64
 import sys
-import time
+import tempfile
 import threading
 import json
 import queue
 
 from zeroconf import ServiceInfo, Zeroconf
 
+from pyhap import util
 from pyhap.accessory import get_topic
-from pyhap.characteristic import CharacteristicError
+from pyhap.characteristic import Characteristic, CharacteristicError
 from pyhap.const import (
     STANDALONE_AID, HAP_PERMISSION_NOTIFY, HAP_REPR_ACCS, HAP_REPR_AID,
     HAP_REPR_CHARS, HAP_REPR_IID, HAP_REPR_STATUS, HAP_REPR_VALUE)
@@ -51,9 +57,34 @@ from pyhap.state import State
 logger = logging.getLogger(__name__)
 
 CHAR_STAT_OK = 0
+CONFIG_CHANGE_DELAY = 0.5  # seconds in which changes are combined, see config_changed
 SERVICE_COMMUNICATION_FAILURE = -70402
 
 
+def _config_json_default(value):
+    """Serialize the frozen property values for `AccessoryDriver.get_config_hash`."""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    return str(value)
+
+
+def create_event_loop():
+    """Return a new event loop for the platform."""
+    if sys.platform == 'win32':
+        return asyncio.ProactorEventLoop()
+    return asyncio.new_event_loop()
+
+
+def create_executer():
+    """Return a new executor for the synchronous jobs of drivers."""
+    executer_opts = {'max_workers': None}
+    if sys.version_info >= (3, 6):
+        executer_opts['thread_name_prefix'] = 'SyncWorker'
+    return ThreadPoolExecutor(**executer_opts)
+
+
 def callback(func):
     """Decorator for non blocking functions."""
     setattr(func, '_pyhap_callback', True)
@@ -65,6 +96,19 @@ def is_callback(func):
     return '_pyhap_callback' in getattr(func, '__dict__', {})
 
 
+def _snapshot(obj):
+    """Return a copy of nested dicts and lists, copying each in one step."""
+    if type(obj) is dict:  # pylint: disable=unidiomatic-typecheck
+        obj = obj.copy()
+        for key, value in obj.items():
+            if type(value) in (dict, list):
+                obj[key] = _snapshot(value)
+        return obj
+    if type(obj) is list:  # pylint: disable=unidiomatic-typecheck
+        return [_snapshot(value) for value in list(obj)]
+    return obj
+
+
 class AccessoryMDNSServiceInfo(ServiceInfo):
     """A mDNS service info representation of an accessory."""
 
@@ -119,7 +163,8 @@ class AccessoryDriver:
 
     def __init__(self, *, address=None, port=51234,
                  persist_file='accessory.state', pincode=None,
-                 encoder=None, loader=None, loop=None):
+                 encoder=None, loader=None, loop=None, interface=None,
+                 executer=None, advertiser=None):
         """
         Initialize a new AccessoryDriver object.
 
@@ -138,6 +183,10 @@ class AccessoryDriver:
             driver will try to select an address.
         :type address: str
 
+        :param interface: The network interface whose address to use if no address is
+            given, e.g. "eth0". Defaults to the interface of the default route.
+        :type interface: str
+
         :param persist_file: The file name in which the state of the accessory
             will be persisted. This uses `expandvars`, so may contain `~` to
             refer to the user's home directory.
@@ -145,39 +194,56 @@ class AccessoryDriver:
 
         :param encoder: The encoder to use when persisting/loading the Accessory state.
         :type encoder: AccessoryEncoder
-        """
-        if sys.platform == 'win32':
-            self.loop = loop or asyncio.ProactorEventLoop()
-        else:
-            self.loop = loop or asyncio.new_event_loop()
 
-        executer_opts = {'max_workers': None}
-        if sys.version_info >= (3, 6):
-            executer_opts['thread_name_prefix'] = 'SyncWorker'
+        :param executer: An executor shared with other drivers. It is not shut down
+            when this driver stops. See `pyhap.host.DriverHost`.
+        :type executer: concurrent.futures.ThreadPoolExecutor
 
-        self.executer = ThreadPoolExecutor(**executer_opts)
+        :param advertiser: A Zeroconf instance shared with other drivers. It is not
+            closed when this driver stops.
+        :type advertiser: zeroconf.Zeroconf
+        """
+        self.loop = loop or create_event_loop()
+        self._owns_executer = executer is None
+        self.executer = executer or create_executer()
         self.loop.set_default_executor(self.executer)
 
+        self.host = None  # the DriverHost that runs this driver, if any
         self.accessory = None
         self.http_server_thread = None
-        self.advertiser = Zeroconf()
+        self._owns_advertiser = advertiser is None
+        self.advertiser = advertiser or Zeroconf()
         self.persist_file = os.path.expanduser(persist_file)
         self.encoder = encoder or AccessoryEncoder()
+        self._persist_lock = threading.Lock()  # serializes writes of the persist file
+        self._persist_scheduled = False
+        self._persist_data = None  # the latest encoded state, see schedule_persist
+        self._persist_scheduled_lock = threading.Lock()
+        self.config_change_delay = CONFIG_CHANGE_DELAY
+        self._update_scheduled = False  # whether _apply_pending_update is scheduled
+        self._pending_config_change = False
+        self._pending_advertisement = False
+        self._pending_update_lock = threading.Lock()
         self.topics = {}  # topic: set of (address, port) of subscribed clients
         self.topic_lock = threading.Lock()  # for exclusive access to the topics
         self.loader = loader or Loader()
         self.aio_stop_event = asyncio.Event(loop=self.loop)
         self.stop_event = threading.Event()
-        self.event_queue = queue.Queue()  # (topic, bytes)
+        # (topics, bytedata, sender_client_addr, client_addr), see send_events
+        self.event_queue = queue.Queue()
+        self._batch = threading.local()  # events of a thread's open batch
         self.send_event_thread = None  # the event dispatch thread
         self.sent_events = 0
         self.accumulated_qsize = 0
 
         self.mdns_service_info = None
         self.srp_verifier = None
+        self.srp_verifier_future = None  # verifier for the next pairing attempt
+        self._srp_password_verifier = None  # (pincode, salt, verifier)
         self.accessory_thread = None
 
-        self.state = State(address=address, pincode=pincode, port=port)
+        self.state = State(address=address, pincode=pincode, port=port,
+                           interface=interface)
         network_tuple = (self.state.address, self.state.port)
         self.http_server = HAPServer(network_tuple, self)
 
@@ -231,6 +297,10 @@ class AccessoryDriver:
         self.http_server_thread = threading.Thread(target=self.http_server.serve_forever)
         self.http_server_thread.start()
 
+        # Increment the config version if the accessories changed since the last run.
+        if self.update_config_hash():
+            self.schedule_persist()
+
         # Advertise the accessory as a mDNS service.
         self.mdns_service_info = AccessoryMDNSServiceInfo(
             self.accessory, self.state)
@@ -238,6 +308,7 @@ class AccessoryDriver:
 
         # Print accessory setup message
         if not self.state.paired:
+            self.precompute_srp_verifier()
             self.accessory.setup_message()
 
         # Start the accessory so it can do stuff.
@@ -250,10 +321,17 @@ class AccessoryDriver:
             self.loop.create_task, self.async_stop())
 
     async def async_stop(self):
-        """Stops the AccessoryDriver and shutdown all remaining tasks."""
+        """Stops the AccessoryDriver and shutdown all remaining tasks.
+
+        A driver that runs in a `DriverHost` only stops itself; the loop and the
+        shared executor keep running for the other drivers.
+        """
         await self.async_add_job(self._do_stop)
-        logger.debug('Shutdown executers')
-        self.executer.shutdown()
+        if self.host is not None:
+            return
+        if self._owns_executer:
+            logger.debug('Shutdown executers')
+            self.executer.shutdown()
         self.loop.stop()
 
     def _do_stop(self):
@@ -273,10 +351,12 @@ class AccessoryDriver:
         self.stop_event.set()
         self.loop.call_soon_threadsafe(self.aio_stop_event.set)
         self.add_job(self.accessory.stop)
+        self._apply_pending_update()
 
         logger.debug("Stopping mDNS advertising")
         self.advertiser.unregister_service(self.mdns_service_info)
-        self.advertiser.close()
+        if self._owns_advertiser:
+            self.advertiser.close()
 
         logger.debug("Stopping HAP server")
         self.http_server.shutdown()
@@ -319,7 +399,11 @@ class AccessoryDriver:
             self.async_add_job(target, *args)
 
     def add_accessory(self, accessory):
-        """Add top level accessory to driver."""
+        """Add top level accessory to driver.
+
+        Loads the persisted state, if any, and restores the AIDs and IIDs allocated
+        in an earlier run.
+        """
         self.accessory = accessory
         if accessory.aid is None:
             accessory.aid = STANDALONE_AID
@@ -328,8 +412,13 @@ class AccessoryDriver:
         if os.path.exists(self.persist_file):
             logger.info("Loading Accessory state from `%s`", self.persist_file)
             self.load()
+            allocations = copy.deepcopy(self.state.id_allocations)
+            accessory.allocate_ids(self.state.id_allocations)
+            if allocations != self.state.id_allocations:
+                self.persist()
         else:
             logger.info("Storing Accessory state in `%s`", self.persist_file)
+            accessory.allocate_ids(self.state.id_allocations)
             self.persist()
 
     def subscribe_client_topic(self, client, topic, subscribe=True):
@@ -352,6 +441,7 @@ class AccessoryDriver:
                 if subscribed_clients is None:
                     subscribed_clients = set()
                     self.topics[topic] = subscribed_clients
+                    self._set_has_subscribers(topic, True)
                 subscribed_clients.add(client)
             else:
                 if topic not in self.topics:
@@ -360,8 +450,16 @@ class AccessoryDriver:
                 subscribed_clients.discard(client)
                 if not subscribed_clients:
                     del self.topics[topic]
+                    self._set_has_subscribers(topic, False)
+
+    def _set_has_subscribers(self, topic, has_subscribers):
+        """Update the flag that lets the characteristic skip notifying nobody."""
+        aid, iid = topic.split('.')
+        char = self.accessory.get_characteristic(int(aid), int(iid))
+        if isinstance(char, Characteristic):
+            char.has_subscribers = has_subscribers
 
-    def publish(self, data):
+    def publish(self, data, sender_client_addr=None):
         """Publishes an event to the client.
 
         The publishing occurs only if the current client is subscribed to the topic for
@@ -370,14 +468,73 @@ class AccessoryDriver:
         :param data: The data to publish. It must at least contain the keys "aid" and
             "iid".
         :type data: dict
+
+        :param sender_client_addr: The client that caused the event, e.g. by writing
+            the value. It already knows about the change and is not notified.
+        :type sender_client_addr: tuple <str, int>
         """
         topic = get_topic(data[HAP_REPR_AID], data[HAP_REPR_IID])
-        if topic not in self.topics:
+        subscribed_clients = self.topics.get(topic)
+        if not subscribed_clients or \
+                subscribed_clients == {sender_client_addr}:
+            return
+
+        batch_events = getattr(self._batch, 'events', None)
+        if batch_events is not None:
+            # Only the last change of a characteristic is sent.
+            batch_events[topic] = (data, sender_client_addr)
+            batch_events.move_to_end(topic)
             return
 
         data = {HAP_REPR_CHARS: [data]}
         bytedata = json.dumps(data).encode()
-        self.event_queue.put((topic, bytedata))
+        self.event_queue.put(((topic,), bytedata, sender_client_addr, None))
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group the events published in this thread into one notification per client.
+
+        Inside the ``with`` block, `publish` collects events instead of queueing them.
+        On exit, every subscribed client gets a single event with all the changes it
+        is subscribed to. Batches can be nested, the outermost one sends the events.
+
+        .. code-block:: python
+
+            with driver.batch():
+                temperature.set_value(21.5)
+                humidity.set_value(40)
+        """
+        if getattr(self._batch, 'events', None) is not None:
+            yield
+            return
+
+        # topic: (data, sender_client_addr), in the order of the last change
+        self._batch.events = OrderedDict()
+        try:
+            yield
+        finally:
+            events = self._batch.events
+            self._batch.events = None
+            self._publish_batch(events)
+
+    def _publish_batch(self, events):
+        """Queue one event per client with all the batched events it subscribed to."""
+        client_events = {}  # client_addr: [(topic, data), ...]
+        with self.topic_lock:
+            for topic, (data, sender_client_addr) in events.items():
+                for client_addr in self.topics.get(topic, ()):
+                    if client_addr != sender_client_addr:
+                        client_events.setdefault(client_addr, []).append((topic, data))
+
+        encoded = {}  # topics: bytedata, shared by clients with the same subscriptions
+        for client_addr, topic_events in client_events.items():
+            topics = tuple(topic for topic, _data in topic_events)
+            bytedata = encoded.get(topics)
+            if bytedata is None:
+                bytedata = json.dumps(
+                    {HAP_REPR_CHARS: [data for _topic, data in topic_events]}).encode()
+                encoded[topics] = bytedata
+            self.event_queue.put((topics, bytedata, None, client_addr))
 
     def send_events(self):
         """Start sending events from the queue to clients.
@@ -389,6 +546,10 @@ class AccessoryDriver:
         Whenever sending an event fails (i.e. HAPServer.push_event returns False), the
         intended client is removed from the set of subscribed clients for the topic.
 
+        Queued events are ``(topics, bytedata, sender_client_addr, client_addr)``. If
+        ``client_addr`` is None, the event is for a single topic and sent to all its
+        subscribers except the sender, else it is a batch sent to that client only.
+
         @note: This method blocks on Queue.get, waiting for something to come. Thus, if
         this is not run in a daemon thread or it is run on the main thread, the app will
         hang.
@@ -396,17 +557,23 @@ class AccessoryDriver:
         while not self.loop.is_closed():
             # Maybe consider having a pool of worker threads, each performing a send in
             # order to increase throughput.
-            topic, bytedata = self.event_queue.get()
-            subscribed_clients = self.topics.get(topic, [])
-            logger.debug('Send event: topic(%s), data(%s)', topic, bytedata)
-            for client_addr in subscribed_clients.copy():
+            topics, bytedata, sender_client_addr, client_addr = self.event_queue.get()
+            if client_addr is None:
+                subscribed_clients = self.topics.get(topics[0], set()).copy()
+            else:
+                subscribed_clients = (client_addr,)
+            logger.debug('Send event: topics(%s), data(%s)', topics, bytedata)
+            for client_addr in subscribed_clients:
+                if client_addr == sender_client_addr:
+                    continue
                 logger.debug('Sending event to client: %s', client_addr)
                 pushed = self.http_server.push_event(bytedata, client_addr)
                 if not pushed:
                     logger.debug('Could not send event to %s, probably stale socket.',
                                  client_addr)
                     # Maybe consider removing the client_addr from every topic?
-                    self.subscribe_client_topic(client_addr, topic, False)
+                    for topic in topics:
+                        self.subscribe_client_topic(client_addr, topic, False)
             self.event_queue.task_done()
             self.sent_events += 1
             self.accumulated_qsize += self.event_queue.qsize()
@@ -420,26 +587,174 @@ class AccessoryDriver:
     def config_changed(self):
         """Notify the driver that the accessory's configuration has changed.
 
-        Persists the accessory, so that the new configuration is available on
-        restart. Also, updates the mDNS advertisement, so that iOS clients know they need
-        to fetch new data.
+        Thread-safe. The change is applied in the executor after
+        ``config_change_delay`` seconds, together with all other changes and pairings
+        in that time. If the structure of the accessories changed, see
+        `update_config_hash`, the config version is incremented once, the state
+        persisted once and the mDNS advertisement updated once, so that iOS clients
+        know they need to fetch new data. If the event loop is not running, it is
+        applied right away.
+        """
+        self._schedule_update(config_changed=True)
+
+    def _schedule_update(self, config_changed=False):
+        """Schedule `_apply_pending_update`, unless it is already scheduled."""
+        with self._pending_update_lock:
+            if config_changed:
+                self._pending_config_change = True
+            else:
+                self._pending_advertisement = True
+            if self._update_scheduled:
+                return
+            self._update_scheduled = True
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(
+                self.loop.call_later, self.config_change_delay,
+                self.async_add_job, self._apply_pending_update)
+        else:
+            self._apply_pending_update()
+
+    def _apply_pending_update(self):
+        """Apply the changes scheduled with `_schedule_update`, if any."""
+        with self._pending_update_lock:
+            if not self._update_scheduled:
+                return
+            config_changed = self._pending_config_change
+            advertise = self._pending_advertisement
+            self._update_scheduled = False
+            self._pending_config_change = self._pending_advertisement = False
+        if config_changed:
+            self.accessory.allocate_ids(self.state.id_allocations)
+            # Bump the config version first, so the new version and hash are saved.
+            advertise |= self.update_config_hash()
+            self.schedule_persist()
+        if advertise:
+            self.update_advertisement()
+
+    def get_config_hash(self):
+        """Return a hash of the structure of the accessory.
+
+        The hash covers the AIDs, IIDs, types, names and properties of the accessory
+        and of any bridged accessories, see `Accessory.to_config`, but no values.
+
+        :rtype: str
+        """
+        config = json.dumps(self.accessory.to_config(), sort_keys=True,
+                            separators=(',', ':'), default=_config_json_default)
+        return hashlib.sha256(config.encode('utf-8')).hexdigest()
+
+    def update_config_hash(self):
+        """Increment the config version if the structure of the accessory changed.
+
+        The hash is compared with the one in the state, so unchanged accessories
+        keep their config version across restarts and redundant `config_changed`
+        calls. The state is not persisted.
+
+        :return: Whether the hash changed.
+        :rtype: bool
         """
-        self.state.config_version += 1
-        self.persist()
-        self.update_advertisement()
+        config_hash = self.get_config_hash()
+        if config_hash == self.state.config_hash:
+            return False
+        if self.state.config_hash is not None:
+            self.state.config_version += 1
+        self.state.config_hash = config_hash
+        return True
 
     def update_advertisement(self):
-        """Updates the mDNS service info for the accessory."""
-        self.advertiser.unregister_service(self.mdns_service_info)
+        """Updates the mDNS service info for the accessory.
+
+        The service is updated in place, so it stays advertised.
+        """
+        if self.mdns_service_info is None:
+            return  # Not advertised yet, the info is created on start.
+        old_info = self.mdns_service_info
         self.mdns_service_info = AccessoryMDNSServiceInfo(
             self.accessory, self.state)
-        time.sleep(0.1)  # Doing it right away can cause crashes.
-        self.advertiser.register_service(self.mdns_service_info)
+        util.update_service(self.advertiser, old_info, self.mdns_service_info)
 
     def persist(self):
-        """Saves the state of the accessory."""
-        with open(self.persist_file, 'w') as fp:
-            self.encoder.persist(fp, self.state)
+        """Saves the state of the accessory, atomically.
+
+        The state is written to a temporary file next to the persist file, synced to
+        disk and then renamed over the persist file. A crash or power loss leaves
+        either the previous or the new state, never a partial one.
+        """
+        self._write_state(self._serialize_state())
+
+    def _serialize_state(self):
+        """Return the encoded state, from a snapshot of it.
+
+        Every dict is copied in one step, so HAP server threads may pair and unpair
+        clients, and IDs may be allocated, meanwhile.
+
+        :rtype: str
+        """
+        state = copy.copy(self.state)
+        state.paired_clients = self.state.paired_clients.copy()
+        state.id_allocations = _snapshot(self.state.id_allocations)
+        fp = io.StringIO()
+        self.encoder.persist(fp, state)
+        return fp.getvalue()
+
+    def _write_state(self, data):
+        """Write the encoded state to the persist file, atomically."""
+        directory = os.path.dirname(os.path.abspath(self.persist_file))
+        with self._persist_lock:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=directory, prefix='.' + os.path.basename(self.persist_file),
+                suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as fp:
+                    fp.write(data)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                os.replace(tmp_path, self.persist_file)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(tmp_path)
+                raise
+            if os.name == 'posix':
+                # Make the rename itself durable.
+                dir_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+
+    def schedule_persist(self):
+        """Save the state of the accessory in the executor, thread-safe.
+
+        The state is encoded right away, on the calling thread, and only written in
+        the executor. Changes that are scheduled before a pending write starts are
+        saved by that write, so back-to-back changes are written once. If the event
+        loop is not running, the state is saved right away.
+        """
+        try:
+            data = self._serialize_state()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to encode the accessory state')
+            return
+        with self._persist_scheduled_lock:
+            self._persist_data = data
+            if self._persist_scheduled:
+                return
+            self._persist_scheduled = True
+        if self.loop.is_running():
+            self.add_job(self._persist_scheduled_state)
+        else:
+            self._persist_scheduled_state()
+
+    def _persist_scheduled_state(self):
+        """Save the state for `schedule_persist`."""
+        with self._persist_scheduled_lock:
+            self._persist_scheduled = False
+            data, self._persist_data = self._persist_data, None
+        try:
+            self._write_state(data)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to save the accessory state to `%s`',
+                             self.persist_file)
 
     def load(self):
         """ """
@@ -466,8 +781,8 @@ class AccessoryDriver:
         # See also unpair.
         logger.info("Paired with %s.", client_uuid)
         self.state.add_paired_client(client_uuid, client_public)
-        self.persist()
-        self.update_advertisement()
+        self.schedule_persist()
+        self._schedule_update()
         return True
 
     def unpair(self, client_uuid):
@@ -481,15 +796,50 @@ class AccessoryDriver:
         """
         logger.info("Unpairing client %s.", client_uuid)
         self.state.remove_paired_client(client_uuid)
-        self.persist()
-        self.update_advertisement()
+        self.http_server.session_cache.remove_client(client_uuid)
+        self.schedule_persist()
+        self._schedule_update()
+        if not self.state.paired:
+            self.precompute_srp_verifier()
 
     def setup_srp_verifier(self):
-        """Create an SRP verifier for the accessory's info."""
+        """Set up an SRP verifier for the accessory's info.
+
+        Uses the verifier that was precomputed in the background, if any, and starts
+        computing the one for the next pairing attempt.
+        """
+        future, self.srp_verifier_future = self.srp_verifier_future, None
+        if future is not None:
+            self.srp_verifier = future.result()
+        else:
+            self.srp_verifier = self._create_srp_verifier()
+        self.precompute_srp_verifier()
+
+    def precompute_srp_verifier(self):
+        """Start computing the SRP verifier for the next pairing attempt.
+
+        Creating a verifier takes several big modular exponentiations, which would
+        otherwise stall the first step of pairing.
+        """
+        if self.srp_verifier_future is None:
+            self.srp_verifier_future = self.executer.submit(self._create_srp_verifier)
+
+    def _create_srp_verifier(self):
+        """Create an SRP verifier with a fresh challenge.
+
+        The salt and the password verifier depend only on the pincode, so they are
+        computed once and reused.
+        """
         # TODO: Move the below hard-coded values somewhere nice.
         ctx = get_srp_context(3072, hashlib.sha512, 16)
-        verifier = SrpServer(ctx, b'Pair-Setup', self.state.pincode)
-        self.srp_verifier = verifier
+        pincode = self.state.pincode
+        if self._srp_password_verifier is not None \
+                and self._srp_password_verifier[0] == pincode:
+            _, salt, password_verifier = self._srp_password_verifier
+            return SrpServer(ctx, b'Pair-Setup', pincode, s=salt, v=password_verifier)
+        verifier = SrpServer(ctx, b'Pair-Setup', pincode)
+        self._srp_password_verifier = (pincode, verifier.s, verifier.v)
+        return verifier
 
     def get_accessories(self):
         """Returns the accessory in HAP format.
@@ -586,7 +936,7 @@ class AccessoryDriver:
 
             if HAP_REPR_VALUE in cq:
                 # TODO: status needs to be based on success of set_value
-                char.client_update_value(cq[HAP_REPR_VALUE])
+                char.client_update_value(cq[HAP_REPR_VALUE], client_addr)
 
     def signal_handler(self, _signal, _frame):
         """Stops the AccessoryDriver for a given signal.
@@ -5,7 +5,8 @@ A Characteristic is the smallest unit of the smart home, e.g.
 a temperature measuring or a device status.
 """
 import logging
-
+import weakref
+from collections.abc import Mapping
 from uuid import UUID
 
 from pyhap.const import (
@@ -69,17 +70,152 @@ class CharacteristicError(Exception):
     """Generic exception class for characteristic errors."""
 
 
+def _freeze(value):
+    """Return an immutable equivalent of the given property value."""
+    if isinstance(value, dict):
+        return intern_properties(value)
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+class CharacteristicProperties(Mapping):
+    """Immutable properties of a characteristic, such as Format and ValidValues.
+
+    Use `intern_properties` to get one. Characteristics with equal properties, e.g.
+    all characteristics of the same type created by the `Loader`, share the same
+    instance. Nested dicts and lists are frozen into `CharacteristicProperties` and
+    tuples.
+    """
+
+    __slots__ = ('_data', '_hash', '_validator', '__weakref__')
+
+    def __init__(self, data):
+        self._data = {key: _freeze(value) for key, value in data.items()}
+        self._hash = None
+        self._validator = None
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._data.items()))
+        return self._hash
+
+    def __repr__(self):
+        return repr(self._data)
+
+    def __reduce__(self):
+        return intern_properties, (self._data,)
+
+    @property
+    def validator(self):
+        """The function validating values for these properties.
+
+        It is compiled on first use and called as ``validator(value, display_name)``.
+        See `Characteristic.to_valid_value`.
+        """
+        if self._validator is None:
+            self._validator = _compile_validator(self)
+        return self._validator
+
+
+# Interned properties, keyed by their items and the types of their values.
+_interned_properties = weakref.WeakValueDictionary()
+
+
+def intern_properties(properties):
+    """Return the shared `CharacteristicProperties` equal to the given dict.
+
+    :param properties: The properties; ``CharacteristicProperties`` are returned
+        as is.
+    :type properties: dict or CharacteristicProperties
+
+    :rtype: CharacteristicProperties
+    """
+    if isinstance(properties, CharacteristicProperties):
+        return properties
+    record = CharacteristicProperties(properties)
+    try:
+        key = frozenset((key, type(value), value)
+                        for key, value in record.items())
+    except TypeError:  # An unhashable value, don't share it.
+        return record
+    return _interned_properties.setdefault(key, record)
+
+
+def _invalid_value(display_name, value, reason):
+    error_msg = '{}: value={} is {}.'.format(display_name, value, reason)
+    logger.error(error_msg)
+    raise ValueError(error_msg)
+
+
+def _compile_validator(properties):
+    """Return a function that validates and converts values for the properties.
+
+    The branches, bounds and valid values are resolved once here instead of on
+    every call.
+    """
+    valid_values = properties.get(PROP_VALID_VALUES)
+    if valid_values:
+        try:
+            allowed = frozenset(valid_values.values())
+        except TypeError:
+            allowed = tuple(valid_values.values())
+
+        def validate_valid_values(value, display_name):
+            try:
+                if value in allowed:
+                    return value
+            except TypeError:  # unhashable
+                pass
+            return _invalid_value(display_name, value, 'an invalid value')
+        return validate_valid_values
+
+    value_format = properties[PROP_FORMAT]
+    if value_format == HAP_FORMAT_STRING:
+        return lambda value, display_name: str(value)[:256]
+    if value_format == HAP_FORMAT_BOOL:
+        return lambda value, display_name: bool(value)
+    if value_format not in HAP_FORMAT_NUMERICS:
+        return lambda value, display_name: value
+
+    max_value = properties.get(PROP_MAX_VALUE)
+    min_value = properties.get(PROP_MIN_VALUE)
+
+    def validate_numeric(value, display_name):
+        if not isinstance(value, (int, float)):
+            return _invalid_value(display_name, value, 'not a numeric value')
+        if max_value is not None and value > max_value:
+            value = max_value
+        if min_value is not None and value < min_value:
+            value = min_value
+        return value
+    return validate_numeric
+
+
 class Characteristic:
     """Represents a HAP characteristic, the smallest unit of the smart home.
 
     A HAP characteristic is some measurement or state, like battery status or
     the current temperature. Characteristics are contained in services.
     Each characteristic has a unique type UUID and a set of properties,
-    like format, min and max values, valid values and others.
+    like format, min and max values, valid values and others. The properties are
+    immutable and shared with other characteristics, use `override_properties` to
+    change them.
     """
 
     __slots__ = ('broker', 'display_name', 'properties', 'type_id',
-                 'value', 'getter_callback', 'setter_callback')
+                 'value', 'getter_callback', 'setter_callback', 'has_subscribers')
 
     def __init__(self, display_name, type_id, properties):
         """Initialise with the given properties.
@@ -93,15 +229,18 @@ class Characteristic:
 
         :param properties: A dict of properties, such as Format,
             ValidValues, etc.
-        :type properties: dict
+        :type properties: dict or CharacteristicProperties
         """
         self.broker = None
         self.display_name = display_name
-        self.properties = properties
+        self.properties = intern_properties(properties)
         self.type_id = type_id
         self.value = self._get_default_value()
         self.getter_callback = None
         self.setter_callback = None
+        # Whether any client is subscribed to events of this characteristic.
+        # Maintained by AccessoryDriver.subscribe_client_topic.
+        self.has_subscribers = False
 
     def __repr__(self):
         """Return the representation of the characteristic."""
@@ -127,26 +266,12 @@ class Characteristic:
         return self.value
 
     def to_valid_value(self, value):
-        """Perform validation and conversion to valid value."""
-        if self.properties.get(PROP_VALID_VALUES):
-            if value not in self.properties[PROP_VALID_VALUES].values():
-                error_msg = '{}: value={} is an invalid value.' \
-                            .format(self.display_name, value)
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-        elif self.properties[PROP_FORMAT] == HAP_FORMAT_STRING:
-            value = str(value)[:256]
-        elif self.properties[PROP_FORMAT] == HAP_FORMAT_BOOL:
-            value = bool(value)
-        elif self.properties[PROP_FORMAT] in HAP_FORMAT_NUMERICS:
-            if not isinstance(value, (int, float)):
-                error_msg = '{}: value={} is not a numeric value.' \
-                            .format(self.display_name, value)
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            value = min(self.properties.get(PROP_MAX_VALUE, value), value)
-            value = max(self.properties.get(PROP_MIN_VALUE, value), value)
-        return value
+        """Perform validation and conversion to valid value.
+
+        :raise ValueError: If the value is not one of the valid values, or not a
+            number for a numeric format.
+        """
+        return self.properties.validator(value, self.display_name)
 
     def override_properties(self, properties=None, valid_values=None):
         """Override characteristic property values and valid values.
@@ -163,11 +288,13 @@ class Characteristic:
             raise ValueError(
                 'No properties or valid_values specified to override.')
 
+        new_properties = dict(self.properties)
         if properties:
-            self.properties.update(properties)
+            new_properties.update(properties)
 
         if valid_values:
-            self.properties[PROP_VALID_VALUES] = valid_values
+            new_properties[PROP_VALID_VALUES] = valid_values
+        self.properties = intern_properties(new_properties)
 
         try:
             self.value = self.to_valid_value(self.value)
@@ -199,26 +326,38 @@ class Characteristic:
         if should_notify and self.broker:
             self.notify()
 
-    def client_update_value(self, value):
+    def client_update_value(self, value, sender_client_addr=None):
         """Called from broker for value change in Home app.
 
         Change self.value to value and call callback.
+
+        :param sender_client_addr: The (address, port) of the client that wrote the
+            value. It is not notified about its own change.
+        :type sender_client_addr: tuple <str, int>
         """
         logger.debug('client_update_value: %s to %s',
                      self.display_name, value)
         self.value = value
-        self.notify()
+        self.notify(sender_client_addr)
         if self.setter_callback:
             # pylint: disable=not-callable
             self.setter_callback(value)
 
-    def notify(self):
+    def notify(self, sender_client_addr=None):
         """Notify clients about a value change. Sends the value.
 
+        Does nothing if no client is subscribed to this characteristic.
+
+        :param sender_client_addr: The (address, port) of a client that caused the
+            change and should not be notified, if any.
+        :type sender_client_addr: tuple <str, int>
+
         .. seealso:: accessory.publish
         .. seealso:: accessory_driver.publish
         """
-        self.broker.publish(self.value, self)
+        if not self.has_subscribers:
+            return
+        self.broker.publish(self.value, self, sender_client_addr)
 
     # pylint: disable=invalid-name
     def to_HAP(self):
@@ -233,7 +372,7 @@ class Characteristic:
             HAP_REPR_IID: self.broker.iid_manager.get_iid(self),
             HAP_REPR_TYPE: str(self.type_id).upper(),
             HAP_REPR_DESC: self.display_name,
-            HAP_REPR_PERM: self.properties[PROP_PERMISSIONS],
+            HAP_REPR_PERM: list(self.properties[PROP_PERMISSIONS]),
             HAP_REPR_FORMAT: self.properties[PROP_FORMAT],
         }
 
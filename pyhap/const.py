@@ -8,6 +8,7 @@ REQUIRED_PYTHON_VER = (3, 5)
 
 # ### Misc ###
 STANDALONE_AID = 1  # Standalone accessory ID (i.e. not bridged)
+MAX_ACCESSORIES_PER_BRIDGE = 150  # Including the bridge itself
 
 
 # ### Default values ###
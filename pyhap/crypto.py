@@ -0,0 +1,372 @@
+"""Providers of the ed25519 and X25519 primitives used for pairing.
+
+The long-term keys of the accessory and of paired clients are ed25519 keys, while
+pair verify agrees on a session key with X25519. Several packages implement these
+primitives with very different speed. A provider wraps one package behind a common
+interface and the fastest installed provider is used by default:
+
+- ``pynacl`` - libsodium based, `pip install HAP-python[Speedups]`.
+- ``cryptography`` - OpenSSL based.
+- ``ed25519`` - the ``ed25519`` and ``curve25519-donna`` packages.
+
+Signing keys are always persisted as their 32 byte seed and verifying keys as their
+32 byte encoding, so state files are interchangeable between providers.
+"""
+import abc
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519 as crypto_ed25519
+    from cryptography.hazmat.primitives.asymmetric import x25519 as crypto_x25519
+except ImportError:
+    crypto_ed25519 = None
+
+try:
+    import nacl.bindings
+    import nacl.exceptions
+    import nacl.signing
+except ImportError:
+    nacl = None
+
+try:
+    import curve25519
+    import ed25519
+except ImportError:
+    ed25519 = None
+
+
+class BadSignatureError(Exception):
+    """Raised when a signature does not verify."""
+
+
+class SigningKey(abc.ABC):
+    """An ed25519 signing key. Subclasses wrap the key object of a provider."""
+
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        self._key = key
+
+    def __eq__(self, other):
+        return isinstance(other, SigningKey) and self.to_seed() == other.to_seed()
+
+    def __hash__(self):
+        return hash(self.to_seed())
+
+    @abc.abstractmethod
+    def sign(self, data):
+        """Return the 64 byte signature of the given data."""
+
+    @abc.abstractmethod
+    def to_seed(self):
+        """Return the 32 byte seed from which the key can be restored."""
+
+    @abc.abstractmethod
+    def get_verifying_key(self):
+        """Return the matching `VerifyingKey`."""
+
+
+class VerifyingKey(abc.ABC):
+    """An ed25519 verifying key. Subclasses wrap the key object of a provider."""
+
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        self._key = key
+
+    def __eq__(self, other):
+        return isinstance(other, VerifyingKey) and self.to_bytes() == other.to_bytes()
+
+    def __hash__(self):
+        return hash(self.to_bytes())
+
+    @abc.abstractmethod
+    def verify(self, signature, data):
+        """Verify the signature of the given data.
+
+        :raise BadSignatureError: If the signature does not match.
+        """
+
+    @abc.abstractmethod
+    def to_bytes(self):
+        """Return the 32 byte encoding of the key."""
+
+
+class SessionKey(abc.ABC):
+    """A X25519 private key for a single pair verify session."""
+
+    __slots__ = ('_key',)
+
+    def __init__(self, key):
+        self._key = key
+
+    @abc.abstractmethod
+    def public_bytes(self):
+        """Return the 32 byte public key."""
+
+    @abc.abstractmethod
+    def exchange(self, peer_public):
+        """Return the raw (not hashed) shared secret with the given public key."""
+
+
+# ### cryptography ###
+class _CryptographySigningKey(SigningKey):
+    __slots__ = ()
+
+    def sign(self, data):
+        return self._key.sign(data)
+
+    def to_seed(self):
+        return self._key.private_bytes(serialization.Encoding.Raw,
+                                       serialization.PrivateFormat.Raw,
+                                       serialization.NoEncryption())
+
+    def get_verifying_key(self):
+        return _CryptographyVerifyingKey(self._key.public_key())
+
+
+class _CryptographyVerifyingKey(VerifyingKey):
+    __slots__ = ()
+
+    def verify(self, signature, data):
+        try:
+            self._key.verify(signature, data)
+        except InvalidSignature:
+            raise BadSignatureError
+
+    def to_bytes(self):
+        return self._key.public_bytes(serialization.Encoding.Raw,
+                                      serialization.PublicFormat.Raw)
+
+
+class _CryptographySessionKey(SessionKey):
+    __slots__ = ()
+
+    def public_bytes(self):
+        return self._key.public_key().public_bytes(serialization.Encoding.Raw,
+                                                   serialization.PublicFormat.Raw)
+
+    def exchange(self, peer_public):
+        return self._key.exchange(
+            crypto_x25519.X25519PublicKey.from_public_bytes(peer_public))
+
+
+class CryptographyProvider:
+    """Primitives from the ``cryptography`` package."""
+
+    name = 'cryptography'
+
+    @staticmethod
+    def generate_signing_key():
+        return _CryptographySigningKey(crypto_ed25519.Ed25519PrivateKey.generate())
+
+    @staticmethod
+    def signing_key_from_seed(seed):
+        return _CryptographySigningKey(
+            crypto_ed25519.Ed25519PrivateKey.from_private_bytes(seed))
+
+    @staticmethod
+    def verifying_key_from_bytes(data):
+        return _CryptographyVerifyingKey(
+            crypto_ed25519.Ed25519PublicKey.from_public_bytes(data))
+
+    @staticmethod
+    def generate_session_key():
+        return _CryptographySessionKey(crypto_x25519.X25519PrivateKey.generate())
+
+
+# ### PyNaCl ###
+class _NaClSigningKey(SigningKey):
+    __slots__ = ()
+
+    def sign(self, data):
+        return self._key.sign(data).signature
+
+    def to_seed(self):
+        return self._key.encode()
+
+    def get_verifying_key(self):
+        return _NaClVerifyingKey(self._key.verify_key)
+
+
+class _NaClVerifyingKey(VerifyingKey):
+    __slots__ = ()
+
+    def verify(self, signature, data):
+        try:
+            self._key.verify(data, signature)
+        except nacl.exceptions.BadSignatureError:
+            raise BadSignatureError
+
+    def to_bytes(self):
+        return self._key.encode()
+
+
+class _NaClSessionKey(SessionKey):
+    __slots__ = ('_public',)
+
+    def __init__(self, key):
+        super().__init__(key)
+        self._public = nacl.bindings.crypto_scalarmult_base(key)
+
+    def public_bytes(self):
+        return self._public
+
+    def exchange(self, peer_public):
+        return nacl.bindings.crypto_scalarmult(self._key, peer_public)
+
+
+class NaClProvider:
+    """Primitives from the ``PyNaCl`` package."""
+
+    name = 'pynacl'
+
+    @staticmethod
+    def generate_signing_key():
+        return _NaClSigningKey(nacl.signing.SigningKey.generate())
+
+    @staticmethod
+    def signing_key_from_seed(seed):
+        return _NaClSigningKey(nacl.signing.SigningKey(seed))
+
+    @staticmethod
+    def verifying_key_from_bytes(data):
+        return _NaClVerifyingKey(nacl.signing.VerifyKey(data))
+
+    @staticmethod
+    def generate_session_key():
+        return _NaClSessionKey(os.urandom(nacl.bindings.crypto_scalarmult_SCALARBYTES))
+
+
+# ### ed25519 and curve25519-donna ###
+class _Ed25519SigningKey(SigningKey):
+    __slots__ = ()
+
+    def sign(self, data):
+        return self._key.sign(data)
+
+    def to_seed(self):
+        return self._key.to_seed()
+
+    def get_verifying_key(self):
+        return _Ed25519VerifyingKey(self._key.get_verifying_key())
+
+
+class _Ed25519VerifyingKey(VerifyingKey):
+    __slots__ = ()
+
+    def verify(self, signature, data):
+        try:
+            self._key.verify(signature, data)
+        except ed25519.BadSignatureError:
+            raise BadSignatureError
+
+    def to_bytes(self):
+        return self._key.to_bytes()
+
+
+class _Curve25519SessionKey(SessionKey):
+    __slots__ = ('_public',)
+
+    def __init__(self, key):
+        super().__init__(key)
+        self._public = key.get_public().serialize()
+
+    def public_bytes(self):
+        return self._public
+
+    def exchange(self, peer_public):
+        # The key is hashed before being returned, we don't want it; This fixes that.
+        return self._key.get_shared_key(curve25519.Public(peer_public), lambda x: x)
+
+
+class Ed25519Provider:
+    """Primitives from the ``ed25519`` and ``curve25519-donna`` packages."""
+
+    name = 'ed25519'
+
+    @staticmethod
+    def generate_signing_key():
+        signing_key, _ = ed25519.create_keypair()
+        return _Ed25519SigningKey(signing_key)
+
+    @staticmethod
+    def signing_key_from_seed(seed):
+        return _Ed25519SigningKey(ed25519.SigningKey(seed))
+
+    @staticmethod
+    def verifying_key_from_bytes(data):
+        return _Ed25519VerifyingKey(ed25519.VerifyingKey(data))
+
+    @staticmethod
+    def generate_session_key():
+        return _Curve25519SessionKey(curve25519.Private())
+
+
+PROVIDERS = []  # (name, provider) of the installed providers, in order of preference
+if nacl is not None:
+    PROVIDERS.append((NaClProvider.name, NaClProvider))
+if crypto_ed25519 is not None:
+    PROVIDERS.append((CryptographyProvider.name, CryptographyProvider))
+if ed25519 is not None:
+    PROVIDERS.append((Ed25519Provider.name, Ed25519Provider))
+
+_provider = PROVIDERS[0][1] if PROVIDERS else None
+
+
+def get_provider():
+    """Return the provider used by default."""
+    if _provider is None:
+        raise RuntimeError('No ed25519 provider installed. Install one of the '
+                           'packages PyNaCl, cryptography or ed25519.')
+    return _provider
+
+
+def set_provider(name):
+    """Set the provider used by default.
+
+    :param name: One of the names in `PROVIDERS`.
+    :type name: str
+
+    :raise ValueError: If the provider is unknown or its package is not installed.
+    """
+    # pylint: disable=global-statement
+    global _provider
+    provider = dict(PROVIDERS).get(name)
+    if provider is None:
+        raise ValueError('Unknown or unavailable crypto provider {}'.format(name))
+    _provider = provider
+    logger.debug('Using crypto provider %s', name)
+
+
+def generate_keypair():
+    """Generate a new long-term ed25519 key pair.
+
+    :return: The signing and the verifying key.
+    :rtype: tuple <SigningKey, VerifyingKey>
+    """
+    signing_key = get_provider().generate_signing_key()
+    return signing_key, signing_key.get_verifying_key()
+
+
+def signing_key_from_seed(seed):
+    """Restore a `SigningKey` from its seed.
+
+    The first 32 bytes are used, so that 64 byte ed25519 secret keys work as well.
+    """
+    return get_provider().signing_key_from_seed(bytes(seed[:32]))
+
+
+def verifying_key_from_bytes(data):
+    """Restore a `VerifyingKey` from its 32 byte encoding."""
+    return get_provider().verifying_key_from_bytes(bytes(data))
+
+
+def generate_session_key():
+    """Generate a new X25519 `SessionKey`."""
+    return get_provider().generate_session_key()
@@ -6,8 +6,7 @@ it can work properly after a restart.
 import json
 import uuid
 
-import ed25519
-
+from pyhap import crypto
 from pyhap.util import fromhex, tohex
 
 
@@ -36,8 +35,8 @@ class AccessoryEncoder:
 
     The default implementation persists the above properties.
 
-    Note also that AIDs and IIDs must also survive a restore. However, this is managed
-    by the Accessory and Bridge classes.
+    AIDs and IIDs must also survive a restore. The Accessory and Bridge classes
+    allocate them, and the default implementation persists the allocation map.
 
     @see: AccessoryDriver.persist AccessoryDriver.load AccessoryDriver.__init__
     """
@@ -50,18 +49,21 @@ class AccessoryEncoder:
             - MAC address.
             - Public and private key.
             - UUID and public key of paired clients.
-            - Config version.
+            - Config version and the hash of the configuration.
+            - AID and IID allocations.
         """
         paired_clients = {str(client): tohex(key)
                           for client, key in state.paired_clients.items()}
         config_state = {
             'mac': state.mac,
             'config_version': state.config_version,
+            'config_hash': state.config_hash,
             'paired_clients': paired_clients,
             'private_key': tohex(state.private_key.to_seed()),
             'public_key': tohex(state.public_key.to_bytes()),
+            'id_allocations': state.id_allocations,
         }
-        json.dump(config_state, fp)
+        fp.write(json.dumps(config_state))
 
     @staticmethod
     def load_into(fp, state):
@@ -75,5 +77,10 @@ class AccessoryEncoder:
         state.paired_clients = {uuid.UUID(client): fromhex(key)
                                 for client, key in
                                 loaded['paired_clients'].items()}
-        state.private_key = ed25519.SigningKey(fromhex(loaded['private_key']))
-        state.public_key = ed25519.VerifyingKey(fromhex(loaded['public_key']))
+        state.paired_client_keys = {client: crypto.verifying_key_from_bytes(key)
+                                    for client, key in state.paired_clients.items()}
+        state.private_key = crypto.signing_key_from_seed(fromhex(loaded['private_key']))
+        state.public_key = crypto.verifying_key_from_bytes(fromhex(loaded['public_key']))
+        # Missing in files written by earlier versions.
+        state.id_allocations = loaded.get('id_allocations', {})
+        state.config_hash = loaded.get('config_hash')
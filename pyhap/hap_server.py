@@ -4,9 +4,11 @@ The HAPServer is the point of contact to and from the world.
 The HAPServerHandler manages the state of the connection and handles incoming requests.
 The HAPSocket is a socket implementation that manages the "TLS" of the connection.
 """
+from collections import OrderedDict, deque
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from http import HTTPStatus
 import logging
+import os
 import socket
 import struct
 import json
@@ -15,13 +17,13 @@ import uuid
 from urllib.parse import urlparse, parse_qs
 import socketserver
 import threading
+import time
 
 from tlslite.utils.chacha20_poly1305 import CHACHA20_POLY1305
 from Crypto.Protocol.KDF import HKDF
 from Crypto.Hash import SHA512
-import curve25519
-import ed25519
 
+from pyhap import crypto
 import pyhap.tlv as tlv
 from pyhap.util import long_to_bytes
 
@@ -39,6 +41,9 @@ class HAP_TLV_TAGS:
     SEQUENCE_NUM = b'\x06'
     ERROR_CODE = b'\x07'
     PROOF = b'\x0A'
+    PERMISSIONS = b'\x0B'
+    SESSION_ID = b'\x0E'
+    SEPARATOR = b'\xFF'
 
 
 # Status codes for underlying HAP calls
@@ -62,10 +67,20 @@ class HAP_OPERATION_CODE:
     INVALID_SIGNATURE = b'\x04'
 
 
+class HAP_PAIR_METHOD:
+    PAIR_RESUME = b'\x06'
+
+
+class HAP_PERMISSIONS:
+    USER = b'\x00'
+    ADMIN = b'\x01'
+
+
 class HAP_CRYPTO:
     HKDF_KEYLEN = 32  # bytes, length of expanded HKDF keys
     HKDF_HASH = SHA512  # Hash function to use in key expansion
     TLS_NONCE_LEN = 12  # bytes, length of TLS encryption nonce
+    SESSION_ID_LEN = 8  # bytes, length of a pair resume session ID
 
 
 def _pad_tls_nonce(nonce, total_len=HAP_CRYPTO.TLS_NONCE_LEN):
@@ -78,6 +93,16 @@ def hap_hkdf(key, salt, info):
     return HKDF(key, HAP_CRYPTO.HKDF_KEYLEN, salt, HAP_CRYPTO.HKDF_HASH, context=info)
 
 
+def generate_session_key_pair():
+    """Generate a X25519 key pair for a pair verify session.
+
+    :return: The private and public key.
+    :rtype: tuple <crypto.SessionKey, bytes>
+    """
+    private_key = crypto.generate_session_key()
+    return private_key, private_key.public_bytes()
+
+
 class UnprivilegedRequestException(Exception):
     pass
 
@@ -127,6 +152,15 @@ class HAPServerHandler(BaseHTTPRequestHandler):
 
     PVERIFY_2_NONCE = _pad_tls_nonce(b"PV-Msg03")
 
+    PVERIFY_SESSION_ID_SALT = b"Pair-Verify-ResumeSessionID-Salt"
+    PVERIFY_SESSION_ID_INFO = b"Pair-Verify-ResumeSessionID-Info"
+
+    PRESUME_REQUEST_INFO = b"Pair-Resume-Request-Info"
+    PRESUME_REQUEST_NONCE = _pad_tls_nonce(b"PR-Msg01")
+    PRESUME_RESPONSE_INFO = b"Pair-Resume-Response-Info"
+    PRESUME_RESPONSE_NONCE = _pad_tls_nonce(b"PR-Msg02")
+    PRESUME_SHARED_SECRET_INFO = b"Pair-Resume-Shared-Secret-Info"
+
     def __init__(self, sock, client_addr, server, accessory_handler):
         """
         @param accessory_handler: An object that controls an accessory's state.
@@ -155,7 +189,10 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         @type client_public: bytes
 
         @param private_key: The state's session private key.
-        @type private_key: bytes
+        @type private_key: crypto.SessionKey
+
+        @param public_key: The state's session public key.
+        @type public_key: bytes
 
         @param shared_key: The resulted session key.
         @type shared_key: bytes
@@ -322,11 +359,11 @@ class HAPServerHandler(BaseHTTPRequestHandler):
                               self.PAIRING_4_SALT, self.PAIRING_4_INFO)
 
         data = output_key + client_username + client_ltpk
-        verifying_key = ed25519.VerifyingKey(client_ltpk)
+        verifying_key = crypto.verifying_key_from_bytes(client_ltpk)
 
         try:
             verifying_key.verify(client_proof, data)
-        except ed25519.BadSignatureError:
+        except crypto.BadSignatureError:
             logger.error("Bad signature, abort.")
             raise
 
@@ -383,12 +420,91 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         tlv_objects = tlv.decode(self.rfile.read(length))
         sequence = tlv_objects[HAP_TLV_TAGS.SEQUENCE_NUM]
         if sequence == b'\x01':
+            if tlv_objects.get(HAP_TLV_TAGS.REQUEST_TYPE) == \
+                    HAP_PAIR_METHOD.PAIR_RESUME and self._pair_resume(tlv_objects):
+                return
             self._pair_verify_one(tlv_objects)
         elif sequence == b'\x03':
             self._pair_verify_two(tlv_objects)
         else:
             raise
 
+    def _pair_resume(self, tlv_objects):
+        """Resume a previous session without running the full pair verify.
+
+        The client proves that it knows the shared secret of a cached session by
+        sending an authentication tag derived from it. On success, a new session ID
+        and shared secret are derived from the old secret and the transport is upgraded
+        to encrypted right away.
+
+        @param tlv_objects: The TLV data received from the client.
+        @type tlv_object: dict
+
+        @return: Whether the request was handled, i.e. the session was resumed or
+            the request was answered with an error. If not, the request must be
+            handled as a regular pair verify.
+        @rtype: bool
+        """
+        logger.debug("Pair resume [1/1].")
+        session_id = tlv_objects.get(HAP_TLV_TAGS.SESSION_ID)
+        client_public = tlv_objects.get(HAP_TLV_TAGS.PUBLIC_KEY)
+        auth_tag = tlv_objects.get(HAP_TLV_TAGS.ENCRYPTED_DATA)
+        if client_public is None:
+            # Pair verify needs the public key as well, there is nothing to fall back to.
+            logger.debug("Pair resume request without a public key.")
+            data = tlv.encode(HAP_TLV_TAGS.SEQUENCE_NUM, b'\x02',
+                              HAP_TLV_TAGS.ERROR_CODE, HAP_OPERATION_CODE.INVALID_REQUEST)
+            self.send_response(200)
+            self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
+            self.end_response(data)
+            return True
+        if session_id is None or auth_tag is None:
+            return False
+
+        # The session is removed only once the client proved that it knows the secret,
+        # a forged request must not prevent the client from resuming.
+        session = self.server.session_cache.get(session_id)
+        if session is None:
+            logger.debug("Unknown or expired session, falling back to pair verify.")
+            return False
+        client_uuid, shared_key = session
+        if client_uuid not in self.state.paired_clients:
+            return False
+
+        request_key = hap_hkdf(shared_key, client_public + session_id,
+                               self.PRESUME_REQUEST_INFO)
+        cipher = CHACHA20_POLY1305(request_key, "python")
+        if cipher.open(self.PRESUME_REQUEST_NONCE, bytearray(auth_tag), b"") is None:
+            logger.debug("Bad pair resume request, falling back to pair verify.")
+            return False
+        if not self.server.session_cache.remove(session_id, session):
+            logger.debug("Session already resumed, falling back to pair verify.")
+            return False
+
+        new_session_id = os.urandom(HAP_CRYPTO.SESSION_ID_LEN)
+        salt = client_public + new_session_id
+        response_key = hap_hkdf(shared_key, salt, self.PRESUME_RESPONSE_INFO)
+        cipher = CHACHA20_POLY1305(response_key, "python")
+        response_tag = bytes(
+            cipher.seal(self.PRESUME_RESPONSE_NONCE, bytearray(), b""))
+        new_shared_key = hap_hkdf(shared_key, salt, self.PRESUME_SHARED_SECRET_INFO)
+        self.server.session_cache.add(new_session_id, client_uuid, new_shared_key)
+
+        logger.debug("Pair resume with client '%s' completed. Switching to "
+                     "encrypted transport.", self.client_address)
+
+        data = tlv.encode(HAP_TLV_TAGS.SEQUENCE_NUM, b'\x02',
+                          HAP_TLV_TAGS.REQUEST_TYPE, HAP_PAIR_METHOD.PAIR_RESUME,
+                          HAP_TLV_TAGS.SESSION_ID, new_session_id,
+                          HAP_TLV_TAGS.ENCRYPTED_DATA, response_tag)
+        self.send_response(200)
+        self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
+        self.end_response(data)
+        self._set_encryption_ctx(client_public, None, None, new_shared_key, None)
+        self._upgrade_to_encrypted()
+        del self.enc_context
+        return True
+
     def _pair_verify_one(self, tlv_objects):
         """Generate new session key pair and send a proof to the client.
 
@@ -398,15 +514,11 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         logger.debug("Pair verify [1/2].")
         client_public = tlv_objects[HAP_TLV_TAGS.PUBLIC_KEY]
 
-        private_key = curve25519.Private()
-        public_key = private_key.get_public()
-        shared_key = private_key.get_shared_key(
-            curve25519.Public(client_public),
-            # Key is hashed before being returned, we don't want it; This fixes that.
-            lambda x: x)
+        private_key, public_key = self.server.key_pool.get()
+        shared_key = private_key.exchange(client_public)
 
         mac = self.state.mac.encode()
-        material = public_key.serialize() + mac + client_public
+        material = public_key + mac + client_public
         server_proof = self.state.private_key.sign(material)
 
         output_key = hap_hkdf(shared_key, self.PVERIFY_1_SALT, self.PVERIFY_1_INFO)
@@ -422,7 +534,7 @@ class HAPServerHandler(BaseHTTPRequestHandler):
             cipher.seal(self.PVERIFY_1_NONCE, bytearray(message), b""))
         data = tlv.encode(HAP_TLV_TAGS.SEQUENCE_NUM, b'\x02',
                           HAP_TLV_TAGS.ENCRYPTED_DATA, aead_message,
-                          HAP_TLV_TAGS.PUBLIC_KEY, public_key.serialize())
+                          HAP_TLV_TAGS.PUBLIC_KEY, public_key)
         self.send_response(200)
         self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
         self.end_response(data)
@@ -443,11 +555,11 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         client_username = dec_tlv_objects[HAP_TLV_TAGS.USERNAME]
         material = self.enc_context["client_public"] \
             + client_username \
-            + self.enc_context["public_key"].serialize()
+            + self.enc_context["public_key"]
 
         client_uuid = uuid.UUID(str(client_username, "ascii"))
-        perm_client_public = self.state.paired_clients.get(client_uuid)
-        if perm_client_public is None:
+        verifying_key = self.state.get_client_verifying_key(client_uuid)
+        if verifying_key is None:
             logger.debug("Client %s attempted pair verify without being paired first.",
                          client_uuid)
             self.send_response(200)
@@ -456,10 +568,9 @@ class HAPServerHandler(BaseHTTPRequestHandler):
             self.end_response(data)
             return
 
-        verifying_key = ed25519.VerifyingKey(perm_client_public)
         try:
             verifying_key.verify(dec_tlv_objects[HAP_TLV_TAGS.PROOF], material)
-        except ed25519.BadSignatureError:
+        except crypto.BadSignatureError:
             logger.error("Bad signature, abort.")
             self.send_response(200)
             self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
@@ -470,6 +581,11 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         logger.debug("Pair verify with client '%s' completed. Switching to "
                      "encrypted transport.", self.client_address)
 
+        shared_key = self.enc_context["shared_key"]
+        session_id = hap_hkdf(shared_key, self.PVERIFY_SESSION_ID_SALT,
+                              self.PVERIFY_SESSION_ID_INFO)[:HAP_CRYPTO.SESSION_ID_LEN]
+        self.server.session_cache.add(session_id, client_uuid, shared_key)
+
         data = tlv.encode(HAP_TLV_TAGS.SEQUENCE_NUM, b'\x04')
         self.send_response(200)
         self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
@@ -528,7 +644,7 @@ class HAPServerHandler(BaseHTTPRequestHandler):
             self.end_response(b'')
 
     def handle_pairings(self):
-        """Handles a client request to update or remove a pairing."""
+        """Handles a client request to update, remove or list pairings."""
         if not self.is_encrypted:
             raise UnprivilegedRequestException
 
@@ -539,6 +655,8 @@ class HAPServerHandler(BaseHTTPRequestHandler):
             self._handle_add_pairing(tlv_objects)
         elif request_type == 4:
             self._handle_remove_pairing(tlv_objects)
+        elif request_type == 5:
+            self._handle_list_pairings()
         else:
             raise ValueError
 
@@ -571,6 +689,24 @@ class HAPServerHandler(BaseHTTPRequestHandler):
         self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
         self.end_response(data)
 
+    def _handle_list_pairings(self):
+        """List the paired clients, one TLV8 record per pairing.
+
+        Permissions of paired clients are not persisted, so every pairing is listed
+        as admin.
+        """
+        logger.debug("Listing client pairings.")
+        pairings = [[HAP_TLV_TAGS.USERNAME, str(client_uuid).encode("utf-8"),
+                     HAP_TLV_TAGS.PUBLIC_KEY, client_public,
+                     HAP_TLV_TAGS.PERMISSIONS, HAP_PERMISSIONS.ADMIN]
+                    for client_uuid, client_public
+                    in self.state.paired_clients.items()] or [[]]
+        pairings[0][:0] = (HAP_TLV_TAGS.SEQUENCE_NUM, b"\x02")
+        data = tlv.encode_list(pairings)
+        self.send_response(200)
+        self.send_header("Content-Type", self.PAIRING_RESPONSE_TYPE)
+        self.end_response(data)
+
 
 class HAPSocket(socket.socket):
     """A socket implementing the HAP crypto. Just feed it as if it is a normal socket.
@@ -728,6 +864,186 @@ class HAPSocket(socket.socket):
         return total
 
 
+class PairVerifySessionCache:
+    """A bounded cache of resumable pair verify sessions.
+
+    Sessions are keyed by their session ID and hold the client UUID and the shared
+    secret of the session. Entries expire after ``ttl`` seconds and, when the cache is
+    full, the oldest session is evicted. A session ID can be used only once - it is
+    removed from the cache when it is resumed.
+
+    All methods are thread-safe.
+    """
+
+    MAX_SESSIONS = 64
+    SESSION_TTL = 3600  # seconds
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        """Initialize an empty cache.
+
+        :param max_sessions: The maximum number of sessions kept in the cache.
+        :type max_sessions: int
+
+        :param ttl: The number of seconds after which a session can not be resumed.
+        :type ttl: float
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id: (expires, client_uuid, shared_key)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached sessions, including expired ones."""
+        return len(self._sessions)
+
+    def add(self, session_id, client_uuid, shared_key):
+        """Add a resumable session, evicting expired and excess sessions.
+
+        :param session_id: The session ID.
+        :type session_id: bytes
+
+        :param client_uuid: The UUID of the client that owns the session.
+        :type client_uuid: uuid.UUID
+
+        :param shared_key: The shared secret of the session.
+        :type shared_key: bytes
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (now + self.ttl, client_uuid, shared_key)
+            # All entries have the same TTL, hence they expire in insertion order.
+            while self._sessions:
+                expires = next(iter(self._sessions.values()))[0]
+                if expires > now and len(self._sessions) <= self.max_sessions:
+                    break
+                self._sessions.popitem(last=False)
+
+    def get(self, session_id):
+        """Return the session with the given ID, keeping it in the cache.
+
+        :return: A ``(client_uuid, shared_key)`` tuple or None if there is no such
+            session or if it has expired.
+        :rtype: tuple
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session[0] <= time.monotonic():
+            return None
+        return session[1:]
+
+    def pop(self, session_id):
+        """Remove the session with the given ID and return it.
+
+        :return: A ``(client_uuid, shared_key)`` tuple or None if there is no such
+            session or if it has expired.
+        :rtype: tuple
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None or session[0] <= time.monotonic():
+            return None
+        return session[1:]
+
+    def remove(self, session_id, session):
+        """Remove the session with the given ID if it is still the given session.
+
+        :param session: The ``(client_uuid, shared_key)`` tuple returned by `get`.
+        :type session: tuple
+
+        :return: Whether the session was removed, i.e. it was not used, replaced or
+            removed in the meantime.
+        :rtype: bool
+        """
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is None or cached[1:] != session:
+                return False
+            del self._sessions[session_id]
+        return True
+
+    def remove_client(self, client_uuid):
+        """Remove all sessions of the given client, e.g. when it is unpaired."""
+        with self._lock:
+            for session_id in [session_id for session_id, session
+                               in self._sessions.items() if session[1] == client_uuid]:
+                del self._sessions[session_id]
+
+
+class EphemeralKeyPool:
+    """A pool of pre-generated session key pairs for pair verify.
+
+    Generating the session key pair is moved out of the request: a background thread
+    keeps up to ``size`` key pairs ready. Each key pair is handed out only once. If the
+    pool is drained, e.g. during a reconnect storm, a key pair is generated inline.
+    """
+
+    POOL_SIZE = 16
+
+    def __init__(self, size=POOL_SIZE, keygen=generate_session_key_pair):
+        """Initialize an empty pool. Call `start` to begin filling it.
+
+        :param size: The maximum number of key pairs kept in the pool.
+        :type size: int
+
+        :param keygen: A callable that returns a new key pair.
+        :type keygen: callable
+        """
+        self.size = size
+        self.keygen = keygen
+        self._keys = deque()
+        self._refill_event = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def __len__(self):
+        """Return the number of ready key pairs."""
+        return len(self._keys)
+
+    def start(self):
+        """Start the refill thread and fill the pool."""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._refill, daemon=True,
+                                        name='EphemeralKeyPool')
+        self._thread.start()
+        self._refill_event.set()
+
+    def stop(self):
+        """Stop the refill thread and wait until it exits.
+
+        At most the key pair that is being generated is finished, so a `start` right
+        after returns never leaves two refill threads running.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopped = True
+        self._refill_event.set()
+        thread.join()
+        self._thread = None
+
+    def get(self):
+        """Return an unused key pair and trigger a refill of the pool."""
+        try:
+            key_pair = self._keys.popleft()
+        except IndexError:
+            key_pair = self.keygen()
+        self._refill_event.set()
+        return key_pair
+
+    def _refill(self):
+        """Fill the pool whenever a key pair is taken, until stopped."""
+        while True:
+            self._refill_event.wait()
+            self._refill_event.clear()
+            if self._stopped:
+                return
+            while len(self._keys) < self.size and not self._stopped:
+                self._keys.append(self.keygen())
+
+
 class HAPServer(socketserver.ThreadingMixIn,
                 HTTPServer):
     """Point of contact for HAP clients.
@@ -769,6 +1085,8 @@ class HAPServer(socketserver.ThreadingMixIn,
         super(HAPServer, self).__init__(addr_port, handler_type)
         self.connections = {}  # (address, port): socket
         self.accessory_handler = accessory_handler
+        self.session_cache = PairVerifySessionCache()
+        self.key_pool = EphemeralKeyPool()
 
     def _close_socket(self, sock):
         """Shutdown and close the given socket."""
@@ -809,9 +1127,15 @@ class HAPServer(socketserver.ThreadingMixIn,
             self._handle_sock_timeout(client_addr, e)
             logger.debug("Connection timeout")
 
+    def serve_forever(self, poll_interval=0.5):
+        """Start filling the session key pool and handle requests until shutdown."""
+        self.key_pool.start()
+        super(HAPServer, self).serve_forever(poll_interval)
+
     def server_close(self):
         """Close all connections."""
         logger.info("Stopping HAP server")
+        self.key_pool.stop()
         super(HAPServer, self).server_close()
         for sock in self.connections.values():
             self._close_socket(sock)
@@ -0,0 +1,241 @@
+"""Run several AccessoryDrivers in one process.
+
+HAP allows at most 150 accessories per bridge, so larger installations run several
+bridges. Each `AccessoryDriver` normally creates its own event loop, executor,
+`Loader` and `Zeroconf` responder. A `DriverHost` runs many drivers, each with its own
+port and state file, on one event loop with one executor and one `Loader`, and
+advertises all of them with a single `Zeroconf` instance:
+
+.. code-block:: python
+
+    host = DriverHost()
+    for i in range(8):
+        driver = host.add_driver(port=51830 + i,
+                                 persist_file='bridge{}.state'.format(i))
+        driver.add_accessory(make_bridge(driver, i))
+    host.start()
+
+`DriverHost.add_bridges` splits a large set of accessories across as few bridges as
+possible and keeps every accessory on the same bridge across restarts:
+
+.. code-block:: python
+
+    host = DriverHost()
+    lights = [Light(host, 'Light {}'.format(i)) for i in range(400)]
+    host.add_bridges(lights)  # Three bridges, on ports 51830 to 51832.
+    host.start()
+"""
+import asyncio
+import json
+import logging
+import os
+
+from zeroconf import Zeroconf
+
+from pyhap.accessory import Bridge
+from pyhap.accessory_driver import (
+    AccessoryDriver, create_event_loop, create_executer)
+from pyhap.const import MAX_ACCESSORIES_PER_BRIDGE
+from pyhap.loader import Loader
+
+logger = logging.getLogger(__name__)
+
+BRIDGED_PER_BRIDGE = MAX_ACCESSORIES_PER_BRIDGE - 1
+
+
+def partition_keys(keys, previous, capacity=BRIDGED_PER_BRIDGE):
+    """Split the keys into the minimum number of partitions of at most capacity keys.
+
+    Keys stay in their previous partition while it is still needed and has room. The
+    other keys fill the partitions with room in sorted order, lowest index first, so
+    the result depends only on the keys and the previous assignment.
+
+    :param keys: The unique keys to partition.
+    :type keys: iterable
+
+    :param previous: The previous index of the keys, if any.
+    :type previous: dict
+
+    :return: One sorted list of keys per partition.
+    :rtype: list
+    """
+    keys = sorted(keys)
+    partitions = [[] for _ in range(max(1, -(-len(keys) // capacity)))]
+    unassigned = []
+    for key in keys:
+        index = previous.get(key)
+        if index is not None and index < len(partitions) \
+                and len(partitions[index]) < capacity:
+            partitions[index].append(key)
+        else:
+            unassigned.append(key)
+    index = 0
+    for key in unassigned:
+        while len(partitions[index]) >= capacity:
+            index += 1
+        partitions[index].append(key)
+    return [sorted(partition) for partition in partitions]
+
+
+class DriverHost:
+    """Runs several AccessoryDrivers on a shared loop, executor, Loader and Zeroconf.
+
+    Stopping a single driver, e.g. with `AccessoryDriver.stop`, stops only that driver;
+    `stop` stops all of them and the loop.
+    """
+
+    def __init__(self, *, loop=None, loader=None, advertiser=None):
+        """Create the shared resources.
+
+        :param loop: The event loop to run the drivers on. A new one is created if not
+            given.
+        :type loop: asyncio.AbstractEventLoop
+
+        :param loader: The loader shared by all drivers.
+        :type loader: Loader
+
+        :param advertiser: The Zeroconf instance, or an object with the same
+            ``register_service``, ``update_service``, ``unregister_service`` and
+            ``close`` methods, that advertises the drivers. A new Zeroconf is created
+            if not given.
+        """
+        self.loop = loop or create_event_loop()
+        self.executer = create_executer()
+        self.loop.set_default_executor(self.executer)
+        self.loader = loader or Loader()
+        self.advertiser = advertiser or Zeroconf()
+        self.drivers = []
+        self._stopping = False
+
+    def add_driver(self, **kwargs):
+        """Create a driver that runs in this host.
+
+        :param kwargs: Passed to `AccessoryDriver`, e.g. ``port`` and
+            ``persist_file``, which must differ between drivers.
+
+        :return: The new driver.
+        :rtype: AccessoryDriver
+        """
+        driver = AccessoryDriver(loop=self.loop, executer=self.executer,
+                                 loader=self.loader, advertiser=self.advertiser,
+                                 **kwargs)
+        driver.host = self
+        self.drivers.append(driver)
+        return driver
+
+    def add_bridges(self, accessories, display_name='Bridge {}', port=51830,
+                    persist_file='bridge{}.state', **kwargs):
+        """Split the accessories across the minimum number of bridges, each with its
+        own driver.
+
+        An accessory is identified by its `Accessory.id_key`, so give every accessory a
+        unique serial number or display name. The keys that every bridge serves are
+        recorded in its state file, and an accessory stays on its bridge across restarts,
+        together with its AID and IIDs, as long as that bridge is still needed. Only
+        when so many accessories are removed that a bridge can be dropped, the
+        accessories of the last bridge move to the others.
+
+        The accessories should be created with this host as their driver, which
+        provides the shared `Loader`. Each is then moved to the driver of its bridge.
+
+        :param accessories: The accessories to bridge, without an AID.
+        :type accessories: list
+
+        :param display_name: The name of the bridges, formatted with their number.
+        :type display_name: str
+
+        :param port: The port of the first bridge; the others use the following ports.
+        :type port: int
+
+        :param persist_file: The state files of the bridges, formatted with their
+            number.
+        :type persist_file: str
+
+        :param kwargs: Passed to `AccessoryDriver`.
+
+        :return: The new bridges, each added to its driver.
+        :rtype: list
+
+        :raise ValueError: If two accessories have the same key.
+        """
+        by_key = {}
+        for acc in accessories:
+            key = acc.id_key
+            if key in by_key:
+                raise ValueError('Duplicate accessory key {}'.format(key))
+            by_key[key] = acc
+        count = len(partition_keys(by_key, {}))
+        persist_file = os.path.expanduser(persist_file)
+        drivers = [self.add_driver(port=port + i, persist_file=persist_file.format(i),
+                                   **kwargs)
+                   for i in range(count)]
+        previous = {}
+        for index, driver in enumerate(drivers):
+            if os.path.exists(driver.persist_file):
+                driver.load()
+                for key in driver.state.id_allocations.get('bridged', ()):
+                    previous.setdefault(key, index)
+        # The accessories of bridges that are no longer needed move to the others.
+        index = count
+        while os.path.exists(persist_file.format(index)):
+            with open(persist_file.format(index), 'r') as fp:
+                allocations = json.load(fp).get('id_allocations', {})
+            for key in allocations.get('bridged', ()):
+                previous.setdefault(key, index)
+            index += 1
+
+        bridges = []
+        for index, (driver, keys) in enumerate(
+                zip(drivers, partition_keys(by_key, previous))):
+            bridge = Bridge(driver, display_name.format(index))
+            for key in keys:
+                acc = by_key[key]
+                acc.driver = driver
+                bridge.add_accessory(acc)
+            driver.add_accessory(bridge)
+            bridges.append(bridge)
+        moved = sum(1 for key, index in previous.items()
+                    if key in by_key and (index >= count
+                                          or by_key[key].driver is not drivers[index]))
+        if moved:
+            logger.warning('Moved %d accessories to another bridge', moved)
+        logger.info('Bridged %d accessories with %d bridges', len(by_key), count)
+        return bridges
+
+    def start(self):
+        """Start all drivers and run the event loop until `stop` is called.
+
+        The host is stopped gracefully on a KeyboardInterrupt.
+        """
+        try:
+            logger.info('Starting the event loop for %d drivers', len(self.drivers))
+            for driver in self.drivers:
+                driver.add_job(driver._do_start)
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            self.loop.call_soon_threadsafe(
+                self.loop.create_task, self.async_stop())
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+            logger.info('Closed the event loop')
+
+    def stop(self):
+        """Stop all drivers and the event loop, thread-safe."""
+        self.loop.call_soon_threadsafe(
+            self.loop.create_task, self.async_stop())
+
+    async def async_stop(self):
+        """Stop all drivers, close the shared resources and stop the loop."""
+        if self._stopping:
+            return
+        self._stopping = True
+        running = [driver for driver in self.drivers
+                   if driver.mdns_service_info is not None
+                   and not driver.stop_event.is_set()]
+        await asyncio.gather(*(self.loop.run_in_executor(None, driver._do_stop)
+                               for driver in running))
+        await self.loop.run_in_executor(None, self.advertiser.close)
+        logger.debug('Shutdown executers')
+        self.executer.shutdown()
+        self.loop.stop()
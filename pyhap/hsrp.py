@@ -4,6 +4,13 @@
 # TODO: make it a complete implementation.
 import os
 
+# Use gmpy2 for the big modular exponentiations, if it is installed.
+# Installation with `pip install HAP-python[Speedups]`.
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
 #
 # s - bytes
 # x - int
@@ -14,6 +21,53 @@ import os
 # p - bytes
 
 
+class PythonBackend:
+    """Big integer arithmetic with the built-in ``pow``."""
+
+    name = 'python'
+
+    @staticmethod
+    def powmod(base, exp, mod):
+        return pow(base, exp, mod)
+
+
+class GMPBackend:
+    """Big integer arithmetic with gmpy2, several times faster on small CPUs."""
+
+    name = 'gmpy2'
+
+    @staticmethod
+    def powmod(base, exp, mod):
+        return int(gmpy2.powmod(base, exp, mod))
+
+
+BACKENDS = {PythonBackend.name: PythonBackend}
+if gmpy2 is not None:
+    BACKENDS[GMPBackend.name] = GMPBackend
+
+_backend = BACKENDS.get(GMPBackend.name, PythonBackend)
+
+
+def get_backend():
+    """Return the arithmetic backend used by default."""
+    return _backend
+
+
+def set_backend(name):
+    """Set the arithmetic backend used by default.
+
+    :param name: One of the names in `BACKENDS`.
+    :type name: str
+
+    :raise ValueError: If the backend is unknown or its package is not installed.
+    """
+    # pylint: disable=global-statement
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError('Unknown or unavailable SRP backend {}'.format(name))
+    _backend = BACKENDS[name]
+
+
 def padN(bytestr, ctx):
     return bytestr.rjust(ctx["N_len"] // 8, b'\x00')
 
@@ -31,16 +85,7 @@ def bytes_to_long(s):
 
 
 def long_to_bytes(n):
-    byteList = list()
-    x = 0
-    off = 0
-    while x != n:
-        b = (n >> off) & 0xFF
-        byteList.append(b)
-        x = x | (b << off)
-        off += 8
-    byteList.reverse()
-    return bytes(byteList)
+    return n.to_bytes((n.bit_length() + 7) // 8, byteorder="big")
 
 
 def get_x(u, p, s, ctx):
@@ -52,9 +97,9 @@ def get_x(u, p, s, ctx):
     return int(hf.hexdigest(), 16)
 
 
-def get_verifier(u, p, s, ctx):
+def get_verifier(u, p, s, ctx, backend=None):
     x = get_x(u, p, s, ctx)
-    return pow(ctx['g'], x, ctx['N'])
+    return (backend or _backend).powmod(ctx['g'], x, ctx['N'])
 
 
 def get_k(ctx):
@@ -63,6 +108,26 @@ def get_k(ctx):
     return int(hf.hexdigest(), 16)
 
 
+# (N, g, hashfunc): (k, H(N) xor H(g))
+_group_constants = {}
+
+
+def get_group_constants(ctx):
+    """Return k and H(N) xor H(g) for the group of the given context.
+
+    Both depend only on the group and the hash function, so they are computed once.
+    """
+    key = (ctx["N"], ctx["g"], ctx["hashfunc"])
+    constants = _group_constants.get(key)
+    if constants is None:
+        hN = ctx['hashfunc'](long_to_bytes(ctx['N'])).digest()
+        hG = ctx['hashfunc'](long_to_bytes(ctx['g'])).digest()
+        hGroup = bytes(a ^ b for a, b in zip(hN, hG))
+        constants = (get_k(ctx), hGroup)
+        _group_constants[key] = constants
+    return constants
+
+
 def get_session_key(S, ctx):
     hf = ctx['hashfunc']()
     hf.update(long_to_bytes(S))
@@ -71,18 +136,20 @@ def get_session_key(S, ctx):
 
 class Server(object):
 
-    def __init__(self, ctx, u, p, s=None, v=None):
+    def __init__(self, ctx, u, p, s=None, v=None, backend=None):
         self.ctx = ctx
+        self.backend = backend or _backend
         self.u = u
         self.p = p
         self.s = s or os.urandom(self.ctx["salt_len"])
-        self.v = v or get_verifier(u, p, self.s, self.ctx)
-        self.k = get_k(ctx)
+        self.v = v or get_verifier(u, p, self.s, self.ctx, self.backend)
+        self.k, self.hGroup = get_group_constants(ctx)
         self.b = bytes_to_long(os.urandom(256))  # TODO: specify length
         self.B = self.derive_B()
 
     def derive_B(self):
-        return (self.k * self.v + pow(self.ctx["g"], self.b, self.ctx["N"])) \
+        return (self.k * self.v +
+                self.backend.powmod(self.ctx["g"], self.b, self.ctx["N"])) \
             % self.ctx["N"]
 
     def set_A(self, bytes_A):
@@ -99,22 +166,15 @@ class Server(object):
         hf.update(padN(long_to_bytes(self.A), self.ctx) +
                   padN(long_to_bytes(self.B), self.ctx))
         U = int(hf.hexdigest(), 16)
-        Avu = self.A * pow(self.v, U, self.ctx["N"])
-        return pow(Avu, self.b, self.ctx["N"])
+        Avu = self.A * self.backend.powmod(self.v, U, self.ctx["N"])
+        return self.backend.powmod(Avu, self.b, self.ctx["N"])
 
     def get_M(self):
-        hf = self.ctx['hashfunc']()
-        hf.update(long_to_bytes(self.ctx['N']))
-        hN = hf.digest()
-        hf = self.ctx['hashfunc']()
-        hf.update(long_to_bytes(self.ctx['g']))
-        hG = hf.digest()
-        hGroup = bytes(hN[i] ^ hG[i] for i in range(0, len(hN)))
         hf = self.ctx['hashfunc']()
         hf.update(self.u)
         hU = hf.digest()
         hf = self.ctx['hashfunc']()
-        hf.update(hGroup + hU + self.s + long_to_bytes(self.A) +
+        hf.update(self.hGroup + hU + self.s + long_to_bytes(self.A) +
                   long_to_bytes(self.B) + long_to_bytes(self.K))
         return hf.digest()
 
@@ -28,6 +28,37 @@ class IIDManager:
         self.counter += 1
         self.iids[obj] = self.counter
 
+    def restore(self, keyed_objs, allocations):
+        """Reassign IIDs from a persisted allocation map.
+
+        Objects with a known key get their allocated IID back. New objects keep their
+        current IID if it is not allocated yet, otherwise they get a new one. The map
+        is updated with the new objects. Allocations of objects that no longer exist are
+        kept, so that their IIDs are not reused.
+
+        :param keyed_objs: ``(key, obj)`` pairs of all assigned objects, where the key
+            identifies the object across restarts.
+        :type keyed_objs: list
+
+        :param allocations: The persisted map of key to IID.
+        :type allocations: dict
+        """
+        allocated = set(allocations.values())
+        counter = max(allocated | set(self.iids.values()), default=0)
+        iids = {}
+        for key, obj in keyed_objs:
+            iid = allocations.get(key)
+            if iid is None:
+                iid = self.iids.get(obj)
+                if iid is None or iid in allocated:
+                    counter += 1
+                    iid = counter
+                allocations[key] = iid
+                allocated.add(iid)
+            iids[obj] = iid
+        self.iids = iids
+        self.counter = counter
+
     def get_obj(self, iid):
         """Get the object that is assigned the given IID."""
         for obj, iid_to_obj in self.iids.items():
@@ -6,21 +6,72 @@ representation.
 The idea is, give a name of a service and you get an
 instance of it (as long as it is described in some
 json file).
+
+Parsing the json files on every start is slow on small devices, so the default
+files are also shipped precompiled into a pickled registry with the UUIDs already
+parsed. The registry is only read when the first type is requested.
 """
 import json
 import logging
+import pickle
+from uuid import UUID
 
-from pyhap import CHARACTERISTICS_FILE, SERVICES_FILE
-from pyhap.characteristic import Characteristic
+from pyhap import CHARACTERISTICS_FILE, SERVICES_FILE, TYPES_REGISTRY_FILE
+from pyhap.characteristic import Characteristic, intern_properties
 from pyhap.service import Service
 
 _loader = None
 logger = logging.getLogger(__name__)
 
+# Bump when the layout of the registry changes.
+REGISTRY_VERSION = 1
+
+
+def compile_registry(char_types, serv_types):
+    """Compile json type descriptions into the registry layout.
+
+    Characteristics are stored as ``name: (uuid_int, properties)`` and services as
+    ``name: (uuid_int, required_char_names, other_fields)``.
+
+    :rtype: dict
+    """
+    chars = {name: (UUID(desc['UUID']).int,
+                    {key: value for key, value in desc.items() if key != 'UUID'})
+             for name, desc in char_types.items()}
+    services = {name: (UUID(desc['UUID']).int,
+                       tuple(desc['RequiredCharacteristics']),
+                       {key: value for key, value in desc.items()
+                        if key not in ('UUID', 'RequiredCharacteristics')})
+                for name, desc in serv_types.items()}
+    return {'version': REGISTRY_VERSION, 'chars': chars, 'services': services}
+
+
+def read_registry(path=TYPES_REGISTRY_FILE):
+    """Return the registry in the given file or None if it can't be used."""
+    try:
+        with open(path, 'rb') as file:
+            registry = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as e:
+        logger.debug('Could not read type registry %s: %s', path, e)
+        return None
+    if registry.get('version') != REGISTRY_VERSION:
+        logger.debug('Ignoring type registry %s with version %s',
+                     path, registry.get('version'))
+        return None
+    return registry
+
+
+def _uuid_str(uuid_int):
+    return str(UUID(int=uuid_int)).upper()
+
 
 class Loader:
     """Looks up type descriptions based on a name.
 
+    The descriptions are read on first use. With the default files, they are read
+    from the precompiled registry; `char_types` and `serv_types` are then only
+    built from it if accessed.
+
     .. seealso:: pyhap/resources/services.json
     .. seealso:: pyhap/resources/characteristics.json
     """
@@ -28,8 +79,15 @@ class Loader:
     def __init__(self, path_char=CHARACTERISTICS_FILE,
                  path_service=SERVICES_FILE):
         """Initialize a new Loader instance."""
-        self.char_types = self._read_file(path_char)
-        self.serv_types = self._read_file(path_service)
+        self._path_char = path_char
+        self._path_service = path_service
+        self._registry = None
+        self._use_registry = (path_char == CHARACTERISTICS_FILE and
+                              path_service == SERVICES_FILE)
+        self._char_types = None
+        self._serv_types = None
+        self._char_records = {}  # name: (type_id, CharacteristicProperties)
+        self._serv_records = {}  # name: (type_id, required char names)
 
     @staticmethod
     def _read_file(path):
@@ -37,27 +95,107 @@ class Loader:
         with open(path, 'r') as file:
             return json.load(file)
 
+    def _get_registry(self):
+        """Return the precompiled registry, if it can be used instead of json."""
+        if self._registry is None and self._use_registry:
+            self._registry = read_registry()
+            self._use_registry = self._registry is not None
+        return self._registry
+
+    @property
+    def char_types(self):
+        """The characteristic descriptions, as in characteristics.json."""
+        if self._char_types is None:
+            registry = self._get_registry()
+            if registry is not None:
+                self._char_types = {
+                    name: dict(properties, UUID=_uuid_str(uuid_int))
+                    for name, (uuid_int, properties) in registry['chars'].items()}
+            else:
+                self._char_types = self._read_file(self._path_char)
+        return self._char_types
+
+    @char_types.setter
+    def char_types(self, char_types):
+        self._char_types = char_types
+        self._char_records = {}
+
+    @property
+    def serv_types(self):
+        """The service descriptions, as in services.json."""
+        if self._serv_types is None:
+            registry = self._get_registry()
+            if registry is not None:
+                self._serv_types = {
+                    name: dict(other, UUID=_uuid_str(uuid_int),
+                               RequiredCharacteristics=list(required))
+                    for name, (uuid_int, required, other)
+                    in registry['services'].items()}
+            else:
+                self._serv_types = self._read_file(self._path_service)
+        return self._serv_types
+
+    @serv_types.setter
+    def serv_types(self, serv_types):
+        self._serv_types = serv_types
+        self._serv_records = {}
+
+    def _get_char_record(self, name):
+        """Return the parsed ``(type_id, properties)`` of a characteristic."""
+        record = self._char_records.get(name)
+        if record is not None:
+            return record
+
+        if self._char_types is None and self._get_registry() is not None:
+            uuid_int, properties = self._registry['chars'][name]
+            record = (UUID(int=uuid_int), intern_properties(properties))
+        else:
+            char_dict = self.char_types[name]
+            if 'Format' not in char_dict or \
+                'Permissions' not in char_dict or \
+                    'UUID' not in char_dict:
+                raise KeyError('Could not load char {}!'.format(name))
+            record = (UUID(char_dict['UUID']), intern_properties(
+                {key: value for key, value in char_dict.items() if key != 'UUID'}))
+        self._char_records[name] = record
+        return record
+
+    def _get_serv_record(self, name):
+        """Return the parsed ``(type_id, required char names)`` of a service."""
+        record = self._serv_records.get(name)
+        if record is not None:
+            return record
+
+        if self._serv_types is None and self._get_registry() is not None:
+            uuid_int, required, _other = self._registry['services'][name]
+            record = (UUID(int=uuid_int), required)
+        else:
+            service_dict = self.serv_types[name]
+            if 'RequiredCharacteristics' not in service_dict or \
+                    'UUID' not in service_dict:
+                raise KeyError('Could not load service {}!'.format(name))
+            record = (UUID(service_dict['UUID']),
+                      tuple(service_dict['RequiredCharacteristics']))
+        self._serv_records[name] = record
+        return record
+
     def get_char(self, name):
         """Return new Characteristic object."""
-        char_dict = self.char_types[name].copy()
-        if 'Format' not in char_dict or \
-            'Permissions' not in char_dict or \
-                'UUID' not in char_dict:
-            raise KeyError('Could not load char {}!'.format(name))
-        return Characteristic.from_dict(name, char_dict)
+        type_id, properties = self._get_char_record(name)
+        return Characteristic(name, type_id, properties)
 
     def get_service(self, name):
         """Return new service object."""
-        service_dict = self.serv_types[name].copy()
-        if 'RequiredCharacteristics' not in service_dict or \
-                'UUID' not in service_dict:
-            raise KeyError('Could not load service {}!'.format(name))
-        return Service.from_dict(name, service_dict, self)
+        type_id, required = self._get_serv_record(name)
+        service = Service(type_id, name)
+        for char_name in required:
+            service.add_characteristic(self.get_char(char_name))
+        return service
 
     @classmethod
     def from_dict(cls, char_dict=None, serv_dict=None):
         """Create a new instance directly from json dicts."""
-        loader = cls.__new__(Loader)
+        loader = cls(path_char=None, path_service=None)
         loader.char_types = char_dict or {}
         loader.serv_types = serv_dict or {}
         return loader
@@ -1,4 +1,6 @@
 # hsrp parameters
+from functools import lru_cache
+
 ng_order = (1024, 2048, 3072, 4096, 8192)
 
 _ng_const = (
@@ -96,8 +98,12 @@ FC026E479558E4475677E9AA9E3050E2765694DFC81F56E880B96E71\
 )
 
 
+@lru_cache(maxsize=None)
 def get_srp_context(ng_group_len, hashfunc, salt_len=16):
+    """Return the SRP context for the given group. Contexts are created once.
 
+    The returned dict is shared, it must not be modified.
+    """
     group = _ng_const[ng_order.index(ng_group_len)]
 
     ctx = {
@@ -11,7 +11,8 @@ class Service:
     TemperatureSensor service has the characteristic CurrentTemperature.
     """
 
-    __slots__ = ('broker', 'characteristics', 'display_name', 'type_id')
+    __slots__ = ('broker', '_characteristics', '_chars_by_name', '_chars_by_type',
+                 'display_name', 'type_id')
 
     def __init__(self, type_id, display_name=None):
         """Initialize a new Service object."""
@@ -20,6 +21,28 @@ class Service:
         self.display_name = display_name
         self.type_id = type_id
 
+    @property
+    def characteristics(self):
+        """The characteristics of this Service.
+
+        Assign a new list rather than changing it in place, so that the name and type
+        indexes stay consistent.
+        """
+        return self._characteristics
+
+    @characteristics.setter
+    def characteristics(self, chars):
+        self._characteristics = []
+        self._chars_by_name = {}
+        self._chars_by_type = {}
+        for char in chars:
+            self._append_characteristic(char)
+
+    def _append_characteristic(self, char):
+        self._characteristics.append(char)
+        self._chars_by_name.setdefault(char.display_name, char)
+        self._chars_by_type.setdefault(char.type_id, char)
+
     def __repr__(self):
         """Return the representation of the service."""
         return '<service display_name={} chars={}>' \
@@ -29,9 +52,8 @@ class Service:
     def add_characteristic(self, *chars):
         """Add the given characteristics as "mandatory" for this Service."""
         for char in chars:
-            if not any(char.type_id == original_char.type_id
-                       for original_char in self.characteristics):
-                self.characteristics.append(char)
+            if char.type_id not in self._chars_by_type:
+                self._append_characteristic(char)
 
     def get_characteristic(self, name):
         """Return a Characteristic object by the given name from this Service.
@@ -44,10 +66,22 @@ class Service:
         :return: A characteristic with the given name.
         :rtype: Characteristic
         """
-        for char in self.characteristics:
-            if char.display_name == name:
-                return char
-        raise ValueError('Characteristic not found')
+        char = self._chars_by_name.get(name)
+        if char is None:
+            raise ValueError('Characteristic not found')
+        return char
+
+    def get_characteristic_by_type(self, type_id):
+        """Return a Characteristic object by the given type from this Service.
+
+        :param type_id: The UUID of the characteristic type.
+        :type type_id: uuid.UUID
+
+        :return: A characteristic with the given type or None if no such
+            characteristic exists in this Service.
+        :rtype: Characteristic
+        """
+        return self._chars_by_type.get(type_id)
 
     def configure_char(self, char_name, properties=None, valid_values=None,
                        value=None, setter_callback=None, getter_callback=None):
@@ -1,7 +1,5 @@
 """Module for `State` class."""
-import ed25519
-
-from pyhap import util
+from pyhap import crypto, util
 from pyhap.const import DEFAULT_CONFIG_VERSION, DEFAULT_PORT
 
 
@@ -12,12 +10,13 @@ class State:
     """
 
     def __init__(self, *, address=None, mac=None,
-                 pincode=None, port=None):
+                 pincode=None, port=None, interface=None):
         """Initialize a new object. Create key pair.
 
-        Must be called with keyword arguments.
+        Must be called with keyword arguments. If no address is given, the address of
+        the interface is used, see `util.get_local_address`.
         """
-        self.address = address or util.get_local_address()
+        self.address = address or util.get_local_address(interface)
         self.mac = mac or util.generate_mac()
         self.pincode = pincode or util.generate_pincode()
         self.port = port or DEFAULT_PORT
@@ -25,8 +24,16 @@ class State:
 
         self.config_version = DEFAULT_CONFIG_VERSION
         self.paired_clients = {}
+        # client_uuid: crypto.VerifyingKey, a cache of the parsed paired_clients keys
+        self.paired_client_keys = {}
+        # Stable AIDs and IIDs, see Accessory.allocate_ids:
+        # {'aids': {accessory key: aid}, 'iids': {str(aid): {object key: iid}}}
+        self.id_allocations = {}
+        # Hash of the accessory structure for config_version, see
+        # AccessoryDriver.get_config_hash
+        self.config_hash = None
 
-        sk, vk = ed25519.create_keypair()
+        sk, vk = crypto.generate_keypair()
         self.private_key = sk
         self.public_key = vk
 
@@ -46,7 +53,9 @@ class State:
             (not the session public key).
         :type client_public: bytes
         """
+        verifying_key = crypto.verifying_key_from_bytes(client_public)
         self.paired_clients[client_uuid] = client_public
+        self.paired_client_keys[client_uuid] = verifying_key
 
     def remove_paired_client(self, client_uuid):
         """Remove a given client from dictionary of paired clients.
@@ -55,3 +64,26 @@ class State:
         :type client_uuid: uuid.UUID
         """
         self.paired_clients.pop(client_uuid)
+        self.paired_client_keys.pop(client_uuid, None)
+
+    def get_client_verifying_key(self, client_uuid):
+        """Return the verifying key of a paired client.
+
+        `paired_clients` decides whether the client is paired and with which key; the
+        parsed key is only cached. A cache entry that is written back by a concurrent
+        call after the client was removed or paired again is therefore never used.
+
+        :param client_uuid: The client's UUID.
+        :type client_uuid: uuid.UUID
+
+        :return: The verifying key or None if the client is not paired.
+        :rtype: crypto.VerifyingKey
+        """
+        client_public = self.paired_clients.get(client_uuid)
+        if client_public is None:
+            return None
+        verifying_key = self.paired_client_keys.get(client_uuid)
+        if verifying_key is None or verifying_key.to_bytes() != client_public:
+            verifying_key = crypto.verifying_key_from_bytes(client_public)
+            self.paired_client_keys[client_uuid] = verifying_key
+        return verifying_key
@@ -0,0 +1,339 @@
+"""Spread bridges across worker processes.
+
+The encryption of every HAP session and the pairing crypto hold the GIL, so a single
+process uses at most one CPU core, however many bridges it runs. A `Supervisor` runs
+the bridges in several worker processes, each a `DriverHost`, and:
+
+- forwards the log records of the workers to the loggers of the supervisor process;
+- advertises all bridges from one Zeroconf instance in the supervisor process, fed by
+  the workers over a pipe per worker;
+- checks that every worker is alive and its event loop responsive, and restarts
+  workers that crashed or hang.
+
+Workers are started with the ``spawn`` method, so the bridge factories must be
+importable, e.g. module level functions, and the program must guard its entry point:
+
+.. code-block:: python
+
+    def make_bridge(driver, index):
+        bridge = Bridge(driver, 'Bridge {}'.format(index))
+        ...
+        return bridge
+
+    if __name__ == '__main__':
+        supervisor = Supervisor(workers=4)
+        for i in range(8):
+            supervisor.add_bridge(functools.partial(make_bridge, index=i),
+                                  port=51830 + i,
+                                  persist_file='bridge{}.state'.format(i))
+        supervisor.run()
+"""
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+
+from zeroconf import ServiceInfo, Zeroconf
+
+from pyhap import util
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 1
+HEALTH_TIMEOUT = 10
+STARTUP_TIMEOUT = 60
+MAX_RESTART_DELAY = 60
+
+
+class _Channel:
+    """The sending end of the pipe of a worker, shared by the threads of the worker.
+
+    Also stands in for the queue of a `logging.handlers.QueueHandler`.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+
+    def send(self, action, args=None):
+        with self.lock:
+            self.connection.send((action, args))
+
+    def put_nowait(self, record):
+        self.send('log', record)
+
+
+class _AdvertiserProxy:
+    """Stands in for Zeroconf in a worker and sends the services to the supervisor."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def _send(self, action, info):
+        addresses = getattr(info, 'addresses', None)  # Since zeroconf 0.23
+        address = addresses[0] if addresses else info.address
+        self.channel.send(action, (info.type, info.name, address, info.port,
+                                   info.text, info.server))
+
+    def register_service(self, info):
+        self._send('register', info)
+
+    def update_service(self, info):
+        self._send('update', info)
+
+    def unregister_service(self, info):
+        self._send('unregister', info)
+
+    def close(self):
+        pass
+
+
+def _send_heartbeat(loop, channel):
+    """Report that the event loop of the worker is responsive, every interval."""
+    channel.send('heartbeat')
+    loop.call_later(HEARTBEAT_INTERVAL, _send_heartbeat, loop, channel)
+
+
+def _run_worker(bridges, connection, log_level):
+    """Run the given bridges in a DriverHost. The entry point of worker processes."""
+    # pylint: disable=import-outside-toplevel
+    from pyhap.host import DriverHost
+
+    channel = _Channel(connection)
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(channel)]
+    root.setLevel(log_level)
+
+    host = DriverHost(advertiser=_AdvertiserProxy(channel))
+    for factory, driver_kwargs in bridges:
+        driver = host.add_driver(**driver_kwargs)
+        driver.add_accessory(factory(driver))
+    signal.signal(signal.SIGTERM, lambda _signal, _frame: host.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor handles Ctrl+C.
+    host.loop.call_soon(_send_heartbeat, host.loop, channel)
+    host.start()
+
+
+def _kill(process):
+    """Kill the process, or terminate it where killing is not available."""
+    getattr(process, 'kill', process.terminate)()
+
+
+class _Worker:
+    """The state of a worker process in the supervisor."""
+
+    def __init__(self, worker_id, bridges):
+        self.worker_id = worker_id
+        self.bridges = bridges
+        self.process = None
+        self.connection = None  # Receives the messages of the current process.
+        self.started_at = 0.
+        self.last_heartbeat = None
+        self.restarts = 0
+        self.restart_at = 0.
+        self.services = {}  # name: ServiceInfo
+
+
+class Supervisor:
+    """Runs bridges in worker processes and advertises them from this process."""
+
+    def __init__(self, workers=None, *, advertiser=None,
+                 health_timeout=HEALTH_TIMEOUT, startup_timeout=STARTUP_TIMEOUT):
+        """Initialise without starting any process.
+
+        :param workers: The number of worker processes, by default the number of CPUs.
+        :type workers: int
+
+        :param advertiser: The Zeroconf instance advertising the bridges. A new one is
+            created on `run` if not given.
+        :type advertiser: zeroconf.Zeroconf
+
+        :param health_timeout: Seconds without a heartbeat after which a worker is
+            considered hung and restarted.
+        :type health_timeout: float
+
+        :param startup_timeout: Seconds a starting worker may take to send its first
+            heartbeat, i.e. to set up its bridges, before it is restarted.
+        :type startup_timeout: float
+        """
+        self.num_workers = workers or os.cpu_count() or 1
+        self.advertiser = advertiser
+        self.health_timeout = health_timeout
+        self.startup_timeout = startup_timeout
+        self.bridges = []  # (factory, driver kwargs)
+        self.workers = []
+        self._ctx = multiprocessing.get_context('spawn')
+        self._stop_event = threading.Event()
+
+    def add_bridge(self, factory, **driver_kwargs):
+        """Add a bridge to run in one of the workers.
+
+        :param factory: Called in the worker with the `AccessoryDriver` and returns
+            the accessory or bridge to run. Must be picklable.
+        :type factory: callable
+
+        :param driver_kwargs: Passed to `AccessoryDriver`; at least ``port`` and
+            ``persist_file`` must differ between bridges.
+        """
+        self.bridges.append((factory, driver_kwargs))
+
+    def assign_bridges(self):
+        """Return the bridges of every worker.
+
+        :return: One list of ``(factory, driver kwargs)`` per worker.
+        :rtype: list
+        """
+        assigned = [[] for _ in range(min(self.num_workers, len(self.bridges)))]
+        for index, bridge in enumerate(self.bridges):
+            assigned[index % len(assigned)].append(bridge)
+        return assigned
+
+    def run(self):
+        """Start the workers and supervise them until `stop` is called.
+
+        The supervisor is stopped gracefully on a KeyboardInterrupt.
+        """
+        if self.advertiser is None:
+            self.advertiser = Zeroconf()
+        self.workers = [_Worker(worker_id, bridges)
+                        for worker_id, bridges in enumerate(self.assign_bridges())]
+        try:
+            for worker in self.workers:
+                self._start_worker(worker)
+            while not self._stop_event.is_set():
+                self._process_messages(timeout=HEARTBEAT_INTERVAL)
+                self._check_workers()
+        except KeyboardInterrupt:
+            logger.info('Stopping the workers')
+        finally:
+            self._stop_workers()
+            self._process_messages(timeout=0)
+            for worker in self.workers:
+                self._unregister_services(worker)
+            self.advertiser.close()
+
+    def stop(self):
+        """Stop the workers and `run`, thread-safe."""
+        self._stop_event.set()
+
+    def _start_worker(self, worker):
+        # A new pipe for every process, what a killed process left is discarded.
+        worker.connection, sender = self._ctx.Pipe(duplex=False)
+        worker.process = self._ctx.Process(
+            target=_run_worker, name='HAP-worker-{}'.format(worker.worker_id),
+            args=(worker.bridges, sender, logging.getLogger().getEffectiveLevel()))
+        worker.started_at = time.monotonic()
+        worker.last_heartbeat = None
+        worker.process.start()
+        sender.close()
+        logger.info('Started worker %d (pid %d) with %d bridges', worker.worker_id,
+                    worker.process.pid, len(worker.bridges))
+
+    def _stop_workers(self):
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + self.health_timeout
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            while worker.process.is_alive() and time.monotonic() < deadline:
+                # Keep reading, a worker blocks while its pipe is full.
+                self._process_messages(timeout=0.1)
+            if worker.process.is_alive():
+                _kill(worker.process)
+            worker.process.join()
+            self._close_connection(worker)
+
+    def _check_workers(self):
+        """Restart workers that exited or stopped sending heartbeats."""
+        now = time.monotonic()
+        for worker in self.workers:
+            process = worker.process
+            if process is None:
+                if now >= worker.restart_at:
+                    self._start_worker(worker)
+                continue
+            if process.is_alive():
+                if worker.last_heartbeat is None:
+                    silent, timeout = now - worker.started_at, self.startup_timeout
+                else:
+                    silent, timeout = now - worker.last_heartbeat, self.health_timeout
+                if silent <= timeout:
+                    continue
+                logger.error('Worker %d did not respond for %.0f seconds, restarting',
+                             worker.worker_id, silent)
+                _kill(process)
+                process.join()
+            else:
+                logger.error('Worker %d exited with code %s, restarting',
+                             worker.worker_id, process.exitcode)
+            self._unregister_services(worker)
+            self._close_connection(worker)
+            worker.process = None
+            worker.restart_at = now + min(2 ** worker.restarts - 1, MAX_RESTART_DELAY)
+            worker.restarts += 1
+
+    def _process_messages(self, timeout):
+        """Handle the messages of the workers until none arrives within the timeout."""
+        while True:
+            workers = {worker.connection: worker for worker in self.workers
+                       if worker.connection is not None}
+            if not workers:
+                time.sleep(timeout)
+                return
+            ready = multiprocessing.connection.wait(list(workers), timeout)
+            if not ready:
+                return
+            timeout = 0
+            for connection in ready:
+                worker = workers[connection]
+                try:
+                    action, args = connection.recv()
+                except (EOFError, OSError):
+                    # The process exited, `_check_workers` restarts it.
+                    self._close_connection(worker)
+                    continue
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('Discarding a message of worker %d',
+                                     worker.worker_id)
+                    continue
+                try:
+                    self._handle_message(worker, action, args)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('Error handling the %s message of worker %d',
+                                     action, worker.worker_id)
+
+    def _handle_message(self, worker, action, args):
+        if action == 'log':
+            logging.getLogger(args.name).handle(args)
+            return
+        if action == 'heartbeat':
+            worker.last_heartbeat = time.monotonic()
+            if worker.last_heartbeat - worker.started_at > self.health_timeout:
+                worker.restarts = 0  # Up for a while, restart right away next time.
+            return
+        info = ServiceInfo(*args[:4], 0, 0, *args[4:])
+        if action == 'register':
+            self.advertiser.register_service(info)
+            worker.services[info.name] = info
+        elif action == 'update' and info.name in worker.services:
+            util.update_service(self.advertiser, worker.services[info.name], info)
+            worker.services[info.name] = info
+        elif action == 'unregister' and worker.services.pop(info.name, None):
+            self.advertiser.unregister_service(info)
+
+    @staticmethod
+    def _close_connection(worker):
+        if worker.connection is not None:
+            worker.connection.close()
+            worker.connection = None
+
+    def _unregister_services(self, worker):
+        for info in worker.services.values():
+            self.advertiser.unregister_service(info)
+        worker.services.clear()
@@ -1,45 +1,142 @@
-# Encodes and decodes Tag-Length-Value data.
-import struct
+"""TLV8 codec used by the pairing endpoints.
 
+Values longer than 255 bytes are split into fragments with the same tag, which are
+joined again when decoding. Consecutive items with the same tag, e.g. the pairings in
+a `/pairings` list response, are delimited with an empty `SEPARATOR` item.
 
-def encode(*args):
+Tags are single ``bytes`` objects, e.g. ``b'\\x01'``, values are bytes-like objects.
+"""
+SEPARATOR = b'\xFF'
+MAX_FRAGMENT_LENGTH = 255
+
+_TAGS = tuple(bytes((i,)) for i in range(256))
+
+
+def encode_into(buffer, *args):
+    """Append the encoded tag and value pairs to a buffer.
+
+    Lets callers build a message in a single, reused ``bytearray``. Long values are
+    fragmented through a ``memoryview``, so they are copied only into the buffer.
+
+    :param buffer: The buffer to append to.
+    :type buffer: bytearray
+
+    :return: The buffer.
+    :rtype: bytearray
+    """
     assert len(args) % 2 == 0
+    for i in range(0, len(args), 2):
+        tag = args[i]
+        data = args[i + 1]
+        length = len(data)
+        if length <= MAX_FRAGMENT_LENGTH:
+            buffer += tag
+            buffer.append(length)
+            buffer += data
+            continue
+        view = memoryview(data)
+        for start in range(0, length, MAX_FRAGMENT_LENGTH):
+            fragment = view[start:start + MAX_FRAGMENT_LENGTH]
+            buffer += tag
+            buffer.append(len(fragment))
+            buffer += fragment
+    return buffer
 
-    pieces = []
-    for x in range(0, len(args), 2):
-        tag = args[x]
-        data = args[x + 1]
-        total_length = len(data)
-        if len(data) <= 255:
-            encoded = tag + struct.pack("B", total_length) + data
-        else:
-            encoded = b""
-            for x in range(0, total_length // 255):
-                encoded = encoded + tag + b'\xFF' + data[x * 255: (x + 1) * 255]
-            remaining = total_length % 255
-            encoded = encoded + tag + struct.pack("B", remaining) \
-                + data[-remaining:]
 
-        pieces.append(encoded)
+def encode(*args):
+    """Encode tag and value pairs.
+
+    For example ``encode(b'\\x06', b'\\x02', b'\\x03', public_key)``. Tags may repeat;
+    insert `SEPARATOR` with an empty value between consecutive items with the same
+    tag, or use `encode_list`.
 
-    return b"".join(pieces)
+    :rtype: bytes
+    """
+    return bytes(encode_into(bytearray(), *args))
 
 
-def decode(data):
+def encode_list(items):
+    """Encode a list of TLV8 records, delimited with separators.
+
+    :param items: Sequences of tag and value pairs, one per record, e.g.
+        ``[(tag1, value1, tag2, value2), ...]``.
+
+    :rtype: bytes
+    """
+    buffer = bytearray()
+    for item in items:
+        if buffer:
+            encode_into(buffer, SEPARATOR, b'')
+        encode_into(buffer, *item)
+    return bytes(buffer)
+
 
-    objects = {}
+def iter_decode(data):
+    """Lazily decode a complete TLV8 message, yielding ``(tag, value)`` items in order.
+
+    This is not an incremental decoder: the whole message must be in ``data``, only
+    the items are produced one at a time, so a caller can stop early without decoding
+    the rest. Partial items are not kept for more data, they are an error.
+
+    Fragments are joined into a single item. Separators are yielded as well, with an
+    empty value. Values are sliced straight out of ``bytes`` input; other bytes-like
+    objects are read through a ``memoryview`` and only the yielded values are copied.
+
+    :param data: A bytes-like object with the complete message.
+
+    :raise ValueError: If the data is truncated, when the truncated item is reached.
+    """
+    if not isinstance(data, bytes):
+        data = memoryview(data).cast('B')
+    end = len(data)
     current = 0
-    while current < len(data):
-        # The following hack is because bytes[x] is an int
-        # and we want to keep the tag as a byte.
-        tag = data[current: current + 1]
+    while current < end:
+        if current + 1 == end:
+            raise ValueError('Truncated TLV8 item at offset {}'.format(current))
+        tag = data[current]
         length = data[current + 1]
-        value = data[current + 2: current + 2 + length]
-        if tag in objects:
-            objects[tag] = objects[tag] + value
-        else:
-            objects[tag] = value
+        start = current + 2
+        current = start + length
+        if current > end:
+            raise ValueError('Truncated TLV8 value at offset {}'.format(start))
+        if length < MAX_FRAGMENT_LENGTH or current == end or data[current] != tag:
+            yield _TAGS[tag], bytes(data[start:current])
+            continue
+
+        value = bytearray(data[start:current])
+        while length == MAX_FRAGMENT_LENGTH and current < end and data[current] == tag:
+            if current + 1 == end:
+                raise ValueError('Truncated TLV8 item at offset {}'.format(current))
+            length = data[current + 1]
+            start = current + 2
+            current = start + length
+            if current > end:
+                raise ValueError('Truncated TLV8 value at offset {}'.format(start))
+            value += data[start:current]
+        yield _TAGS[tag], bytes(value)
 
-        current = current + 2 + length
 
-    return objects
+def decode(data):
+    """Decode TLV8 data into a dict of tag to value.
+
+    If a tag occurs more than once, the last item wins; use `decode_list` for data
+    with multiple records.
+
+    :rtype: dict
+    """
+    return dict(iter_decode(data))
+
+
+def decode_list(data):
+    """Decode TLV8 data with records delimited by separators.
+
+    :return: One dict of tag to value per record.
+    :rtype: list
+    """
+    records = [{}]
+    for tag, value in iter_decode(data):
+        if tag == SEPARATOR:
+            records.append({})
+        else:
+            records[-1][tag] = value
+    return records
@@ -1,31 +1,160 @@
 import asyncio
+import functools
 import socket
 import random
 import binascii
+import struct
 import sys
 
+try:
+    import fcntl
+except ImportError:  # Not on Windows
+    fcntl = None
+
 
 ALPHANUM = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 HEX_DIGITS = '0123456789ABCDEF'
 
 rand = random.SystemRandom()
 
+PROC_NET_ROUTE = '/proc/net/route'
+RTF_UP = 0x1
+SIOCGIFADDR = 0x8915  # Linux only
+
+
+def get_interfaces():
+    """Return the names of the network interfaces of this host.
 
-def get_local_address():
+    :return: The names in the order of their index, or an empty list if the platform
+        cannot enumerate them.
+    :rtype: list
     """
-    Grabs the local IP address using a socket.
+    try:
+        return [name for _index, name in socket.if_nameindex()]
+    except (AttributeError, OSError):
+        return []
+
+
+def get_interface_address(interface):
+    """Return the IPv4 address of the given interface, without any network traffic.
+
+    Interfaces are queried with the Linux ``SIOCGIFADDR`` ioctl, other platforms are
+    not supported.
+
+    :param interface: The name of the interface, e.g. ``eth0``.
+    :type interface: str
+
+    :return: The address in IPv4 format or None if the interface has none or the
+        platform is not Linux.
+    :rtype: str
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return None
+    request = struct.pack('256s', interface.encode('utf-8')[:15])
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            ifreq = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, request)
+        except OSError:
+            return None
+    # struct ifreq: the name, then a sockaddr_in with the address at offset 4.
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+def get_default_route_interface():
+    """Return the interface of the default IPv4 route, from ``/proc/net/route``.
+
+    :return: The interface name or None if there is no default route or the file is
+        not available.
+    :rtype: str
+    """
+    try:
+        with open(PROC_NET_ROUTE) as fp:
+            lines = fp.read().splitlines()[1:]
+    except OSError:
+        return None
+    routes = []
+    for line in lines:
+        fields = line.split()
+        # Iface Destination Gateway Flags RefCnt Use Metric Mask ...
+        if len(fields) >= 8 and fields[1] == '00000000' and fields[7] == '00000000' \
+                and int(fields[3], 16) & RTF_UP:
+            routes.append((int(fields[6]), fields[0]))
+    return min(routes)[1] if routes else None
+
+
+@functools.lru_cache(maxsize=None)
+def get_local_address(interface=None):
+    """Return the local IPv4 address on which to run the accessory.
+
+    If no interface is given, the interface of the default route is used or, if
+    there is none, the first interface with an address that is not a loopback
+    address. On Linux, interfaces are queried locally, without any network traffic.
+    If none of them has such an address, and always on other platforms, the address
+    of the route to a public address is used instead. Results are cached, call
+    ``get_local_address.cache_clear()`` after the network configuration changed.
+
+    :param interface: The name of the interface whose address to use.
+    :type interface: str
 
     :return: Local IP Address in IPv4 format.
     :rtype: str
+
+    :raise ValueError: If the given interface has no IPv4 address, or the platform is
+        not Linux.
+
+    :raise OSError: If no interface has a routable IPv4 address, e.g. because the
+        network is not up yet. Nothing is cached then. Pass the ``address`` to the
+        `AccessoryDriver` to use a specific address regardless.
     """
-    # TODO: try not to talk 8888 for this
+    if interface is not None:
+        addr = get_interface_address(interface)
+        if addr is None:
+            raise ValueError('Interface {} has no IPv4 address'.format(interface))
+        return addr
+
+    default_interface = get_default_route_interface()
+    if default_interface is not None:
+        addr = get_interface_address(default_interface)
+        if addr is not None:
+            return addr
+    for name in get_interfaces():
+        addr = get_interface_address(name)
+        if addr is not None and not addr.startswith('127.'):
+            return addr
+
+    # connect() on a UDP socket sends nothing, it just selects the route.
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         s.connect(("8.8.8.8", 80))
-        addr = s.getsockname()[0]
+        return s.getsockname()[0]
+    except OSError as e:
+        # A loopback address would be advertised, but no controller could reach it.
+        raise OSError('No network interface with a routable IPv4 address found, '
+                      'pass the address to use') from e
     finally:
         s.close()
-    return addr
+
+
+def update_service(advertiser, old_info, info):
+    """Update an advertised mDNS service in place.
+
+    Versions of zeroconf without ``Zeroconf.update_service`` briefly withdraw the
+    service and register it again instead.
+
+    :param advertiser: The Zeroconf instance that advertises the service.
+    :type advertiser: zeroconf.Zeroconf
+
+    :param old_info: The currently advertised service.
+    :type old_info: zeroconf.ServiceInfo
+
+    :param info: The new service info, with the same name.
+    :type info: zeroconf.ServiceInfo
+    """
+    if hasattr(advertiser, 'update_service'):
+        advertiser.update_service(info)
+    else:
+        advertiser.unregister_service(old_info)
+        advertiser.register_service(info)
 
 
 def long_to_bytes(n):
@@ -38,16 +167,7 @@ def long_to_bytes(n):
     :return: ``long int`` in ``bytes`` format.
     :rtype: bytes
     """
-    byteList = list()
-    x = 0
-    off = 0
-    while x != n:
-        b = (n >> off) & 0xFF
-        byteList.append(b)
-        x = x | (b << off)
-        off += 8
-    byteList.reverse()
-    return bytes(byteList)
+    return n.to_bytes((n.bit_length() + 7) // 8, byteorder='big')
 
 
 def generate_mac():
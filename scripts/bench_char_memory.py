@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Measure the memory used by characteristics with tracemalloc.
+
+Creates 10,000 characteristics through the Loader, the way accessories do, and
+reports the memory they hold per characteristic.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_char_memory.py``
+"""
+import tracemalloc
+
+from pyhap.loader import Loader
+
+COUNT = 10000
+NAMES = ('On', 'Brightness', 'Hue', 'Saturation', 'CurrentTemperature',
+         'TemperatureDisplayUnits', 'StatusLowBattery', 'Name')
+
+
+def main():
+    """Print the memory held by COUNT characteristics."""
+    loader = Loader()
+    for name in NAMES:
+        loader.get_char(name)  # Warm up any caches of the loader.
+
+    tracemalloc.start()
+    before, _peak = tracemalloc.get_traced_memory()
+    chars = [loader.get_char(NAMES[i % len(NAMES)]) for i in range(COUNT)]
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('{} characteristics: {:.1f} KiB, {:.0f} bytes each, peak {:.1f} KiB'.format(
+        len(chars), (after - before) / 1024, (after - before) / COUNT,
+        (peak - before) / 1024))
+
+
+if __name__ == '__main__':
+    main()
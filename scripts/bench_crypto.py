@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Benchmark the ed25519 and X25519 operations of every installed crypto provider.
+
+Every pair verify generates a session key, does an ECDH exchange, signs with the
+accessory's long-term key and verifies the client's signature.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_crypto.py``
+"""
+import os
+import timeit
+
+from pyhap import crypto
+
+NUMBER = 200
+
+
+def bench(provider):
+    """Return the operations per second for each operation of the provider."""
+    material = os.urandom(100)
+    signing_key = provider.generate_signing_key()
+    verifying_key = signing_key.get_verifying_key()
+    signature = signing_key.sign(material)
+    session_key = provider.generate_session_key()
+    peer_public = provider.generate_session_key().public_bytes()
+
+    operations = (
+        ('keygen', provider.generate_signing_key),
+        ('sign', lambda: signing_key.sign(material)),
+        ('verify', lambda: verifying_key.verify(signature, material)),
+        ('x25519 keygen', lambda: provider.generate_session_key().public_bytes()),
+        ('ecdh', lambda: session_key.exchange(peer_public)),
+    )
+    return [(name, NUMBER / min(timeit.repeat(func, number=NUMBER, repeat=3)))
+            for name, func in operations]
+
+
+def main():
+    """Print the throughput of every provider."""
+    for name, provider in crypto.PROVIDERS:
+        print(name)
+        for operation, ops in bench(provider):
+            print('  {:>14}: {:10.1f} ops/s'.format(operation, ops))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Benchmark Characteristic.set_value for characteristics of different formats.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_set_value.py``
+"""
+import timeit
+
+from pyhap.loader import Loader
+
+NUMBER = 100000
+CASES = (
+    # (characteristic, value), one per validation branch.
+    ('CurrentTemperature', 21.5),  # float with min and max
+    ('Brightness', 150),  # int, clamped to max
+    ('On', 1),  # bool
+    ('Name', 'Living room lamp'),  # string
+    ('TargetHeatingCoolingState', 3),  # uint8 with valid values
+    ('SupportedVideoStreamConfiguration', 'AQEA'),  # tlv8, not validated
+)
+
+
+def main():
+    """Print set_value calls per second for every case."""
+    loader = Loader()
+    for name, value in CASES:
+        char = loader.get_char(name)
+        best = min(timeit.repeat(lambda: char.set_value(value, should_notify=False),
+                                 number=NUMBER, repeat=3))
+        print('{:>34} ({:>6}): {:10.0f} ops/s'.format(
+            name, char.properties['Format'], NUMBER / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark the server side of SRP pairing for every available arithmetic backend.
+
+Each round constructs a `pyhap.hsrp.Server`, which computes the password verifier and
+the challenge B, then sets the client's public key A and verifies the client's proof,
+i.e. everything the accessory does during the first two steps of pair setup.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_srp.py``
+"""
+import hashlib
+import os
+import time
+
+from pyhap import hsrp
+from pyhap.params import get_srp_context
+
+USERNAME = b'Pair-Setup'
+PASSWORD = b'123-45-678'
+ROUNDS = 10
+
+
+def client_proof(ctx, salt, B):
+    """Compute the client's public key A and proof M for the given challenge."""
+    N, g = ctx['N'], ctx['g']
+    a = hsrp.bytes_to_long(os.urandom(32))
+    A = pow(g, a, N)
+    hf = ctx['hashfunc']()
+    hf.update(hsrp.padN(hsrp.long_to_bytes(A), ctx) +
+              hsrp.padN(hsrp.long_to_bytes(B), ctx))
+    u = int(hf.hexdigest(), 16)
+    x = hsrp.get_x(USERNAME, PASSWORD, salt, ctx)
+    S = pow(B - hsrp.get_k(ctx) * pow(g, x, N), a + u * x, N)
+    K = hsrp.get_session_key(S, ctx)
+    _k, h_group = hsrp.get_group_constants(ctx)
+    hf = ctx['hashfunc']()
+    hf.update(h_group + ctx['hashfunc'](USERNAME).digest() + salt +
+              hsrp.long_to_bytes(A) + hsrp.long_to_bytes(B) + hsrp.long_to_bytes(K))
+    return hsrp.long_to_bytes(A), hf.digest()
+
+
+def bench(ctx, backend):
+    """Return the average seconds for construction and for set_A + verify."""
+    construct = verify = 0.
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        server = hsrp.Server(ctx, USERNAME, PASSWORD, backend=backend)
+        construct += time.perf_counter() - start
+
+        A, M = client_proof(ctx, *server.get_challenge())
+
+        start = time.perf_counter()
+        server.set_A(A)
+        assert server.verify(M) is not None
+        verify += time.perf_counter() - start
+    return construct / ROUNDS, verify / ROUNDS
+
+
+def main():
+    """Print the pairing cost per backend."""
+    ctx = get_srp_context(3072, hashlib.sha512, 16)
+    hsrp.get_group_constants(ctx)
+    if hsrp.GMPBackend.name not in hsrp.BACKENDS:
+        print('gmpy2 is not installed, only the python backend is available.')
+    for name, backend in sorted(hsrp.BACKENDS.items()):
+        construct, verify = bench(ctx, backend)
+        print('{:>7}: Server() {:7.1f} ms, set_A + verify {:7.1f} ms, '
+              'total {:7.1f} ms'.format(name, construct * 1000, verify * 1000,
+                                        (construct + verify) * 1000))
+
+
+if __name__ == '__main__':
+    main()
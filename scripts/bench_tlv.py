@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark TLV8 encoding and decoding of large, fragmented values.
+
+The payloads mimic pair setup: a 384 byte SRP public key and proof, and an
+encrypted sub-TLV with a certificate-sized blob. The previous implementation, which
+concatenated ``bytes`` fragment by fragment, is included for comparison.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_tlv.py``
+"""
+import os
+import struct
+import timeit
+
+from pyhap import tlv
+
+NUMBER = 2000
+
+
+def legacy_encode(*args):
+    """The encoder before the rewrite."""
+    pieces = []
+    for x in range(0, len(args), 2):
+        tag = args[x]
+        data = args[x + 1]
+        total_length = len(data)
+        if len(data) <= 255:
+            encoded = tag + struct.pack("B", total_length) + data
+        else:
+            encoded = b""
+            for x in range(0, total_length // 255):
+                encoded = encoded + tag + b'\xFF' + data[x * 255: (x + 1) * 255]
+            remaining = total_length % 255
+            encoded = encoded + tag + struct.pack("B", remaining) \
+                + data[-remaining:]
+        pieces.append(encoded)
+    return b"".join(pieces)
+
+
+def legacy_decode(data):
+    """The decoder before the rewrite."""
+    objects = {}
+    current = 0
+    while current < len(data):
+        tag = data[current: current + 1]
+        length = data[current + 1]
+        value = data[current + 2: current + 2 + length]
+        if tag in objects:
+            objects[tag] = objects[tag] + value
+        else:
+            objects[tag] = value
+        current = current + 2 + length
+    return objects
+
+
+def main():
+    """Print the throughput for a few payload sizes."""
+    for size in (384, 4096, 65536):
+        args = (b'\x06', b'\x04', b'\x03', os.urandom(384),
+                b'\x05', os.urandom(size), b'\x0A', os.urandom(64))
+        data = tlv.encode(*args)
+        assert tlv.decode(data) == legacy_decode(data)
+        print('{} byte payload'.format(size))
+        for name, func in (('encode', lambda: tlv.encode(*args)),
+                           ('legacy encode', lambda: legacy_encode(*args)),
+                           ('decode', lambda: tlv.decode(data)),
+                           ('legacy decode', lambda: legacy_decode(data))):
+            best = min(timeit.repeat(func, number=NUMBER, repeat=3))
+            print('  {:>14}: {:8.1f} us'.format(name, best / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Benchmark ed25519 verification of a client proof with and without cached keys.
+
+Pair verify checks the client's signature with the client's long-term public key.
+This compares parsing the key from bytes for every verify against reusing the
+verifying key that is cached in `State`.
+
+Run from the repository root: ``PYTHONPATH=. python3 scripts/bench_verify_keys.py``
+"""
+import os
+import timeit
+import uuid
+
+from pyhap import crypto
+from pyhap.state import State
+
+NUMBER = 500
+
+
+def main():
+    """Print the verify throughput with and without the verifying key cache."""
+    for name, _ in crypto.PROVIDERS:
+        crypto.set_provider(name)
+        client_sk, client_vk = crypto.generate_keypair()
+        client_uuid = uuid.uuid1()
+        material = os.urandom(32 + 36 + 32)
+        proof = client_sk.sign(material)
+
+        state = State(address='127.0.0.1')
+        state.add_paired_client(client_uuid, client_vk.to_bytes())
+
+        def verify_uncached():
+            client_public = state.paired_clients[client_uuid]
+            crypto.verifying_key_from_bytes(client_public).verify(proof, material)
+
+        def verify_cached():
+            state.get_client_verifying_key(client_uuid).verify(proof, material)
+
+        print(name)
+        for label, func in (('uncached', verify_uncached), ('cached', verify_cached)):
+            seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+            print('  {:>8}: {:8.1f} verifies/s'.format(label, NUMBER / seconds))
+
+
+if __name__ == '__main__':
+    main()
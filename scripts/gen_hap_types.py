@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
-"""Create a json representation from the HomeKit Accessory Simulator Types."""
+"""Create a json representation from the HomeKit Accessory Simulator Types.
+
+Also precompiles the json files into the type registry used by `pyhap.loader.Loader`.
+Run from the repository root: ``PYTHONPATH=. python3 scripts/gen_hap_types.py``
+
+To only rebuild the registry from the existing json files, e.g. after editing them,
+pass ``--registry``.
+"""
+import argparse
 import plistlib
+import pickle
 import json
 
+from pyhap.loader import compile_registry
+
 # This path could be different.
 HOMEKIT_TYPES_PLIST = "/Applications/Xcode.app/Contents/Applications/HomeKit Accessory Simulator.app/Contents/Frameworks/HAPAccessoryKit.framework/Versions/A/Resources/default.metadata.plist"
 CHAR_OUT_FILE = "./pyhap/resources/characteristics.json"
 SERVICE_OUT_FILE = "./pyhap/resources/services.json"
+REGISTRY_OUT_FILE = "./pyhap/resources/types.pickle"
 
 PERMS_MAP = {
     "read": "pr",
@@ -98,7 +110,19 @@ def list2dict(infos):
     return info_dict
 
 
-def main():
+def write_registry():
+    """Precompile the json representation into the pickled type registry."""
+    with open(CHAR_OUT_FILE, "r") as char_fp:
+        char_types = json.load(char_fp)
+    with open(SERVICE_OUT_FILE, "r") as services_fp:
+        serv_types = json.load(services_fp)
+    registry = compile_registry(char_types, serv_types)
+    with open(REGISTRY_OUT_FILE, "wb") as registry_fp:
+        # Protocol 4 is the newest one all supported Python versions can read.
+        pickle.dump(registry, registry_fp, protocol=4)
+
+
+def write_json():
     """Reads the HomeKit Simulator types and creates a HAP-python json representation."""
     with open(HOMEKIT_TYPES_PLIST, "rb") as types_plist_fp:
         type_info = plistlib.load(types_plist_fp)
@@ -120,5 +144,16 @@ def main():
         json.dump(list2dict(service_info), services_fp, indent=3, sort_keys=True)
 
 
+def main():
+    """Create the json representation, unless asked not to, and the registry."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--registry", action="store_true",
+                        help="only rebuild the registry from the json files")
+    args = parser.parse_args()
+    if not args.registry:
+        write_json()
+    write_registry()
+
+
 if __name__ == "__main__":
     main()
@@ -1,3 +1,5 @@
+import contextlib
+
 import pytest
 
 from pyhap.loader import Loader
@@ -13,5 +15,9 @@ class MockDriver():
     def __init__(self):
         self.loader = Loader()
 
-    def publish(self, data):
+    def publish(self, data, sender_client_addr=None):
         pass
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield
@@ -33,6 +33,47 @@ def test_acc_set_services_compatible(mock_driver):
     assert acc.get_service('TemperatureSensor') is not None
 
 
+def test_acc_get_service(mock_driver):
+    acc = Accessory(mock_driver, 'Test Accessory')
+    service = acc.add_preload_service('TemperatureSensor')
+    assert acc.get_service('TemperatureSensor') is service
+    assert acc.get_service_by_type(service.type_id) is service
+    acc.services = acc.services[:1]
+    assert acc.get_service('TemperatureSensor') is None
+    assert acc.get_service_by_type(service.type_id) is None
+
+
+def test_acc_id_key(mock_driver):
+    acc = Accessory(mock_driver, 'Test Accessory')
+    assert acc.id_key == 'name:Test Accessory'
+    acc.set_info_service(serial_number='1234')
+    assert acc.id_key == 'serial:1234'
+
+
+def test_acc_allocate_ids(mock_driver):
+    """Test that IIDs do not depend on the order services are added in."""
+    def build(*services):
+        acc = Accessory(mock_driver, 'Test Accessory', aid=STANDALONE_AID)
+        for name in services:
+            acc.add_preload_service(name)
+        return acc
+
+    allocations = {}
+    acc = build('TemperatureSensor', 'Lightbulb')
+    acc.allocate_ids(allocations)
+    light = acc.get_service('Lightbulb')
+    iids = {key: acc.iid_manager.get_iid(obj) for key, obj in acc.get_id_keys()}
+
+    acc = build('Switch', 'Lightbulb', 'TemperatureSensor')
+    acc.allocate_ids(allocations)
+    restored = {key: acc.iid_manager.get_iid(obj) for key, obj in acc.get_id_keys()}
+    assert {key: iid for key, iid in restored.items() if key in iids} == iids
+    switch = acc.get_service('Switch')
+    assert acc.iid_manager.get_iid(switch) > max(iids.values())
+    assert acc.get_characteristic(STANDALONE_AID, iids[
+        '{}.0'.format(str(light.type_id).upper())]).display_name == 'Lightbulb'
+
+
 # #### Bridge ############
 # execute with `-k bridge`
 # ########################
@@ -64,3 +105,27 @@ def test_bridge_n_add_accessory_dup_aid(mock_driver):
     bridge.add_accessory(acc_1)
     with pytest.raises(ValueError):
         bridge.add_accessory(acc_2)
+
+
+def test_bridge_allocate_ids(mock_driver):
+    """Test that assigned AIDs are kept when accessories are added in another order."""
+    def build(*names):
+        bridge = Bridge(mock_driver, 'Test Bridge')
+        bridge.add_accessory(Accessory(mock_driver, 'Fixed', aid=3))
+        for name in names:
+            bridge.add_accessory(Accessory(mock_driver, name))
+        return bridge
+
+    allocations = {}
+    bridge = build('A', 'B', 'C')
+    bridge.allocate_ids(allocations)
+    aids = {acc.display_name: aid for aid, acc in bridge.accessories.items()}
+    assert aids == {'Fixed': 3, 'A': 2, 'B': 4, 'C': 5}
+
+    bridge = build('C', 'D', 'A')
+    bridge.allocate_ids(allocations)
+    new_aids = {acc.display_name: aid for aid, acc in bridge.accessories.items()}
+    # B was removed, its AID is not reused.
+    assert new_aids == {'Fixed': 3, 'A': 2, 'C': 5, 'D': 6}
+    assert bridge.get_characteristic(6, 1) is \
+        bridge.accessories[6].get_service('AccessoryInformation')
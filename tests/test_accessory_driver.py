@@ -1,10 +1,14 @@
 """Tests for pyhap.accessory_driver."""
+import json
+import os
 import tempfile
+import uuid
 from unittest.mock import patch
 
 import pytest
 
-from pyhap.accessory import Accessory, STANDALONE_AID
+from pyhap import crypto
+from pyhap.accessory import Accessory, Bridge, STANDALONE_AID
 from pyhap.accessory_driver import AccessoryDriver
 
 
@@ -12,7 +16,8 @@ from pyhap.accessory_driver import AccessoryDriver
 def driver():
     with patch('pyhap.accessory_driver.HAPServer'), \
         patch('pyhap.accessory_driver.Zeroconf'), \
-            patch('pyhap.accessory_driver.AccessoryDriver.persist'):
+            patch('pyhap.accessory_driver.AccessoryDriver.persist'), \
+            patch('pyhap.accessory_driver.AccessoryDriver._write_state'):
         yield AccessoryDriver()
 
 
@@ -43,6 +48,254 @@ def test_persist_load():
     assert driver.state.public_key == pk
 
 
+def test_subscribe_sets_has_subscribers(driver):
+    """Test that characteristics know whether anyone is subscribed to them."""
+    acc = Accessory(driver, 'Test Accessory')
+    driver.add_accessory(acc)
+    char = acc.get_service('AccessoryInformation').get_characteristic('Name')
+    topic = '{}.{}'.format(acc.aid, acc.iid_manager.get_iid(char))
+    assert char.has_subscribers is False
+
+    driver.subscribe_client_topic(('10.0.0.1', 1234), topic)
+    driver.subscribe_client_topic(('10.0.0.2', 1234), topic)
+    assert char.has_subscribers is True
+    driver.subscribe_client_topic(('10.0.0.1', 1234), topic, False)
+    assert char.has_subscribers is True
+    driver.subscribe_client_topic(('10.0.0.2', 1234), topic, False)
+    assert char.has_subscribers is False
+
+
+def test_publish_echo_suppression(driver):
+    """Test that the client that wrote a value doesn't get it back."""
+    acc = Accessory(driver, 'Test Accessory')
+    driver.add_accessory(acc)
+    char = acc.get_service('AccessoryInformation').get_characteristic('Name')
+    iid = acc.iid_manager.get_iid(char)
+    topic = '{}.{}'.format(acc.aid, iid)
+    writer, other = ('10.0.0.1', 1234), ('10.0.0.2', 1234)
+
+    driver.subscribe_client_topic(writer, topic)
+    driver.set_characteristics({'characteristics': [
+        {'aid': acc.aid, 'iid': iid, 'value': 'New name'}]}, writer)
+    assert char.value == 'New name'
+    assert driver.event_queue.empty()
+
+    driver.subscribe_client_topic(other, topic)
+    driver.set_characteristics({'characteristics': [
+        {'aid': acc.aid, 'iid': iid, 'value': 'Newer name'}]}, writer)
+    topics, _bytedata, sender_client_addr, client_addr = \
+        driver.event_queue.get_nowait()
+    assert topics == (topic,)
+    assert sender_client_addr == writer
+    assert client_addr is None
+
+
+def test_batch(driver):
+    """Test that batched changes are sent as one event per client."""
+    acc = Accessory(driver, 'Test Accessory')
+    temp = acc.add_preload_service('TemperatureSensor') \
+        .get_characteristic('CurrentTemperature')
+    humidity = acc.add_preload_service('HumiditySensor') \
+        .get_characteristic('CurrentRelativeHumidity')
+    driver.add_accessory(acc)
+    topics = ['{}.{}'.format(acc.aid, acc.iid_manager.get_iid(char))
+              for char in (temp, humidity)]
+    client, other = ('10.0.0.1', 1234), ('10.0.0.2', 1234)
+    for topic in topics:
+        driver.subscribe_client_topic(client, topic)
+    driver.subscribe_client_topic(other, topics[1])
+
+    with driver.batch():
+        temp.set_value(20)
+        with driver.batch():
+            humidity.set_value(35)
+        temp.set_value(21)
+        assert driver.event_queue.empty()
+
+    events = {}
+    while not driver.event_queue.empty():
+        event_topics, bytedata, _sender, client_addr = driver.event_queue.get_nowait()
+        events[client_addr] = (event_topics, json.loads(bytedata.decode()))
+    # In the order of the last change.
+    assert events[client][0] == (topics[1], topics[0])
+    assert [c['value'] for c in events[client][1]['characteristics']] == [35, 21]
+    assert events[other][0] == (topics[1],)
+
+
+def test_set_values(driver):
+    """Test that values are validated before any is set."""
+    acc = Accessory(driver, 'Test Accessory')
+    acc.add_preload_service('TemperatureSensor')
+    acc.add_preload_service('HumiditySensor')
+    driver.add_accessory(acc)
+
+    with patch.object(driver, 'batch', wraps=driver.batch) as mock_batch:
+        acc.set_values({'TemperatureSensor': {'CurrentTemperature': 21.5},
+                        'HumiditySensor': {'CurrentRelativeHumidity': 40}})
+    assert mock_batch.call_count == 1
+    temp = acc.get_service('TemperatureSensor').get_characteristic('CurrentTemperature')
+    assert temp.value == 21.5
+
+    with pytest.raises(ValueError):
+        acc.set_values({'TemperatureSensor': {'CurrentTemperature': 25},
+                        'HumiditySensor': {'CurrentRelativeHumidity': 'wet'}})
+    assert temp.value == 21.5
+    with pytest.raises(ValueError):
+        acc.set_values({'Lightbulb': {'On': True}})
+
+
+def test_persist_load_id_allocations():
+    """Test that AIDs survive a restart with accessories added in another order."""
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            patch('pyhap.accessory_driver.HAPServer'), \
+            patch('pyhap.accessory_driver.Zeroconf'):
+        aids = []
+        for names in (('A', 'B'), ('B', 'A')):
+            driver = AccessoryDriver(persist_file=tmpdir + '/accessory.state')
+            bridge = Bridge(driver, 'Bridge')
+            for name in names:
+                bridge.add_accessory(Accessory(driver, name))
+            driver.add_accessory(bridge)
+            aids.append({acc.display_name: acc.aid
+                         for acc in bridge.accessories.values()})
+    assert aids[0] == aids[1]
+
+
+def test_persist_atomic():
+    """Test that a failed write leaves the previous state and no temporary file."""
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            patch('pyhap.accessory_driver.HAPServer'), \
+            patch('pyhap.accessory_driver.Zeroconf'):
+        driver = AccessoryDriver(persist_file=tmpdir + '/accessory.state')
+        driver.persist()
+        with open(tmpdir + '/accessory.state') as fp:
+            saved = fp.read()
+
+        with patch.object(driver.encoder, 'persist', side_effect=ValueError):
+            with pytest.raises(ValueError):
+                driver.persist()
+        with open(tmpdir + '/accessory.state') as fp:
+            assert fp.read() == saved
+        assert os.listdir(tmpdir) == ['accessory.state']
+
+
+def test_schedule_persist_coalesces(driver):
+    """Test that changes scheduled before the write starts are written once."""
+    with patch.object(driver.loop, 'is_running', return_value=True), \
+            patch.object(driver, 'add_job') as add_job, \
+            patch.object(driver, '_write_state') as write_state:
+        driver.schedule_persist()
+        driver.state.config_version += 1
+        driver.schedule_persist()
+        assert add_job.call_count == 1
+
+        add_job.call_args[0][0]()
+        assert write_state.call_count == 1
+        # The state of the last call is written.
+        data = json.loads(write_state.call_args[0][0])
+        assert data['config_version'] == driver.state.config_version
+        driver.schedule_persist()
+        assert add_job.call_count == 2
+
+
+def test_schedule_persist_snapshot(driver, caplog):
+    """Test that the state is encoded when scheduled and write errors are logged."""
+    client_public = crypto.generate_keypair()[1].to_bytes()
+    with patch.object(driver.loop, 'is_running', return_value=True), \
+            patch.object(driver, 'add_job') as add_job, \
+            patch.object(driver, '_write_state',
+                         side_effect=RuntimeError('boom')) as write_state:
+        driver.schedule_persist()
+        # Changed by a HAP server thread while the write is pending.
+        driver.state.add_paired_client(uuid.uuid4(), client_public)
+        add_job.call_args[0][0]()
+    assert json.loads(write_state.call_args[0][0])['paired_clients'] == {}
+    assert 'Failed to save the accessory state' in caplog.text
+
+
+def test_config_hash(driver):
+    """Test that the config hash covers the structure but not the values."""
+    acc = Accessory(driver, 'TestAcc')
+    driver.add_accessory(acc)
+    assert driver.update_config_hash() is True
+    version = driver.state.config_version  # The first hash keeps the version.
+    assert driver.update_config_hash() is False
+
+    acc.get_service('AccessoryInformation') \
+        .get_characteristic('Manufacturer').set_value('Other')
+    assert driver.update_config_hash() is False
+    assert driver.state.config_version == version
+
+    acc.add_preload_service('Lightbulb')
+    assert driver.update_config_hash() is True
+    assert driver.state.config_version == version + 1
+
+
+def test_config_changed_not_running(driver):
+    """Test that changes are applied right away if the loop is not running."""
+    acc = Accessory(driver, 'TestAcc')
+    driver.add_accessory(acc)
+    driver.update_config_hash()
+    driver.mdns_service_info = object()
+    version = driver.state.config_version
+
+    driver.config_changed()  # Nothing changed.
+    assert driver.state.config_version == version
+    assert not driver.advertiser.update_service.called
+
+    acc.add_preload_service('Lightbulb')
+    driver.config_changed()
+    assert driver.state.config_version == version + 1
+    assert driver.advertiser.update_service.call_count == 1
+    assert not driver.advertiser.unregister_service.called
+
+
+def test_config_changed_persists_version(tmpdir):
+    """Test that the bumped config version and the new hash are saved."""
+    persist_file = str(tmpdir.join('accessory.state'))
+    with patch('pyhap.accessory_driver.HAPServer'), \
+            patch('pyhap.accessory_driver.Zeroconf'):
+        driver = AccessoryDriver(persist_file=persist_file)
+        acc = Accessory(driver, 'TestAcc')
+        driver.add_accessory(acc)
+        driver.update_config_hash()
+        driver.persist()
+        driver.mdns_service_info = object()
+        version = driver.state.config_version
+
+        acc.add_preload_service('Lightbulb')
+        driver.config_changed()
+    assert driver.state.config_version == version + 1
+    with open(persist_file) as fp:
+        saved = json.load(fp)
+    assert saved['config_version'] == version + 1
+    assert saved['config_hash'] == driver.state.config_hash
+
+
+def test_config_changed_coalesces(driver):
+    """Test that changes within the delay bump the config version once."""
+    acc = Accessory(driver, 'TestAcc')
+    driver.add_accessory(acc)
+    driver.update_config_hash()
+    driver.mdns_service_info = object()
+    version = driver.state.config_version
+    with patch.object(driver.loop, 'is_running', return_value=True), \
+            patch.object(driver.loop, 'call_soon_threadsafe') as call_soon, \
+            patch.object(driver, 'add_job'):
+        for name in ('Lightbulb', 'Switch', 'Fan'):
+            acc.add_preload_service(name)
+            driver.config_changed()
+        driver.pair('client', crypto.generate_keypair()[1].to_bytes())
+        assert call_soon.call_count == 1
+        assert driver.state.config_version == version
+
+        driver._apply_pending_update()
+        assert driver.state.config_version == version + 1
+        assert driver.advertiser.update_service.call_count == 1
+        driver._apply_pending_update()
+        assert driver.advertiser.update_service.call_count == 1
+
+
 def test_start_stop_sync_acc(driver):
     class Acc(Accessory):
         running = True
@@ -75,3 +328,21 @@ def test_start_stop_async_acc(driver):
     driver.add_accessory(acc)
     driver.start()
     assert driver.loop.is_closed()
+
+
+def test_setup_srp_verifier(driver):
+    """Test that the SRP verifier is precomputed and the password verifier reused."""
+    assert driver.srp_verifier_future is None
+    driver.precompute_srp_verifier()
+    future = driver.srp_verifier_future
+    assert future is not None
+
+    driver.setup_srp_verifier()
+    assert driver.srp_verifier is future.result()
+    assert driver.srp_verifier_future is not future
+
+    first = driver.srp_verifier
+    driver.setup_srp_verifier()
+    assert driver.srp_verifier.get_challenge()[0] == first.get_challenge()[0]
+    assert driver.srp_verifier.get_challenge()[1] != first.get_challenge()[1]
+    driver.srp_verifier_future.result()
@@ -1,4 +1,5 @@
 """Tests for pyhap.characteristic."""
+import pickle
 from unittest.mock import Mock, patch, ANY
 from uuid import uuid1
 
@@ -27,8 +28,7 @@ def get_char(props, valid=None, min_value=None, max_value=None):
 
 def test_repr():
     """Test representation of a characteristic."""
-    char = get_char(PROPERTIES.copy())
-    del char.properties['Permissions']
+    char = get_char({'Format': HAP_FORMAT_INT})
     assert char.__repr__() == \
         '<characteristic display_name=Test Char value=0 ' \
         'properties={\'Format\': \'int\'}>'
@@ -58,7 +58,7 @@ def test_to_valid_value():
         char.to_valid_value(1)
     assert char.to_valid_value(2) == 2
 
-    del char.properties['ValidValues']
+    char.override_properties({'ValidValues': None})
     for value in ('2', None):
         with pytest.raises(ValueError):
             char.to_valid_value(value)
@@ -66,17 +66,37 @@ def test_to_valid_value():
     assert char.to_valid_value(5) == 5
     assert char.to_valid_value(8) == 7
 
-    char.properties['Format'] = 'string'
+    char.override_properties({'Format': 'string'})
     assert char.to_valid_value(24) == '24'
 
-    char.properties['Format'] = 'bool'
+    char.override_properties({'Format': 'bool'})
     assert char.to_valid_value(1) is True
     assert char.to_valid_value(0) is False
 
-    char.properties['Format'] = 'dictionary'
+    char.override_properties({'Format': 'dictionary'})
     assert char.to_valid_value({'a': 1}) == {'a': 1}
 
 
+def test_validator_compiled_once():
+    """Test that the validator is shared and rebuilt on override."""
+    char = get_char(PROPERTIES.copy(), min_value=2, max_value=7)
+    other = get_char(PROPERTIES.copy(), min_value=2, max_value=7)
+    validator = char.properties.validator
+    assert other.properties.validator is validator
+    assert char.properties.validator is validator
+
+    char.override_properties({'maxValue': 5})
+    assert char.properties.validator is not validator
+    assert char.to_valid_value(8) == 5
+    assert other.to_valid_value(8) == 7
+
+    char.override_properties(valid_values={'foo': 2, 'bar': 3})
+    assert char.to_valid_value(3) == 3
+    for value in (4, [3]):
+        with pytest.raises(ValueError):
+            char.to_valid_value(value)
+
+
 def test_override_properties_properties():
     """Test if overriding the properties works."""
     new_properties = {'minValue': 10, 'maxValue': 20, 'step': 1}
@@ -95,6 +115,23 @@ def test_override_properties_valid_values():
     assert char.properties['ValidValues'] == new_valid_values
 
 
+def test_properties_shared():
+    """Test that equal properties are shared and overrides copy them."""
+    char = get_char(PROPERTIES.copy(), valid={'foo': 1, 'bar': 2})
+    other = get_char(PROPERTIES.copy(), valid={'foo': 1, 'bar': 2})
+    assert char.properties is other.properties
+    assert char.properties['Permissions'] == (HAP_PERMISSION_READ,)
+    with pytest.raises(TypeError):
+        char.properties['Format'] = 'string'
+    with pytest.raises(TypeError):
+        char.properties['ValidValues']['baz'] = 3
+
+    char.override_properties(valid_values={'foo': 1})
+    assert char.properties['ValidValues'] == {'foo': 1}
+    assert other.properties['ValidValues'] == {'foo': 1, 'bar': 2}
+    assert pickle.loads(pickle.dumps(other.properties)) is other.properties
+
+
 def test_override_properties_error():
     """Test that method throws an error if no arguments have been passed."""
     char = get_char(PROPERTIES.copy())
@@ -143,12 +180,21 @@ def test_notify():
     char = get_char(PROPERTIES.copy())
 
     char.value = 2
+    with patch.object(char, 'broker') as mock_broker:
+        char.notify()
+    mock_broker.publish.assert_not_called()
+
+    char.has_subscribers = True
     with pytest.raises(AttributeError):
         char.notify()
 
     with patch.object(char, 'broker') as mock_broker:
         char.notify()
-    mock_broker.publish.assert_called_with(2, char)
+    mock_broker.publish.assert_called_with(2, char, None)
+
+    with patch.object(char, 'broker') as mock_broker:
+        char.notify(('10.0.0.1', 1234))
+    mock_broker.publish.assert_called_with(2, char, ('10.0.0.1', 1234))
 
 
 def test_to_HAP_numberic():
@@ -175,7 +221,7 @@ def test_to_HAP_numberic():
 def test_to_HAP_string():
     """Test created HAP representation for strings."""
     char = get_char(PROPERTIES.copy())
-    char.properties['Format'] = 'string'
+    char.override_properties({'Format': 'string'})
     char.value = 'aaa'
     with patch.object(char, 'broker'):
         hap_repr = char.to_HAP()
@@ -193,12 +239,12 @@ def test_to_HAP_string():
 def test_to_HAP_bool():
     """Test created HAP representation for booleans."""
     char = get_char(PROPERTIES.copy())
-    char.properties['Format'] = 'bool'
+    char.override_properties({'Format': 'bool'})
     with patch.object(char, 'broker'):
         hap_repr = char.to_HAP()
     assert hap_repr['format'] == 'bool'
 
-    char.properties['Permissions'] = []
+    char.override_properties({'Permissions': []})
     with patch.object(char, 'broker'):
         hap_repr = char.to_HAP()
     assert 'value' not in hap_repr
@@ -0,0 +1,83 @@
+"""Tests for pyhap.crypto."""
+import os
+
+import pytest
+
+from pyhap import crypto
+
+PROVIDERS = dict(crypto.PROVIDERS)
+
+
+@pytest.fixture(params=sorted(PROVIDERS))
+def provider(request):
+    default = crypto.get_provider()
+    crypto.set_provider(request.param)
+    yield PROVIDERS[request.param]
+    crypto.set_provider(default.name)
+
+
+def test_set_provider():
+    """Test that unknown providers are rejected."""
+    default = crypto.get_provider()
+    with pytest.raises(ValueError):
+        crypto.set_provider('unknown')
+    assert crypto.get_provider() is default
+
+
+def test_default_provider():
+    """Test that the first installed provider in order of preference is used."""
+    assert crypto.PROVIDERS
+    assert crypto.get_provider() is crypto.PROVIDERS[0][1]
+
+
+def test_incomplete_key_class():
+    """Test that a key class missing a primitive cannot be instantiated."""
+    class IncompleteVerifyingKey(crypto.VerifyingKey):
+
+        def to_bytes(self):
+            return b''
+
+    with pytest.raises(TypeError):
+        IncompleteVerifyingKey(None)
+
+
+def test_sign_verify(provider):
+    """Test signing and verifying with a new key pair."""
+    signing_key, verifying_key = crypto.generate_keypair()
+    signature = signing_key.sign(b'data')
+    assert len(signature) == 64
+    verifying_key.verify(signature, b'data')
+    with pytest.raises(crypto.BadSignatureError):
+        verifying_key.verify(signature, b'other data')
+
+
+def test_restore_keys(provider):
+    """Test that keys are restored from their seed and encoding."""
+    signing_key, verifying_key = crypto.generate_keypair()
+    seed = signing_key.to_seed()
+    assert len(seed) == 32
+    assert crypto.signing_key_from_seed(seed) == signing_key
+    assert crypto.signing_key_from_seed(seed + verifying_key.to_bytes()) == signing_key
+
+    restored = crypto.verifying_key_from_bytes(verifying_key.to_bytes())
+    assert restored == verifying_key
+    restored.verify(signing_key.sign(b'data'), b'data')
+
+
+@pytest.mark.parametrize('other', sorted(PROVIDERS))
+def test_providers_compatible(provider, other):
+    """Test that keys and signatures are interchangeable between providers."""
+    seed = os.urandom(32)
+    signing_key = provider.signing_key_from_seed(seed)
+    other_signing_key = PROVIDERS[other].signing_key_from_seed(seed)
+    assert signing_key.get_verifying_key().to_bytes() == \
+        other_signing_key.get_verifying_key().to_bytes()
+    other_verifying_key = PROVIDERS[other].verifying_key_from_bytes(
+        signing_key.get_verifying_key().to_bytes())
+    other_verifying_key.verify(signing_key.sign(b'data'), b'data')
+
+    session_key = provider.generate_session_key()
+    other_session_key = PROVIDERS[other].generate_session_key()
+    shared_key = session_key.exchange(other_session_key.public_bytes())
+    assert len(shared_key) == 32
+    assert shared_key == other_session_key.exchange(session_key.public_bytes())
@@ -17,6 +17,8 @@ def test_persist_and_load():
     _pk, sample_client_pk = ed25519.create_keypair()
     state = State(mac=mac)
     state.add_paired_client(uuid.uuid1(), sample_client_pk.to_bytes())
+    state.id_allocations = {'aids': {'name:Lamp': 2}, 'iids': {'2': {'key': 9}}}
+    state.config_hash = 'abc'
 
     config_loaded = State()
     config_loaded.config_version += 2  # change the default state.
@@ -31,3 +33,8 @@ def test_persist_and_load():
     assert state.public_key == config_loaded.public_key
     assert state.config_version == config_loaded.config_version
     assert state.paired_clients == config_loaded.paired_clients
+    assert state.id_allocations == config_loaded.id_allocations
+    assert config_loaded.config_hash == 'abc'
+    for client_uuid, client_public in state.paired_clients.items():
+        assert config_loaded.paired_client_keys[client_uuid].to_bytes() == \
+            client_public
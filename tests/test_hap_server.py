@@ -0,0 +1,225 @@
+"""Tests for pyhap.hap_server."""
+import os
+import threading
+import time
+import uuid
+from unittest.mock import Mock, patch
+
+from tlslite.utils.chacha20_poly1305 import CHACHA20_POLY1305
+
+import pyhap.tlv as tlv
+from pyhap.hap_server import (
+    HAP_OPERATION_CODE, HAP_PAIR_METHOD, HAP_PERMISSIONS, HAP_TLV_TAGS,
+    EphemeralKeyPool, HAPServerHandler, PairVerifySessionCache, hap_hkdf)
+
+
+def get_handler(paired_clients):
+    """Return a HAPServerHandler that is not bound to a socket."""
+    handler = HAPServerHandler.__new__(HAPServerHandler)
+    handler.state = Mock(paired_clients=paired_clients)
+    handler.server = Mock(session_cache=PairVerifySessionCache())
+    handler.client_address = ('127.0.0.1', 12345)
+    handler.enc_context = None
+    handler.send_response = Mock()
+    handler.send_header = Mock()
+    handler.end_response = Mock()
+    return handler
+
+
+def get_resume_request(shared_key, session_id, client_public):
+    """Return the TLV objects of a pair resume request."""
+    request_key = hap_hkdf(shared_key, client_public + session_id,
+                           HAPServerHandler.PRESUME_REQUEST_INFO)
+    auth_tag = bytes(CHACHA20_POLY1305(request_key, 'python').seal(
+        HAPServerHandler.PRESUME_REQUEST_NONCE, bytearray(), b''))
+    return {
+        HAP_TLV_TAGS.SEQUENCE_NUM: b'\x01',
+        HAP_TLV_TAGS.REQUEST_TYPE: HAP_PAIR_METHOD.PAIR_RESUME,
+        HAP_TLV_TAGS.PUBLIC_KEY: client_public,
+        HAP_TLV_TAGS.SESSION_ID: session_id,
+        HAP_TLV_TAGS.ENCRYPTED_DATA: auth_tag,
+    }
+
+
+def test_session_cache_pop_once():
+    """Test that a session can be resumed only once."""
+    cache = PairVerifySessionCache()
+    client_uuid = uuid.uuid1()
+    cache.add(b'12345678', client_uuid, b'shared')
+    assert len(cache) == 1
+    assert cache.pop(b'12345678') == (client_uuid, b'shared')
+    assert cache.pop(b'12345678') is None
+    assert cache.pop(b'unknown') is None
+
+
+def test_session_cache_bounded():
+    """Test that the oldest sessions are evicted when the cache is full."""
+    cache = PairVerifySessionCache(max_sessions=2)
+    for i in range(3):
+        cache.add(bytes([i]), uuid.uuid1(), b'shared')
+    assert len(cache) == 2
+    assert cache.pop(bytes([0])) is None
+    assert cache.pop(bytes([2])) is not None
+
+
+def test_session_cache_ttl():
+    """Test that expired sessions can not be resumed and are evicted."""
+    cache = PairVerifySessionCache(ttl=10)
+    with patch('pyhap.hap_server.time.monotonic', return_value=100):
+        cache.add(b'old', uuid.uuid1(), b'shared')
+    with patch('pyhap.hap_server.time.monotonic', return_value=111):
+        cache.add(b'new', uuid.uuid1(), b'shared')
+        assert len(cache) == 1
+        assert cache.pop(b'new') is not None
+    with patch('pyhap.hap_server.time.monotonic', return_value=100):
+        cache.add(b'old', uuid.uuid1(), b'shared')
+    with patch('pyhap.hap_server.time.monotonic', return_value=111):
+        assert cache.pop(b'old') is None
+
+
+def test_session_cache_remove_client():
+    """Test that all sessions of an unpaired client are removed."""
+    cache = PairVerifySessionCache()
+    client_uuid, other_uuid = uuid.uuid1(), uuid.uuid1()
+    cache.add(b'1', client_uuid, b'shared')
+    cache.add(b'2', other_uuid, b'shared')
+    cache.add(b'3', client_uuid, b'shared')
+    cache.remove_client(client_uuid)
+    assert len(cache) == 1
+    assert cache.pop(b'2') == (other_uuid, b'shared')
+
+
+def test_session_cache_remove():
+    """Test that a session is removed only if it was not used or replaced."""
+    cache = PairVerifySessionCache()
+    client_uuid = uuid.uuid1()
+    cache.add(b'1', client_uuid, b'shared')
+    session = cache.get(b'1')
+    assert session == (client_uuid, b'shared')
+    assert cache.get(b'1') == session
+    cache.add(b'1', client_uuid, b'other')
+    assert not cache.remove(b'1', session)
+    session = cache.get(b'1')
+    assert cache.remove(b'1', session)
+    assert not cache.remove(b'1', session)
+    assert cache.get(b'1') is None
+
+
+def test_pair_resume():
+    """Test that a cached session is resumed and replaced with a new one."""
+    client_uuid = uuid.uuid1()
+    shared_key, session_id, client_public = os.urandom(32), b'12345678', os.urandom(32)
+    handler = get_handler({client_uuid: b'public'})
+    handler.server.session_cache.add(session_id, client_uuid, shared_key)
+
+    with patch.object(handler, '_upgrade_to_encrypted') as mock_upgrade:
+        assert handler._pair_resume(
+            get_resume_request(shared_key, session_id, client_public))
+    assert mock_upgrade.called
+
+    response = tlv.decode(handler.end_response.call_args[0][0])
+    assert response[HAP_TLV_TAGS.SEQUENCE_NUM] == b'\x02'
+    new_session_id = response[HAP_TLV_TAGS.SESSION_ID]
+    assert new_session_id != session_id
+
+    salt = client_public + new_session_id
+    response_key = hap_hkdf(shared_key, salt, HAPServerHandler.PRESUME_RESPONSE_INFO)
+    assert CHACHA20_POLY1305(response_key, 'python').open(
+        HAPServerHandler.PRESUME_RESPONSE_NONCE,
+        bytearray(response[HAP_TLV_TAGS.ENCRYPTED_DATA]), b'') is not None
+
+    new_shared_key = hap_hkdf(shared_key, salt,
+                              HAPServerHandler.PRESUME_SHARED_SECRET_INFO)
+    assert handler.server.session_cache.pop(session_id) is None
+    assert handler.server.session_cache.pop(new_session_id) == \
+        (client_uuid, new_shared_key)
+
+
+def test_pair_resume_fallback():
+    """Test that unknown sessions and bad proofs fall back to pair verify."""
+    client_uuid = uuid.uuid1()
+    shared_key, session_id, client_public = os.urandom(32), b'12345678', os.urandom(32)
+    handler = get_handler({client_uuid: b'public'})
+    request = get_resume_request(shared_key, session_id, client_public)
+    assert not handler._pair_resume(request)
+
+    handler.server.session_cache.add(session_id, client_uuid, os.urandom(32))
+    assert not handler._pair_resume(request)
+    # A forged proof does not use up the session.
+    assert handler.server.session_cache.get(session_id) is not None
+
+    handler.server.session_cache.add(session_id, uuid.uuid1(), shared_key)
+    assert not handler._pair_resume(request)
+    assert not handler.send_response.called
+
+
+def test_pair_resume_without_public_key():
+    """Test that a resume request without a public key is answered with an error."""
+    handler = get_handler({})
+    request = get_resume_request(os.urandom(32), b'12345678', os.urandom(32))
+    del request[HAP_TLV_TAGS.PUBLIC_KEY]
+    assert handler._pair_resume(request)
+    response = tlv.decode(handler.end_response.call_args[0][0])
+    assert response[HAP_TLV_TAGS.ERROR_CODE] == HAP_OPERATION_CODE.INVALID_REQUEST
+
+
+def test_key_pool_inline_when_empty():
+    """Test that a key pair is generated inline when the pool is empty."""
+    keygen = Mock(side_effect=range(10))
+    pool = EphemeralKeyPool(size=2, keygen=keygen)
+    assert len(pool) == 0
+    assert pool.get() == 0
+    assert keygen.call_count == 1
+
+
+def test_key_pool_refill():
+    """Test that the pool is filled in the background and keys are used once."""
+    pool = EphemeralKeyPool(size=3, keygen=Mock(side_effect=range(100)))
+    pool.start()
+    try:
+        for _ in range(100):
+            if len(pool) == 3:
+                break
+            time.sleep(0.01)
+        assert len(pool) == 3
+        assert [pool.get(), pool.get()] == [0, 1]
+    finally:
+        pool.stop()
+    assert len(pool) <= 3
+
+
+def test_list_pairings():
+    """Test that every pairing is listed as a separate record."""
+    clients = {uuid.uuid1(): os.urandom(32), uuid.uuid1(): os.urandom(32)}
+    handler = get_handler(clients)
+    handler._handle_list_pairings()
+
+    handler.send_response.assert_called_once_with(200)
+    records = tlv.decode_list(handler.end_response.call_args[0][0])
+    assert records[0][HAP_TLV_TAGS.SEQUENCE_NUM] == b'\x02'
+    assert {uuid.UUID(r[HAP_TLV_TAGS.USERNAME].decode()):
+            r[HAP_TLV_TAGS.PUBLIC_KEY] for r in records} == clients
+    assert all(r[HAP_TLV_TAGS.PERMISSIONS] == HAP_PERMISSIONS.ADMIN for r in records)
+
+
+def test_list_pairings_empty():
+    """Test the response when there are no pairings."""
+    handler = get_handler({})
+    handler._handle_list_pairings()
+    assert tlv.decode_list(handler.end_response.call_args[0][0]) == \
+        [{HAP_TLV_TAGS.SEQUENCE_NUM: b'\x02'}]
+
+
+def test_key_pool_restart():
+    """Test that stop waits for the refill thread, so a restart runs only one."""
+    pool = EphemeralKeyPool(size=3, keygen=Mock(side_effect=range(100)))
+    pool.start()
+    thread = pool._thread
+    pool.stop()
+    assert not thread.is_alive()
+    pool.start()
+    try:
+        assert pool._thread is not thread
+        assert sum(t.name == 'EphemeralKeyPool' for t in threading.enumerate()) == 1
+    finally:
+        pool.stop()
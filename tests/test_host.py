@@ -0,0 +1,137 @@
+"""Tests for pyhap.host."""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from pyhap.accessory import Accessory
+from pyhap.accessory_driver import AccessoryDriver
+from pyhap.host import BRIDGED_PER_BRIDGE, DriverHost, partition_keys
+
+
+@pytest.fixture
+def host():
+    with patch('pyhap.accessory_driver.HAPServer'), \
+            patch('pyhap.host.Zeroconf'), \
+            patch('pyhap.accessory_driver.Zeroconf') as driver_zeroconf, \
+            patch('pyhap.accessory_driver.AccessoryDriver.persist'), \
+            patch('pyhap.accessory_driver.AccessoryDriver._write_state'):
+        yield DriverHost()
+    assert not driver_zeroconf.called
+
+
+class Acc(Accessory):
+
+    def setup_message(self):
+        pass
+
+
+def test_shared_resources(host):
+    """Test that drivers share the loop, executor, loader and advertiser."""
+    drivers = [host.add_driver(port=51830 + i, persist_file='bridge{}.state'.format(i))
+               for i in range(3)]
+    for driver in drivers:
+        assert isinstance(driver, AccessoryDriver)
+        assert driver.host is host
+        assert driver.loop is host.loop
+        assert driver.executer is host.executer
+        assert driver.loader is host.loader
+        assert driver.advertiser is host.advertiser
+    assert [d.state.port for d in drivers] == [51830, 51831, 51832]
+
+
+def test_start_stop(host):
+    """Test that all drivers are started and stopped with one advertiser."""
+    drivers = [host.add_driver(port=51830 + i) for i in range(2)]
+    for i, driver in enumerate(drivers):
+        driver.add_accessory(Acc(driver, 'Acc {}'.format(i)))
+
+    class StoppingAcc(Acc):
+
+        @Accessory.run_at_interval(0)
+        async def run(self):
+            if host.advertiser.register_service.call_count == 2:
+                host.stop()
+
+    drivers[0].accessory.run = StoppingAcc.run.__get__(drivers[0].accessory)
+    host.start()
+
+    assert host.loop.is_closed()
+    assert host.advertiser.register_service.call_count == 2
+    assert host.advertiser.unregister_service.call_count == 2
+    assert host.advertiser.close.call_count == 1
+    assert all(driver.stop_event.is_set() for driver in drivers)
+
+
+def test_partition_keys():
+    """Test that keys use the fewest partitions and keep their previous one."""
+    assert partition_keys([], {}) == [[]]
+    assert partition_keys(['c', 'a', 'b'], {}, capacity=2) == [['a', 'b'], ['c']]
+    assert partition_keys(['c', 'a', 'b', 'd'], {'c': 0, 'a': 1}, capacity=2) == \
+        [['b', 'c'], ['a', 'd']]
+    # Partition 2 is no longer needed, its keys fill the gaps.
+    assert partition_keys(['a', 'b', 'e'], {'a': 0, 'b': 1, 'e': 2}, capacity=2) == \
+        [['a', 'e'], ['b']]
+    # A full previous partition does not take more keys.
+    assert partition_keys(['a', 'b', 'c'], {'a': 0, 'b': 0, 'c': 0}, capacity=2) == \
+        [['a', 'b'], ['c']]
+
+
+def test_add_bridges(tmpdir, caplog):
+    """Test that accessories are split across bridges and keep them on restart."""
+    def make_host():
+        return DriverHost(advertiser=Mock())
+
+    def add_bridges(host, names):
+        accessories = [Acc(host, name) for name in names]
+        bridges = host.add_bridges(
+            accessories, persist_file=str(tmpdir.join('bridge{}.state')))
+        return {acc.display_name: (bridges.index(bridge), aid)
+                for bridge in bridges for aid, acc in bridge.accessories.items()}
+
+    names = ['Light {}'.format(i) for i in range(BRIDGED_PER_BRIDGE + 10)]
+    with patch('pyhap.accessory_driver.HAPServer'):
+        host = make_host()
+        first = add_bridges(host, names)
+        assert [d.state.port for d in host.drivers] == [51830, 51831]
+        assert [len(d.accessory.accessories) for d in host.drivers] == \
+            [BRIDGED_PER_BRIDGE, 10]
+        assert all(acc.driver is driver for driver in host.drivers
+                   for acc in driver.accessory.accessories.values())
+
+        # Removed and new accessories do not move the others.
+        names = names[1:] + ['Light A']
+        second = add_bridges(make_host(), names)
+        assert all(second[name] == first[name] for name in names[:-1])
+        assert second['Light A'][0] == 0
+
+        # The accessories of a dropped bridge move to the remaining one.
+        caplog.clear()
+        names = names[10:-1]
+        third = add_bridges(make_host(), names)
+        assert {index for index, _ in third.values()} == {0}
+        assert all(third[name] == first[name] for name in names
+                   if first[name][0] == 0)
+        assert 'Moved 10 accessories' in caplog.text
+
+        with pytest.raises(ValueError):
+            add_bridges(make_host(), ['Light 1', 'Light 1'])
+
+
+def test_add_bridges_home_path(tmpdir, monkeypatch, caplog):
+    """Test that the state files of dropped bridges are found under a ``~`` path."""
+    monkeypatch.setenv('HOME', str(tmpdir))
+
+    def add_bridges(names):
+        host = DriverHost(advertiser=Mock())
+        bridges = host.add_bridges([Acc(host, name) for name in names],
+                                   persist_file='~/bridge{}.state')
+        return {acc.display_name: bridges.index(bridge)
+                for bridge in bridges for acc in bridge.accessories.values()}
+
+    names = ['Light {}'.format(i) for i in range(BRIDGED_PER_BRIDGE + 1)]
+    with patch('pyhap.accessory_driver.HAPServer'):
+        first = add_bridges(names)
+        assert tmpdir.join('bridge1.state').check()
+        names.remove(next(name for name in names if first[name] == 0))
+        assert set(add_bridges(names).values()) == {0}
+    assert 'Moved 1 accessories' in caplog.text
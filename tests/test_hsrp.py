@@ -0,0 +1,111 @@
+"""Tests for pyhap.hsrp."""
+import hashlib
+import os
+
+import pytest
+
+from pyhap import hsrp, util
+from pyhap.params import get_srp_context
+
+USERNAME = b'Pair-Setup'
+PASSWORD = b'123-45-678'
+
+
+def get_ctx():
+    """Return the SRP context used by HAP."""
+    return get_srp_context(3072, hashlib.sha512, 16)
+
+
+def client_proof(ctx, salt, B, password=PASSWORD):
+    """Compute the client's public key and proof of the password.
+
+    :return: ``(A, M, K)``
+    """
+    N, g = ctx['N'], ctx['g']
+    a = hsrp.bytes_to_long(os.urandom(32))
+    A = pow(g, a, N)
+    hf = ctx['hashfunc']()
+    hf.update(hsrp.padN(hsrp.long_to_bytes(A), ctx) +
+              hsrp.padN(hsrp.long_to_bytes(B), ctx))
+    u = int(hf.hexdigest(), 16)
+    x = hsrp.get_x(USERNAME, password, salt, ctx)
+    S = pow(B - hsrp.get_k(ctx) * pow(g, x, N), a + u * x, N)
+    K = hsrp.get_session_key(S, ctx)
+
+    hN = ctx['hashfunc'](hsrp.long_to_bytes(N)).digest()
+    hG = ctx['hashfunc'](hsrp.long_to_bytes(g)).digest()
+    hf = ctx['hashfunc']()
+    hf.update(bytes(n ^ g for n, g in zip(hN, hG)) +
+              ctx['hashfunc'](USERNAME).digest() + salt +
+              hsrp.long_to_bytes(A) + hsrp.long_to_bytes(B) +
+              hsrp.long_to_bytes(K))
+    return A, hf.digest(), K
+
+
+def test_long_to_bytes():
+    """Test that ints are converted to minimal big-endian bytes."""
+    for convert in (hsrp.long_to_bytes, util.long_to_bytes):
+        assert convert(0) == b''
+        assert convert(1) == b'\x01'
+        assert convert(0x1ff) == b'\x01\xff'
+        n = hsrp.bytes_to_long(b'\x7f' + os.urandom(383))
+        assert convert(n) == n.to_bytes(384, byteorder='big')
+
+
+def test_srp_context_cached():
+    """Test that contexts and group constants are computed once."""
+    ctx = get_ctx()
+    assert get_ctx() is ctx
+    assert hsrp.get_group_constants(ctx) is hsrp.get_group_constants(ctx)
+    assert hsrp.get_group_constants(ctx)[0] == hsrp.get_k(ctx)
+
+
+def test_set_backend():
+    """Test selecting the arithmetic backend."""
+    default = hsrp.get_backend()
+    try:
+        hsrp.set_backend('python')
+        assert hsrp.get_backend() is hsrp.PythonBackend
+        with pytest.raises(ValueError):
+            hsrp.set_backend('unknown')
+        assert hsrp.get_backend() is hsrp.PythonBackend
+    finally:
+        hsrp.set_backend(default.name)
+
+
+@pytest.mark.parametrize('backend', sorted(hsrp.BACKENDS))
+def test_verify(backend):
+    """Test a full SRP exchange with a client that knows the password."""
+    ctx = get_ctx()
+    server = hsrp.Server(ctx, USERNAME, PASSWORD, backend=hsrp.BACKENDS[backend])
+    salt, B = server.get_challenge()
+    A, M, K = client_proof(ctx, salt, B)
+
+    server.set_A(hsrp.long_to_bytes(A))
+    assert server.get_session_key() == K
+    assert server.verify(M) is not None
+
+
+def test_verify_reused_verifier():
+    """Test that a server with a precomputed verifier has a new challenge."""
+    ctx = get_ctx()
+    first = hsrp.Server(ctx, USERNAME, PASSWORD)
+    server = hsrp.Server(ctx, USERNAME, PASSWORD, s=first.s, v=first.v)
+    assert server.get_challenge()[0] == first.s
+    assert server.get_challenge()[1] != first.get_challenge()[1]
+
+    salt, B = server.get_challenge()
+    A, M, _K = client_proof(ctx, salt, B)
+    server.set_A(hsrp.long_to_bytes(A))
+    assert server.verify(M) is not None
+
+
+def test_verify_wrong_password():
+    """Test that a client with a wrong password is rejected."""
+    ctx = get_ctx()
+    server = hsrp.Server(ctx, USERNAME, PASSWORD)
+    salt, B = server.get_challenge()
+    A, M, _K = client_proof(ctx, salt, B, password=b'000-00-000')
+
+    server.set_A(hsrp.long_to_bytes(A))
+    assert server.verify(M) is None
@@ -0,0 +1,146 @@
+"""Tests for accessories.Http."""
+import asyncio
+import json
+
+import pytest
+
+from accessories.Http import HttpBridge
+from pyhap.accessory import Accessory
+
+
+@pytest.fixture
+def bridge(mock_driver):
+    bridge = HttpBridge(('127.0.0.1', 0), mock_driver, 'Http Bridge')
+    for aid in (2, 3):
+        acc = Accessory(mock_driver, 'Sensor {}'.format(aid), aid=aid)
+        acc.add_preload_service('TemperatureSensor')
+        bridge.add_accessory(acc)
+    return bridge
+
+
+def get_temperature(bridge, aid):
+    return bridge.accessories[aid].get_service('TemperatureSensor') \
+        .get_characteristic('CurrentTemperature').value
+
+
+def run_requests(bridge, requests):
+    """Send the raw requests over one connection and return the raw responses."""
+    async def _run():
+        await bridge.async_start_server()
+        port = bridge.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        responses = []
+        for request in requests:
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+            responses.append((head, await reader.readexactly(length)))
+        writer.close()
+        await bridge.async_stop_server()
+        return responses
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_run())
+    finally:
+        loop.close()
+
+
+def post(body):
+    return ('POST / HTTP/1.1\r\nContent-Type: application/json\r\n'
+            'Content-Length: {}\r\n\r\n'.format(len(body)).encode() + body)
+
+
+def test_update_state(bridge):
+    """Test the status of single updates."""
+    assert bridge.update_state({
+        'aid': 2, 'services': {'TemperatureSensor': {'CurrentTemperature': 20}}
+    }) == {'aid': 2, 'status': 200}
+    assert get_temperature(bridge, 2) == 20
+    assert bridge.update_state({'aid': 9, 'services': {}})['status'] == 404
+    assert bridge.update_state({'services': {}})['status'] == 400
+    assert bridge.update_state({
+        'aid': 2, 'services': {'TemperatureSensor': {'Unknown': 20}}
+    })['status'] == 400
+    for data in ({'aid': [2], 'services': {}}, {'aid': {}, 'services': {}},
+                 {'aid': True, 'services': {}},
+                 {'aid': 2, 'services': {'TemperatureSensor': [20]}}):
+        assert bridge.update_state(data)['status'] == 400
+
+
+def test_keep_alive_and_array(bridge):
+    """Test that several requests and an array payload are handled on one connection."""
+    single = json.dumps({
+        'aid': 2, 'services': {'TemperatureSensor': {'CurrentTemperature': 21}}
+    }).encode()
+    array = json.dumps([
+        {'aid': 2, 'services': {'TemperatureSensor': {'CurrentTemperature': 22}}},
+        {'aid': 4, 'services': {}},
+        {'aid': [3], 'services': {}},
+        {'aid': 3, 'services': {'TemperatureSensor': {'CurrentTemperature': 23}}},
+    ]).encode()
+    responses = run_requests(bridge, [post(single), post(array)])
+
+    head, body = responses[0]
+    assert head.startswith(b'HTTP/1.1 200 OK')
+    assert b'Connection: keep-alive' in head
+    assert json.loads(body.decode()) == [{'aid': 2, 'status': 200}]
+
+    statuses = json.loads(responses[1][1].decode())
+    assert [status['status'] for status in statuses] == [200, 404, 400, 200]
+    assert get_temperature(bridge, 2) == 22
+    assert get_temperature(bridge, 3) == 23
+
+
+def test_ndjson_chunked(bridge):
+    """Test NDJSON streamed with chunked transfer encoding."""
+    lines = (json.dumps({'aid': 2, 'services': {
+        'TemperatureSensor': {'CurrentTemperature': 24}}}) + '\n{"aid": 3,').encode()
+    rest = b' "services": {"TemperatureSensor": {"CurrentTemperature": 25}}}\nnot json\n'
+    chunks = b''.join(b'%x\r\n%s\r\n' % (len(chunk), chunk) for chunk in (lines, rest))
+    request = (b'POST / HTTP/1.1\r\nContent-Type: application/x-ndjson\r\n'
+               b'Transfer-Encoding: chunked\r\n\r\n' + chunks + b'0\r\n\r\n')
+    (head, body), = run_requests(bridge, [request])
+
+    assert b'Content-Type: application/x-ndjson' in head
+    statuses = [json.loads(line) for line in body.decode().splitlines()]
+    assert [status['status'] for status in statuses] == [200, 200, 400]
+    assert get_temperature(bridge, 2) == 24
+    assert get_temperature(bridge, 3) == 25
+
+
+def test_bad_request_closes(bridge):
+    """Test that a request that cannot be read is answered with an error."""
+    (head, _), = run_requests(bridge, [post(b'{')])
+    assert head.startswith(b'HTTP/1.1 400')
+    assert b'Connection: close' in head
+
+
+def test_expect_continue(bridge):
+    """Test that the body is requested with 100 Continue."""
+    body = json.dumps({
+        'aid': 2, 'services': {'TemperatureSensor': {'CurrentTemperature': 26}}
+    }).encode()
+
+    async def _run():
+        await bridge.async_start_server()
+        port = bridge.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'POST / HTTP/1.1\r\nContent-Type: application/json\r\n'
+                     b'Expect: 100-continue\r\n'
+                     b'Content-Length: %d\r\n\r\n' % len(body))
+        interim = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 1)
+        writer.write(body)
+        head = await reader.readuntil(b'\r\n\r\n')
+        writer.close()
+        await bridge.async_stop_server()
+        return interim, head
+
+    loop = asyncio.new_event_loop()
+    try:
+        interim, head = loop.run_until_complete(_run())
+    finally:
+        loop.close()
+    assert interim == b'HTTP/1.1 100 Continue\r\n\r\n'
+    assert head.startswith(b'HTTP/1.1 200 OK')
+    assert get_temperature(bridge, 2) == 26
@@ -56,3 +56,21 @@ def test_remove_iid():
     iid_manager, obj_a = get_iid_manager()
     assert iid_manager.remove_iid(0) is None
     assert iid_manager.remove_iid(1) == obj_a
+
+
+def test_restore():
+    """Test that persisted IIDs are restored and new objects are recorded."""
+    iid_manager = IIDManager()
+    obj_a, obj_b, obj_c = Mock(), Mock(), Mock()
+    for obj in (obj_b, obj_a, obj_c):
+        iid_manager.assign(obj)
+    allocations = {'a': 1, 'b': 2, 'removed': 5}
+    iid_manager.restore([('a', obj_a), ('b', obj_b), ('c', obj_c)], allocations)
+    assert iid_manager.iids == {obj_a: 1, obj_b: 2, obj_c: 3}
+    assert allocations == {'a': 1, 'b': 2, 'c': 3, 'removed': 5}
+
+    obj_d = Mock()
+    iid_manager.assign(obj_d)
+    iid_manager.restore([('d', obj_d), ('c', obj_c)], allocations)
+    assert iid_manager.iids == {obj_d: 6, obj_c: 3}
+    assert allocations['d'] == 6
@@ -1,10 +1,12 @@
 """Tests for pyhap.loader."""
+from unittest.mock import patch
+
 import pytest
 
 from pyhap import CHARACTERISTICS_FILE, SERVICES_FILE
 from pyhap.characteristic import Characteristic
 from pyhap.service import Service
-from pyhap.loader import get_loader, Loader
+from pyhap.loader import compile_registry, get_loader, read_registry, Loader
 
 
 def test_loader_char():
@@ -77,3 +79,52 @@ def test_get_loader():
     assert loader.serv_types == loader2.serv_types
 
     assert get_loader() == loader
+
+
+def test_registry_up_to_date():
+    """Test that the shipped registry matches the json files.
+
+    If this fails, run ``scripts/gen_hap_types.py --registry``.
+    """
+    registry = read_registry()
+    assert registry is not None
+    assert registry == compile_registry(
+        Loader._read_file(CHARACTERISTICS_FILE), Loader._read_file(SERVICES_FILE))
+
+
+def test_registry_loader_matches_json():
+    """Test that the registry and the json files create the same objects."""
+    loader = Loader()
+    json_loader = Loader()
+    json_loader._use_registry = False
+    assert loader.char_types == json_loader.char_types
+    assert loader.serv_types == json_loader.serv_types
+
+    loader = Loader()
+    service = loader.get_service('Lightbulb')
+    json_service = json_loader.get_service('Lightbulb')
+    assert loader._char_types is None
+    assert service.type_id == json_service.type_id
+    assert [(c.display_name, c.type_id, c.properties, c.value)
+            for c in service.characteristics] == \
+        [(c.display_name, c.type_id, c.properties, c.value)
+         for c in json_service.characteristics]
+
+
+def test_registry_missing():
+    """Test that the json files are used if the registry can't be read."""
+    with patch('pyhap.loader.read_registry.__defaults__',
+               ('/nonexistent/types.pickle',)):
+        loader = Loader()
+        assert loader.get_char('Name').display_name == 'Name'
+        assert 'Name' in loader.char_types
+
+
+def test_get_char_independent():
+    """Test that characteristics don't share their properties."""
+    loader = Loader()
+    char1 = loader.get_char('Brightness')
+    char2 = loader.get_char('Brightness')
+    char1.override_properties({'maxValue': 10})
+    assert char2.properties['maxValue'] == 100
+    assert loader.get_char('Brightness').properties['maxValue'] == 100
@@ -0,0 +1,162 @@
+"""Tests for accessories.RingBuffer."""
+import asyncio
+import os
+import select
+import stat
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from accessories.RingBuffer import (
+    _HEADER_SIZE, _HEAD_OFFSET, RECORD, RingBuffer, RingBufferBridge, _create)
+from pyhap.accessory import Accessory
+from pyhap.loader import Loader
+
+needs_fifo = pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='Needs FIFOs')
+
+
+def test_write_read_wrap_around(tmpdir):
+    """Test that records written through one mapping are read through another."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, capacity=4) as producer, \
+            RingBuffer.open(path) as consumer:
+        assert consumer.capacity == 4
+        for i in range(3):
+            assert producer.write(2, i, i / 2)
+        assert consumer.read(2) == [(2, 0, 0.), (2, 1, .5)]
+
+        for i in range(3, 6):
+            assert producer.write(2, i, i)
+        assert producer.write(2, 6, 6) is False
+        assert len(consumer) == 4
+        assert consumer.dropped == 1
+        assert [r[1] for r in consumer.read()] == [2, 3, 4, 5]
+        assert consumer.read() == []
+
+
+def test_read_incomplete_record(tmpdir):
+    """Test that a record that is not completely visible is read on a later call."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, capacity=4) as producer, \
+            RingBuffer.open(path) as consumer:
+        producer.write(2, 1, 1.)
+        producer.write(2, 2, 2.)
+        buf = producer._buf
+        offset = _HEADER_SIZE + RECORD.size
+        record = buf[offset:offset + RECORD.size]
+        # The head is visible, but the second record only partly.
+        buf[offset + 16:offset + 24] = b'\xff' * 8
+        assert consumer.read() == [(2, 1, 1.)]
+        assert len(consumer) == 1
+        assert consumer.read() == []
+        buf[offset:offset + RECORD.size] = record
+        assert consumer.read() == [(2, 2, 2.)]
+
+
+def test_torn_counter(tmpdir):
+    """Test that a counter that stays invalid is reported."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, capacity=4) as ring:
+        ring._buf[_HEAD_OFFSET] = 1
+        with pytest.raises(ValueError):
+            ring.read()
+
+
+def test_create_existing(tmpdir):
+    """Test that creating a buffer keeps one that another process created first."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, capacity=4) as producer:
+        producer.write(2, 1, 1.)
+        _create(path, 8, 0o600)
+        with RingBuffer.open(path) as consumer:
+            assert consumer.capacity == 4
+            assert consumer.read() == [(2, 1, 1.)]
+    assert tmpdir.listdir() == [tmpdir.join('ring')]
+
+
+def test_mode(tmpdir):
+    """Test that the buffer is created with the given permissions."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, mode=0o640):
+        pass
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+@needs_fifo
+def test_doorbell(tmpdir):
+    """Test that the producer rings the doorbell only while the consumer waits."""
+    path = str(tmpdir.join('ring'))
+    with RingBuffer.open(path, capacity=4) as producer, \
+            RingBuffer.open(path) as consumer:
+        doorbell = consumer.doorbell()
+        assert stat.S_IMODE(os.stat(path + '.wake').st_mode) == 0o600
+        producer.write(2, 1, 1.)
+        assert select.select([doorbell], [], [], 0)[0] == []
+
+        consumer.set_waiting(True)
+        producer.write(2, 2, 2.)
+        producer.write(2, 3, 3.)
+        assert select.select([doorbell], [], [], 0)[0] == [doorbell]
+        consumer.set_waiting(False)
+        consumer.clear_doorbell()
+        assert select.select([doorbell], [], [], 0)[0] == []
+        assert len(consumer.read()) == 3
+    # Without a consumer, the producer does not fail.
+    with RingBuffer.open(path) as producer:
+        producer._buf[144] = 1
+        assert producer.write(2, 4, 4.)
+
+
+@needs_fifo
+def test_bridge_wakeup(tmpdir):
+    """Test that the bridge is woken up by a record, well before the poll interval."""
+    path = str(tmpdir.join('ring'))
+    loop = asyncio.new_event_loop()
+    bridge = RingBufferBridge(path, Mock(loop=loop, loader=Loader()), 'Ring Bridge',
+                              poll_interval=10)
+    bridge.open_ring()
+    with RingBuffer.open(path) as producer:
+        loop.call_later(0.05, producer.write, 2, 1, 1.)
+        start = time.monotonic()
+        loop.run_until_complete(bridge.wait_for_records())
+        assert time.monotonic() - start < 5
+        assert len(bridge.ring) == 1
+    loop.remove_reader(bridge._doorbell)
+    bridge.ring.close()
+    loop.close()
+
+
+def test_open_invalid(tmpdir):
+    """Test that other files are rejected."""
+    path = tmpdir.join('other')
+    path.write(b'x' * 300)
+    with pytest.raises(ValueError):
+        RingBuffer.open(str(path))
+
+
+def test_bridge_drain(mock_driver, tmpdir):
+    """Test that records are applied by aid and iid, last value wins."""
+    path = str(tmpdir.join('ring'))
+    bridge = RingBufferBridge(path, mock_driver, 'Ring Bridge', batch_size=3)
+    acc = Accessory(mock_driver, 'Sensor', aid=2)
+    acc.add_preload_service('TemperatureSensor')
+    bridge.add_accessory(acc)
+    bridge.build_lookup()
+    char = acc.get_service('TemperatureSensor') \
+        .get_characteristic('CurrentTemperature')
+    iid = acc.iid_manager.get_iid(char)
+
+    with RingBuffer.open(path) as producer:
+        bridge.ring = RingBuffer.open(path)
+        for record in ((2, iid, 20.), (9, 1, 1.), (2, iid, 21.5), (2, iid, 22.)):
+            producer.write(*record)
+        assert bridge.drain() == 3
+        assert char.value == 21.5
+        assert bridge.drain() == 1
+        assert bridge.drain() == 0
+        producer.write(2, iid, float('nan'))
+        assert bridge.drain() == 1
+        bridge.ring.close()
+    assert char.value == 22.
+    assert bridge.stats == {'updates': 2, 'unknown': 1, 'invalid': 1}
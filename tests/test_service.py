@@ -52,6 +52,23 @@ def test_get_characteristic():
         service.get_characteristic('Not found')
 
 
+def test_get_characteristic_by_type():
+    """Test that the indexes follow reassigned characteristics."""
+    service = Service(uuid1(), 'Test Service')
+    chars = get_chars()
+    service.add_characteristic(*chars)
+    assert service.get_characteristic_by_type(chars[1].type_id) == chars[1]
+    assert service.get_characteristic_by_type(uuid1()) is None
+
+    service.characteristics = chars[1:]
+    assert service.get_characteristic_by_type(chars[0].type_id) is None
+    with pytest.raises(ValueError):
+        service.get_characteristic('Char 1')
+    service.add_characteristic(chars[0])
+    assert service.get_characteristic('Char 1') == chars[0]
+    assert service.characteristics == [chars[1], chars[0]]
+
+
 def test_configure_char():
     """Test preconfiguring a characteristic from a service."""
     pyhap_char = 'pyhap.characteristic.Characteristic'
@@ -1,6 +1,7 @@
 """Test for pyhap.state."""
 from unittest.mock import patch
 
+import ed25519
 import pytest
 
 from pyhap.state import State
@@ -20,7 +21,7 @@ def test_setup():
         patch('pyhap.util.generate_mac') as mock_gen_mac, \
         patch('pyhap.util.generate_pincode') as mock_gen_pincode, \
         patch('pyhap.util.generate_setup_id') as mock_gen_setup_id, \
-        patch('ed25519.create_keypair', return_value=(1, 2)) \
+        patch('pyhap.crypto.generate_keypair', return_value=(1, 2)) \
             as mock_create_keypair:
 
         state = State(address=addr, mac=mac, pincode=pin, port=port)
@@ -49,16 +50,60 @@ def test_pairing():
         patch('pyhap.util.generate_mac'), \
         patch('pyhap.util.generate_pincode'), \
         patch('pyhap.util.generate_setup_id'), \
-            patch('ed25519.create_keypair', return_value=(1, 2)):
+            patch('pyhap.crypto.generate_keypair', return_value=(1, 2)):
         state = State()
 
     assert not state.paired
     assert not state.paired_clients
 
-    state.add_paired_client('uuid', 'public')
+    with patch('pyhap.crypto.verifying_key_from_bytes'):
+        state.add_paired_client('uuid', 'public')
     assert state.paired
     assert state.paired_clients == {'uuid': 'public'}
 
     state.remove_paired_client('uuid')
     assert not state.paired
     assert not state.paired_clients
+
+
+def test_client_verifying_key():
+    """Test that verifying keys of paired clients are parsed once and cached."""
+    with patch('pyhap.util.get_local_address'):
+        state = State()
+    _sk, client_vk = ed25519.create_keypair()
+
+    assert state.get_client_verifying_key('uuid') is None
+
+    state.add_paired_client('uuid', client_vk.to_bytes())
+    verifying_key = state.get_client_verifying_key('uuid')
+    assert verifying_key.to_bytes() == client_vk.to_bytes()
+    assert state.get_client_verifying_key('uuid') is verifying_key
+
+    _sk, new_client_vk = ed25519.create_keypair()
+    state.add_paired_client('uuid', new_client_vk.to_bytes())
+    assert state.get_client_verifying_key('uuid').to_bytes() == \
+        new_client_vk.to_bytes()
+
+    state.remove_paired_client('uuid')
+    assert state.get_client_verifying_key('uuid') is None
+    assert not state.paired_client_keys
+
+
+def test_client_verifying_key_stale_cache():
+    """Test that a cached key is not used once its client is removed or re-paired."""
+    with patch('pyhap.util.get_local_address'):
+        state = State()
+    _sk, client_vk = ed25519.create_keypair()
+    state.add_paired_client('uuid', client_vk.to_bytes())
+    stale_key = state.paired_client_keys['uuid']
+
+    # A pair verify that read the key before the removal writes it back afterwards.
+    state.remove_paired_client('uuid')
+    state.paired_client_keys['uuid'] = stale_key
+    assert state.get_client_verifying_key('uuid') is None
+
+    _sk, new_client_vk = ed25519.create_keypair()
+    state.add_paired_client('uuid', new_client_vk.to_bytes())
+    state.paired_client_keys['uuid'] = stale_key
+    assert state.get_client_verifying_key('uuid').to_bytes() == \
+        new_client_vk.to_bytes()
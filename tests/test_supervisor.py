@@ -0,0 +1,153 @@
+"""Tests for pyhap.supervisor."""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+from zeroconf import ServiceInfo
+
+from pyhap.accessory import Accessory
+from pyhap.supervisor import Supervisor, _AdvertiserProxy, _Worker
+
+
+class FakeAdvertiser:
+
+    def __init__(self):
+        self.services = {}
+        self.registrations = 0
+        self.closed = False
+
+    def register_service(self, info):
+        self.services[info.name] = info
+        self.registrations += 1
+
+    def update_service(self, info):
+        self.services[info.name] = info
+
+    def unregister_service(self, info):
+        self.services.pop(info.name, None)
+
+    def close(self):
+        self.closed = True
+
+
+class QuietAccessory(Accessory):
+
+    def setup_message(self):
+        pass
+
+
+def make_accessory(driver):
+    return QuietAccessory(driver, 'Acc {}'.format(driver.state.port))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.05)
+
+
+def test_assign_bridges():
+    """Test that bridges are spread over the workers."""
+    supervisor = Supervisor(workers=2)
+    for port in range(5):
+        supervisor.add_bridge(make_accessory, port=port)
+    assigned = supervisor.assign_bridges()
+    assert [[kwargs['port'] for _, kwargs in bridges] for bridges in assigned] == \
+        [[0, 2, 4], [1, 3]]
+    assert len(Supervisor(workers=4).assign_bridges()) == 0
+
+
+def test_advertiser_proxy_address():
+    """Test that the proxy sends the address of the service info."""
+    channel = Mock()
+    info = ServiceInfo('_hap._tcp.local.', 'Acc._hap._tcp.local.',
+                       socket.inet_aton('10.0.0.2'), 51826, 0, 0, {'md': 'Acc'},
+                       'Acc.local.')
+    _AdvertiserProxy(channel).register_service(info)
+    action, args = channel.send.call_args[0]
+    assert action == 'register'
+    assert args[:4] == ('_hap._tcp.local.', 'Acc._hap._tcp.local.',
+                        socket.inet_aton('10.0.0.2'), 51826)
+
+
+def test_process_bad_messages():
+    """Test that bad messages are discarded and later ones still handled."""
+    supervisor = Supervisor(workers=1, advertiser=FakeAdvertiser())
+    worker = _Worker(0, [])
+    worker.connection, sender = multiprocessing.Pipe(duplex=False)
+    supervisor.workers = [worker]
+    sender.send_bytes(b'not a pickle')
+    sender.send(('register', ('missing', 'fields')))
+    sender.send(('heartbeat', None))
+    supervisor._process_messages(timeout=0.1)
+    assert worker.last_heartbeat is not None
+    assert supervisor.advertiser.services == {}
+
+    sender.close()
+    supervisor._process_messages(timeout=0.1)
+    assert worker.connection is None
+
+
+def test_check_workers_timeouts():
+    """Test that starting workers get the startup timeout, then the health timeout."""
+    supervisor = Supervisor(workers=1, advertiser=FakeAdvertiser(), health_timeout=10,
+                            startup_timeout=60)
+    worker = _Worker(0, [])
+    worker.process = process = Mock()
+    worker.process.is_alive.return_value = True
+    worker.connection, sender = multiprocessing.Pipe(duplex=False)
+    supervisor.workers = [worker]
+    worker.started_at = time.monotonic() - 20
+    supervisor._check_workers()
+    assert not process.kill.called
+
+    worker.last_heartbeat = worker.started_at
+    supervisor._check_workers()
+    assert process.kill.called
+    assert worker.process is None
+    # What the killed process sent is discarded with its pipe.
+    assert worker.connection is None
+    sender.close()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGKILL'), reason='Needs SIGKILL')
+def test_advertise_and_restart(tmpdir, caplog):
+    """Test that workers are advertised centrally and restarted after a crash."""
+    caplog.set_level(logging.INFO)
+    advertiser = FakeAdvertiser()
+    supervisor = Supervisor(workers=2, advertiser=advertiser)
+    for i in range(3):
+        supervisor.add_bridge(make_accessory, address='127.0.0.1', port=free_port(),
+                              persist_file=str(tmpdir.join('bridge{}.state'.format(i))))
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        wait_for(lambda: len(advertiser.services) == 3)
+        assert 'Starting accessory' in caplog.text  # Forwarded from the workers.
+        worker = supervisor.workers[0]
+        pid = worker.process.pid
+        os.kill(pid, signal.SIGKILL)
+        # Worker 0 runs two of the bridges, they are advertised again.
+        wait_for(lambda: advertiser.registrations == 5)
+        assert worker.process.pid != pid
+        assert len(advertiser.services) == 3
+    finally:
+        supervisor.stop()
+        thread.join(60)
+    assert not thread.is_alive()
+    assert advertiser.closed
+    assert advertiser.services == {}
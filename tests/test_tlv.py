@@ -0,0 +1,58 @@
+"""Tests for pyhap.tlv."""
+import os
+
+import pytest
+
+from pyhap import tlv
+
+
+def test_encode_decode():
+    """Test that short values round trip."""
+    data = tlv.encode(b'\x06', b'\x01', b'\x03', b'key', b'\x07', b'')
+    assert data == b'\x06\x01\x01\x03\x03key\x07\x00'
+    assert tlv.decode(data) == {b'\x06': b'\x01', b'\x03': b'key', b'\x07': b''}
+    assert tlv.decode(bytearray(data)) == tlv.decode(data)
+
+
+@pytest.mark.parametrize('length', [254, 255, 256, 510, 511, 1000])
+def test_fragments(length):
+    """Test that long values are split into fragments and joined again."""
+    value = os.urandom(length)
+    data = tlv.encode(b'\x0A', value, b'\x06', b'\x02')
+    fragments = -(-length // 255)
+    assert len(data) == length + 2 * fragments + 3
+    assert data[:2] == b'\x0A' + bytes([min(length, 255)])
+    assert tlv.decode(data) == {b'\x0A': value, b'\x06': b'\x02'}
+
+
+def test_encode_into():
+    """Test appending to an existing buffer."""
+    value = bytearray(os.urandom(300))
+    buffer = bytearray(b'ab')
+    assert tlv.encode_into(buffer, b'\x05', memoryview(value)) is buffer
+    assert buffer == b'ab' + tlv.encode(b'\x05', bytes(value))
+
+
+def test_iter_decode():
+    """Test that items are decoded in order, including separators."""
+    data = tlv.encode(b'\x01', b'a', tlv.SEPARATOR, b'', b'\x01', b'b')
+    assert list(tlv.iter_decode(memoryview(data))) == [
+        (b'\x01', b'a'), (tlv.SEPARATOR, b''), (b'\x01', b'b')]
+
+
+def test_list():
+    """Test that records delimited by separators round trip."""
+    records = [(b'\x01', b'first', b'\x03', os.urandom(32), b'\x0B', b'\x01'),
+               (b'\x01', b'second', b'\x03', os.urandom(300), b'\x0B', b'\x00')]
+    data = tlv.encode_list(records)
+    assert data.count(tlv.SEPARATOR + b'\x00') >= 1
+    assert tlv.decode_list(data) == [dict(zip(r[::2], r[1::2])) for r in records]
+    assert tlv.decode_list(b'') == [{}]
+
+
+@pytest.mark.parametrize('data', [b'\x01', b'\x01\x05abc',
+                                  b'\x01\xff' + bytes(255) + b'\x01'])
+def test_decode_truncated(data):
+    """Test that truncated data is rejected."""
+    with pytest.raises(ValueError):
+        tlv.decode(data)
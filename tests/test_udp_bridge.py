@@ -0,0 +1,90 @@
+"""Tests for accessories.Udp."""
+import asyncio
+import socket
+
+import pytest
+
+from accessories.Udp import UdpBridge
+from pyhap.accessory import Accessory
+
+
+@pytest.fixture
+def loop(mock_driver, monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(mock_driver, 'loop', loop, raising=False)
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def bridge(mock_driver, loop):
+    bridge = UdpBridge(('127.0.0.1', 0), mock_driver, 'Udp Bridge')
+    acc = Accessory(mock_driver, 'Sensor', aid=2)
+    acc.add_preload_service('TemperatureSensor')
+    acc.add_preload_service('MotionSensor')
+    bridge.add_accessory(acc)
+    return bridge
+
+
+def get_char(bridge, service, char):
+    return bridge.accessories[2].get_service(service).get_characteristic(char)
+
+
+def test_lookup_and_parse(bridge, loop):
+    """Test both line formats, coalescing and the counters."""
+    bridge.build_lookup()
+    temp = get_char(bridge, 'TemperatureSensor', 'CurrentTemperature')
+    motion = get_char(bridge, 'MotionSensor', 'MotionDetected')
+    iid = bridge.accessories[2].iid_manager.get_iid(temp)
+
+    bridge.datagram_received(
+        b'2.%d=20.5\n2/MotionSensor/MotionDetected=true\n' % iid +
+        b'2/TemperatureSensor/CurrentTemperature=21.5\n'
+        b'garbage\n9.9=1\n2/MotionSensor/MotionDetected=\n')
+    assert temp.value != 21.5  # Applied on the next loop iteration.
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert temp.value == 21.5
+    assert motion.value is True  # The later, invalid value was dropped.
+    assert bridge.stats == {'datagrams': 1, 'updates': 2, 'parse_errors': 2,
+                            'unknown': 1, 'dropped': 0}
+
+    bridge.datagram_received(b'2/MotionSensor/MotionDetected=0')
+    loop.run_until_complete(asyncio.sleep(0))
+    assert motion.value is False
+
+
+def test_non_finite_values(bridge, loop):
+    """Test that NaN and infinite values are rejected and do not replace valid ones."""
+    bridge.build_lookup()
+    temp = get_char(bridge, 'TemperatureSensor', 'CurrentTemperature')
+    bridge.datagram_received(
+        b'2/TemperatureSensor/CurrentTemperature=22.5\n'
+        b'2/TemperatureSensor/CurrentTemperature=nan\n'
+        b'2/TemperatureSensor/CurrentTemperature=-inf\n'
+        b'2/TemperatureSensor/CurrentTemperature=Infinity\n')
+    loop.run_until_complete(asyncio.sleep(0))
+    assert temp.value == 22.5
+    assert bridge.stats['parse_errors'] == 3
+    assert bridge.stats['updates'] == 1
+
+
+def test_loopback(bridge, loop):
+    """Test receiving datagrams from a loopback socket."""
+    temp = get_char(bridge, 'TemperatureSensor', 'CurrentTemperature')
+
+    async def _run():
+        await bridge.async_start_server()
+        port = bridge.transport.get_extra_info('sockname')[1]
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'2/TemperatureSensor/CurrentTemperature=19',
+                        ('127.0.0.1', port))
+        for _ in range(100):
+            if bridge.stats['updates']:
+                break
+            await asyncio.sleep(0.01)
+        bridge.stop_server()
+
+    loop.run_until_complete(_run())
+    assert temp.value == 19
+    assert bridge.stats['datagrams'] == 1
@@ -0,0 +1,90 @@
+"""Tests for pyhap.util."""
+import socket
+import sys
+from unittest.mock import Mock, call, patch
+
+import pytest
+
+from pyhap import util
+
+ROUTES = """\
+Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+wlan0\t00000000\t0102A8C0\t0003\t0\t0\t600\t00000000\t0\t0\t0
+eth0\t00000000\t010200C0\t0003\t0\t0\t100\t00000000\t0\t0\t0
+eth0\t000200C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    util.get_local_address.cache_clear()
+    yield
+    util.get_local_address.cache_clear()
+
+
+def test_default_route_interface(tmpdir):
+    """Test that the default route with the lowest metric is used."""
+    routes = tmpdir.join('route')
+    routes.write(ROUTES)
+    with patch('pyhap.util.PROC_NET_ROUTE', str(routes)):
+        assert util.get_default_route_interface() == 'eth0'
+    with patch('pyhap.util.PROC_NET_ROUTE', str(tmpdir.join('missing'))):
+        assert util.get_default_route_interface() is None
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux')
+                    or 'lo' not in util.get_interfaces(),
+                    reason='Needs a Linux loopback interface')
+def test_interface_address():
+    """Test that interface addresses are queried locally."""
+    assert util.get_interface_address('lo') == '127.0.0.1'
+    assert util.get_local_address('lo') == '127.0.0.1'
+    assert util.get_interface_address('no-such-if0') is None
+    with pytest.raises(ValueError):
+        util.get_local_address('no-such-if0')
+
+
+def test_interface_address_not_linux():
+    """Test that interfaces are not queried with the Linux ioctl on other platforms."""
+    with patch.object(util.sys, 'platform', 'darwin'), \
+            patch.object(util, 'fcntl') as fcntl:
+        assert util.get_interface_address('en0') is None
+    assert not fcntl.ioctl.called
+
+
+def test_local_address_without_route():
+    """Test that the address is found from the interfaces, without network traffic."""
+    addresses = {'lo': '127.0.0.1', 'eth0': None, 'eth1': '10.0.0.2'}
+    with patch('pyhap.util.get_default_route_interface', return_value=None), \
+            patch('pyhap.util.get_interfaces', return_value=list(addresses)), \
+            patch('pyhap.util.get_interface_address', side_effect=addresses.get), \
+            patch.object(socket.socket, 'connect') as connect:
+        assert util.get_local_address() == '10.0.0.2'
+        assert util.get_local_address() == '10.0.0.2'
+    assert not connect.called
+    assert util.get_local_address.cache_info().hits == 1
+
+
+def test_local_address_without_network():
+    """Test that no loopback address is returned or cached without a network."""
+    with patch('pyhap.util.get_default_route_interface', return_value=None), \
+            patch('pyhap.util.get_interfaces', return_value=['lo']), \
+            patch('pyhap.util.get_interface_address', return_value='127.0.0.1'), \
+            patch.object(socket.socket, 'connect', side_effect=OSError) as connect:
+        with pytest.raises(OSError):
+            util.get_local_address()
+        with pytest.raises(OSError):
+            util.get_local_address()
+    assert connect.call_count == 2
+
+
+def test_update_service():
+    """Test that services are updated in place or registered again."""
+    advertiser = Mock(spec=['update_service', 'register_service', 'unregister_service'])
+    util.update_service(advertiser, 'old', 'new')
+    advertiser.update_service.assert_called_once_with('new')
+
+    old_advertiser = Mock(spec=['register_service', 'unregister_service'])
+    util.update_service(old_advertiser, 'old', 'new')
+    assert old_advertiser.mock_calls == [
+        call.unregister_service('old'), call.register_service('new')]